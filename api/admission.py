@@ -0,0 +1,149 @@
+# api/admission.py
+"""
+Admission control for graph runs.
+
+At most ADMISSION_MAX_IN_FLIGHT runs execute at once; the rest wait in a priority queue
+(PRIORITY_CLASSES: interactive before standard before batch, FIFO within a class). When
+ADMISSION_MAX_QUEUE runs are already waiting, new requests are rejected with a Retry-After
+estimate instead of piling up behind a traffic spike. Slots are granted through futures, so
+asyncio handlers and worker threads (jobs) wait in the same queue.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from src.config import ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_INITIAL_RUN_SECONDS, PRIORITY_CLASSES
+from src.metrics import METRICS
+
+QUEUED, GRANTED, LEFT = "queued", "granted", "left"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Too many queued runs ({priority}); retry after {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One run's place in the admission queue; `release()` must always be called."""
+
+    def __init__(self, controller: "AdmissionController", priority: str):
+        self.controller = controller
+        self.priority = priority
+        self.state = QUEUED
+        self.enqueued_at = time.time()
+        self.granted_at: Optional[float] = None
+        self.granted = Future()
+
+    async def acquired(self):
+        """Waits for a slot. Cancelling the wait (client disconnect) gives up the place in the queue."""
+        await asyncio.wrap_future(self.granted)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocking variant for worker threads; returns False on timeout."""
+        try:
+            self.granted.result(timeout)
+            return True
+        except FutureTimeoutError:
+            return False
+
+    def release(self):
+        self.controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 priorities: Dict[str, int] = PRIORITY_CLASSES):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.priorities = priorities
+        self._heap = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._queued = 0
+        self._avg_run_seconds = ADMISSION_INITIAL_RUN_SECONDS
+        self._lock = threading.Lock()
+
+    def enqueue(self, priority: str, reject: bool = True) -> Ticket:
+        """
+        Takes a slot if one is free and nobody is waiting, otherwise queues the ticket.
+        Raises AdmissionRejected when the queue is full (unless reject=False, for callers
+        that are already bounded elsewhere, e.g. the job pool).
+        """
+        if priority not in self.priorities:
+            raise ValueError(f"Unknown priority class '{priority}' (expected one of {list(self.priorities)})")
+        ticket = Ticket(self, priority)
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._queued:
+                self._grant(ticket)
+            elif reject and self._queued >= self.max_queue:
+                METRICS.inc("agent_admission_rejections_total", priority=priority)
+                raise AdmissionRejected(priority, self._retry_after())
+            else:
+                heapq.heappush(self._heap, (self.priorities[priority], next(self._seq), ticket))
+                self._queued += 1
+                METRICS.inc("agent_admission_queue_depth", priority=priority)
+        return ticket
+
+    @asynccontextmanager
+    async def admit(self, priority: str, reject: bool = True):
+        ticket = self.enqueue(priority, reject)
+        try:
+            await ticket.acquired()
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained by one slot's worth of runs (lock held)."""
+        return max(1, math.ceil(self._avg_run_seconds * (self._queued + 1) / max(self.max_in_flight, 1)))
+
+    def _grant(self, ticket: Ticket) -> bool:
+        # Lock held. False if the waiter already gave up (cancelled future).
+        if not ticket.granted.set_running_or_notify_cancel():
+            return False
+        ticket.state, ticket.granted_at = GRANTED, time.time()
+        self._in_flight += 1
+        METRICS.inc("agent_admission_in_flight")
+        METRICS.observe("agent_admission_wait_seconds", ticket.granted_at - ticket.enqueued_at, priority=ticket.priority)
+        ticket.granted.set_result(True)
+        return True
+
+    def _dispatch(self):
+        # Lock held: hand free slots to the best-ranked live waiters
+        while self._in_flight < self.max_in_flight and self._heap:
+            _, _, ticket = heapq.heappop(self._heap)
+            if ticket.state != QUEUED:
+                continue
+            self._leave_queue(ticket)
+            if not self._grant(ticket):
+                ticket.state = LEFT
+
+    def _leave_queue(self, ticket: Ticket):
+        self._queued -= 1
+        METRICS.inc("agent_admission_queue_depth", -1, priority=ticket.priority)
+
+    def _release(self, ticket: Ticket):
+        with self._lock:
+            if ticket.state == GRANTED:
+                self._in_flight -= 1
+                METRICS.inc("agent_admission_in_flight", -1)
+                # Smoothed run duration feeds the Retry-After estimate
+                self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * (time.time() - ticket.granted_at)
+            elif ticket.state == QUEUED:
+                ticket.granted.cancel()
+                self._leave_queue(ticket)
+            ticket.state = LEFT
+            self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"in_flight": self._in_flight, "queued": self._queued, "max_in_flight": self.max_in_flight,
+                    "max_queue": self.max_queue, "avg_run_seconds": round(self._avg_run_seconds, 2)}
@@ -0,0 +1,82 @@
+# api/coalescing.py
+"""
+Single-flight request coalescing.
+
+Identical requests (same prompt and run parameters) that arrive while a run is in flight
+attach to that run instead of starting their own generator -> critics -> chairman loop, and
+a finished result is served again for a short reuse window. The first caller (the leader)
+runs the graph; everyone else waits on the leader's future, from a thread or from asyncio.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Dict, Tuple
+
+from src.config import COALESCE_REUSE_SECONDS, COALESCE_MAX_ENTRIES
+from src.metrics import METRICS
+
+LEADER, INFLIGHT, REUSED = "leader", "inflight", "reuse"
+
+
+def request_key(**fields) -> str:
+    """Stable key over everything that changes the outcome of a run."""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, reuse_seconds: float = COALESCE_REUSE_SECONDS, max_entries: int = COALESCE_MAX_ENTRIES):
+        self.reuse_seconds = reuse_seconds
+        self.max_entries = max_entries
+        self._inflight: Dict[str, Future] = {}
+        self._recent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Tuple[Future, str]:
+        """
+        Returns (future, role). Role LEADER: the caller must run and then `complete` the key.
+        INFLIGHT / REUSED: the future resolves to (or already holds) the shared result.
+        """
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None:
+                finished_at, result = recent
+                if time.time() - finished_at <= self.reuse_seconds:
+                    METRICS.inc("agent_coalesced_requests_total", source=REUSED)
+                    future = Future()
+                    future.set_result(result)
+                    return future, REUSED
+                del self._recent[key]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                METRICS.inc("agent_coalesced_requests_total", source=INFLIGHT)
+                return future, INFLIGHT
+
+            future = self._inflight[key] = Future()
+            return future, LEADER
+
+    def complete(self, key: str, result: Any = None, error: BaseException = None):
+        """Called by the leader: resolves every attached caller. Failures are never reused."""
+        with self._lock:
+            future = self._inflight.pop(key)
+            if error is None and self.reuse_seconds > 0:
+                self._recent[key] = (time.time(), result)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_entries:
+                    self._recent.popitem(last=False)
+        if future.cancelled():
+            return
+        try:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        except InvalidStateError:
+            pass  # cancelled by a caller in the meantime
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
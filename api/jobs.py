@@ -0,0 +1,194 @@
+# api/jobs.py
+"""
+Asynchronous generation jobs.
+
+A submitted job gets an ID immediately and runs on a bounded pool of graph runners
+(JOB_WORKERS threads). At most JOB_QUEUE_DEPTH jobs may wait for a runner; further
+submissions are rejected with a Retry-After estimate. Clients poll or long-poll the job for its result and may cancel
+it: a queued job never starts, a running job stops at the next node boundary.
+"""
+import asyncio
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_RESULT_TTL_SECONDS, ADMISSION_INITIAL_RUN_SECONDS
+from src.metrics import METRICS
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a submission would exceed the queue depth."""
+
+    def __init__(self, max_queue: int, retry_after: int):
+        super().__init__(f"Job queue is full ({max_queue} waiting); retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """Raised inside a runner once its job has been cancelled."""
+
+
+class Job:
+    def __init__(self, job_id: str, payload: Any):
+        self.id = job_id
+        self.payload = payload
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+        self._done = threading.Event()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def raise_if_cancelled(self):
+        """Cooperative cancellation point for the runner (called between graph steps)."""
+        if self.cancel_requested.is_set():
+            raise JobCancelled(self.id)
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            self.status, self.result, self.error = status, result, error
+            self.finished_at = time.time()
+            self._done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+
+    async def wait(self, timeout: float) -> bool:
+        """Long-poll: waits up to `timeout` seconds for the job to finish without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        with self._lock:
+            if self._done.is_set():
+                return True
+            self._waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._waiters = [(l, w) for l, w in self._waiters if w is not waiter]
+        return self.done
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "queue_wait_seconds": round((self.started_at or now) - self.submitted_at, 3) if self.started_at or self.status == QUEUED else None,
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Bounded pool of graph runners with a queue-depth limit, cancellation and result retention."""
+
+    def __init__(self, runner: Callable[[Job], Any], max_workers: int = JOB_WORKERS,
+                 max_queue: int = JOB_QUEUE_DEPTH, result_ttl: float = JOB_RESULT_TTL_SECONDS):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graph-runner")
+        self._jobs: Dict[str, Job] = {}
+        self._queued = 0
+        self._avg_run_seconds = ADMISSION_INITIAL_RUN_SECONDS
+        self._lock = threading.Lock()
+
+    def submit(self, payload: Any) -> Job:
+        self._prune()
+        job = Job(uuid.uuid4().hex, payload)
+        with self._lock:
+            if self._queued >= self.max_queue:
+                METRICS.inc("agent_jobs_total", status="rejected")
+                raise QueueFullError(self.max_queue, self._retry_after())
+            self._queued += 1
+            METRICS.inc("agent_jobs_queued")
+            # The future exists before the job is published, so a concurrent cancel can use it
+            job.future = self._executor.submit(self._run, job)
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Queued jobs are dropped immediately; running jobs stop at their next cancellation point."""
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested.set()
+        if job.future.cancel():
+            self._dequeue()
+            job._finish(CANCELLED, error="Cancelled before start")
+            METRICS.inc("agent_jobs_total", status=CANCELLED)
+        return job
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained by one runner's worth of jobs (lock held)."""
+        return max(1, math.ceil(self._avg_run_seconds * (self._queued + 1) / max(self.max_workers, 1)))
+
+    def _dequeue(self):
+        with self._lock:
+            self._queued -= 1
+        METRICS.inc("agent_jobs_queued", -1)
+
+    def _run(self, job: Job):
+        self._dequeue()
+        job.started_at = time.time()
+        METRICS.observe("agent_job_queue_wait_seconds", job.started_at - job.submitted_at)
+        if job.cancel_requested.is_set():
+            status, result, error = CANCELLED, None, "Cancelled before start"
+        else:
+            job.status = RUNNING
+            METRICS.inc("agent_jobs_running")
+            try:
+                status, result, error = SUCCEEDED, self.runner(job), None
+            except JobCancelled:
+                status, result, error = CANCELLED, None, "Cancelled while running"
+            except Exception as e:
+                status, result, error = FAILED, None, f"Agent Execution Failed: {str(e)}"
+            finally:
+                METRICS.inc("agent_jobs_running", -1)
+                # Smoothed run duration feeds the Retry-After estimate
+                with self._lock:
+                    self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * (time.time() - job.started_at)
+        job._finish(status, result, error)
+        METRICS.inc("agent_jobs_total", status=status)
+
+    def _prune(self):
+        """Drops finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in jobs:
+            counts[job.status] += 1
+        return {"workers": self.max_workers, "max_queue": self.max_queue, **counts}
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            if not job.done:
+                self.cancel(job.id)
+        self._executor.shutdown(wait=False)
@@ -1,16 +1,67 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import functools
+import json
 import time
+import uuid
 
-# Import the compiled graph
-from src.graph import build_graph
+# Compiled graphs, one per mode (built once, reused across requests)
+from src.graph_registry import get_graph, resolve_mode
+from src.config import CHECKPOINT_DB_PATH, JOB_MAX_WAIT_SECONDS, BATCH_MAX_TASKS, BATCH_MAX_CONCURRENCY, ENABLE_COALESCING
+from src.config import PRIORITY_CLASSES, DEFAULT_MODE, API_PRECOMPILE_MODES
+from src.config import ESCALATION_APPROVAL_TIMEOUT_SECONDS
+from src.config import SANDBOX_TIMEOUT_SECONDS, SANDBOX_TEST_TIMEOUT_SECONDS, SANDBOX_MAX_TESTS, SANDBOX_MAX_CODE_CHARS
+from src.metrics import METRICS
+from src.tracing import trace_run, current_trace_id
+from src.cost_ledger import ledger_scope
+from src.repair_context import repair_tokens_saved
+from src.incremental_critique import critique_tokens_saved
+from src.sandbox import get_sandbox, SandboxBusy
+from api.jobs import JobManager, Job, QueueFullError
+from api.coalescing import SingleFlight, request_key, LEADER
+from api.admission import AdmissionController, AdmissionRejected
 
-# Initialize the workflow (Defaults to FULL_SYSTEM mode)
-agent_workflow = build_graph()
+@functools.lru_cache(maxsize=None)
+def get_api_checkpointer():
+    """Durable checkpoint store (opened on first use): lets a request with the same task_id resume an interrupted run."""
+    if not CHECKPOINT_DB_PATH:
+        return None
+    from src.checkpoint import get_checkpointer
+    return get_checkpointer(CHECKPOINT_DB_PATH)
+
+@functools.lru_cache(maxsize=None)
+def get_memory_checkpointer():
+    """In-memory store for WebSocket runs that pause for escalation approval (one private thread per run)."""
+    from langgraph.checkpoint.memory import MemorySaver
+    from src.checkpoint import state_serializer
+    return MemorySaver(serde=state_serializer())
+
+def precompile_graphs():
+    for mode in API_PRECOMPILE_MODES:
+        try:
+            get_graph(mode, checkpointer=get_api_checkpointer())
+        except Exception as e:
+            # Not fatal: the first request for this mode retries and reports the error
+            print(f"[API] ⚠️ Could not precompile '{mode}': {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import: the graphs compile in the background once the server is
+    # up (a request arriving earlier waits for the same compilation in the registry)
+    asyncio.get_running_loop().run_in_executor(None, precompile_graphs)
+    yield
+    # Queued jobs are cancelled; running ones stop at their next node boundary
+    job_manager.shutdown()
+    get_sandbox().shutdown()
 
 # Initialize the FastAPI application
 app = FastAPI(
+    lifespan=lifespan,
     title="Cost-Aware Multi-Agent Router API",
     description="A hybrid generator-critic framework bridging lightweight loops and expensive fallback.",
     version="1.0.0"
@@ -19,8 +70,35 @@ app = FastAPI(
 # --- Schemas for API Request/Response ---
 
 class GenerationRequest(BaseModel):
-    task_id: str = Field(default="custom_task_001", description="Unique identifier for the request.")
+    task_id: str = Field(default_factory=lambda: f"task-{uuid.uuid4().hex[:12]}",
+                         description="Identifier of the request and its checkpoint thread (default: a fresh one, so unrelated requests never share a thread).")
     prompt: str = Field(..., description="The user prompt or coding task.")
+    difficulty: Optional[str] = Field(default=None, description="Optional difficulty hint (e.g. 'medium', 'hard') used by the adaptive escalation policy.")
+    cost_budget_usd: Optional[float] = Field(default=None, gt=0, description="Optional dollar budget. Retries/escalation are skipped once the projected cost exceeds it.")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="Optional deadline (seconds from submission). Steps expected to overrun it are skipped.")
+    priority: Optional[str] = Field(default=None, description="Admission priority class: 'interactive', 'standard' or 'batch' (default: interactive for /generate, batch for jobs and batches).")
+    mode: Optional[str] = Field(default=None, validate_default=True, description="Workflow variant: baseline, loop_only, fallback_only, full_system (default) or reference.")
+
+    @field_validator("mode")
+    @classmethod
+    def known_mode(cls, value):
+        # Normalized to the AB_MODES value ("BASELINE" -> "baseline")
+        return resolve_mode(value)
+
+    @field_validator("priority")
+    @classmethod
+    def known_priority(cls, value):
+        if value is not None and value not in PRIORITY_CLASSES:
+            raise ValueError(f"priority must be one of {list(PRIORITY_CLASSES)}")
+        return value
+
+class InteractiveGenerationRequest(GenerationRequest):
+    """First message on the WebSocket channel."""
+    confirm_escalation: bool = Field(default=False, description="Pause before the fallback model until the client sends approve_escalation (or decline_escalation).")
+
+class BatchGenerationRequest(BaseModel):
+    tasks: List[GenerationRequest] = Field(..., min_length=1, max_length=BATCH_MAX_TASKS, description="Tasks to run concurrently.")
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=BATCH_MAX_CONCURRENCY, description="Graphs running at once (default BATCH_MAX_CONCURRENCY).")
 
 class CriticDetail(BaseModel):
     """Encapsulates the feedback from an individual critic agent for observability."""
@@ -34,10 +112,16 @@ class GenerationResponse(BaseModel):
     """The final payload returned to the client."""
     task_id: str
     status: str
+    mode: str = Field(default="full_system", description="Workflow variant that produced this result.")
     final_code: str
     iterations: int
     used_fallback: bool
     safety_veto: bool
+    cost_usd: float = Field(default=0.0, description="Estimated LLM cost of this request.")
+    trace_id: Optional[str] = Field(default=None, description="Trace of this run (python -m src.tracing <trace_id>).")
+    coalesced: bool = Field(default=False, description="Served by an identical in-flight or just-finished run (no LLM cost of its own).")
+    repair_tokens_saved: int = Field(default=0, description="Retry prompt tokens saved by the token-budgeted repair context.")
+    critique_tokens_saved: int = Field(default=0, description="Critic tokens saved by incremental critique and cached verdicts.")
     
     # Observability data extracted from the final graph state
     chairman_summary: str = Field(..., description="The final summary from the Chairman node.")
@@ -45,6 +129,341 @@ class GenerationResponse(BaseModel):
     
     latency_seconds: float
 
+class JobStatus(BaseModel):
+    """State of an asynchronous generation job (POST /api/v1/jobs)."""
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded, failed or cancelled.")
+    submitted_at: float
+    queue_wait_seconds: Optional[float] = Field(default=None, description="Time spent waiting for a graph runner.")
+    run_seconds: Optional[float] = None
+    result: Optional[GenerationResponse] = Field(default=None, description="Set once the job has succeeded.")
+    error: Optional[str] = None
+
+class LCBTestCase(BaseModel):
+    input: str = Field(..., description="Raw test input (LiveCodeBench format: one argument per line, or stdin for solve()).")
+    output: str = Field(..., description="Expected return value (or printed output).")
+
+class ExecutionRequest(BaseModel):
+    """Code plus either LCB-style `test_cases` or a HumanEval-style `test` (a `check(candidate)` function)."""
+    code: str = Field(..., max_length=SANDBOX_MAX_CODE_CHARS, description="Python source (markdown fences are stripped for LCB tests).")
+    test_cases: Optional[List[LCBTestCase]] = Field(default=None, max_length=SANDBOX_MAX_TESTS, description="LCB-style input/output pairs.")
+    test: Optional[str] = Field(default=None, max_length=SANDBOX_MAX_CODE_CHARS, description="HumanEval-style test code defining check(candidate).")
+    entry_point: Optional[str] = Field(default=None, description="Function under test (required with `test`; inferred for LCB if omitted).")
+    stop_on_failure: bool = Field(default=False, description="Stop at the first failing test instead of running all of them.")
+    test_timeout_seconds: float = Field(default=SANDBOX_TEST_TIMEOUT_SECONDS, gt=0, le=SANDBOX_TIMEOUT_SECONDS, description="Per-test time limit.")
+
+    @model_validator(mode="after")
+    def one_test_format(self):
+        if (self.test_cases is None) == (self.test is None):
+            raise ValueError("provide exactly one of `test_cases` (LCB) or `test` (HumanEval)")
+        if self.test is not None and not self.entry_point:
+            raise ValueError("`entry_point` is required with HumanEval-style `test`")
+        return self
+
+    @property
+    def runner(self) -> str:
+        return "lcb" if self.test_cases is not None else "humaneval"
+
+class TestResult(BaseModel):
+    index: int
+    status: str = Field(..., description="passed, failed, timeout or error.")
+    passed: bool
+    message: str
+    seconds: float
+
+class ExecutionResponse(BaseModel):
+    runner: str = Field(..., description="lcb or humaneval.")
+    passed: bool
+    message: str = Field(..., description="'Passed', the first failure, or a setup error (syntax error, missing function).")
+    tests: List[TestResult] = Field(default=[], description="One entry per executed test, in order.")
+    passed_count: int
+    cached: bool = Field(default=False, description="Served from the execution cache (same normalized code and tests).")
+    execution_seconds: float = Field(..., description="Time spent in the sandbox worker (of the original run if cached).")
+    latency_seconds: float
+
+# --- Run Helpers (shared by the blocking and streaming endpoints) ---
+
+def build_initial_state(request: GenerationRequest, start_time: float) -> dict:
+    """Constructs the initial state matching the AgentState TypedDict."""
+    return {
+        "task": request.prompt,
+        "difficulty": request.difficulty,
+        "draft_code": "",
+        "iteration": 0,
+        "critiques": "DELETE",  # Triggers custom reducer to ensure a clean state
+        "final_decision": "",
+        "critique_feedback": "",
+        "used_fallback": False,
+        "safety_veto_triggered": False,
+        "logic_failure_triggered": False,
+        "malicious_intent_triggered": False,
+        # Per-request budgets enforced by the router
+        "cost_budget_usd": request.cost_budget_usd,
+        "deadline": start_time + request.timeout_seconds if request.timeout_seconds else None,
+        "started_at": start_time,
+        "request_cost": 0.0
+    }
+
+def graph_for(request: GenerationRequest):
+    return get_graph(request.mode, checkpointer=get_api_checkpointer())
+
+def thread_id_for(request: GenerationRequest) -> str:
+    """Modes have different topologies, so each gets its own checkpoint thread per task."""
+    return request.task_id if request.mode == DEFAULT_MODE else f"{request.task_id}@{request.mode}"
+
+def resume_with_budgets(graph, config, request: GenerationRequest, start_time: float) -> bool:
+    """
+    Replaces the interrupted run's deadline and budget by the resuming request's: the timeout
+    counts from now, and the budget covers what this request spends on top of the earlier cost.
+    Returns False if the run cannot be resumed (nothing completed yet), so it starts fresh.
+    """
+    history = list(graph.get_state_history(config, limit=2))
+    if len(history) < 2 or not history[1].next:
+        return False
+    budgets = build_initial_state(request, start_time)
+    spent = history[0].values.get("request_cost", 0.0)
+    # Written as one of the nodes of the last completed step, so the pending next step is unchanged
+    graph.update_state(config, {
+        "deadline": budgets["deadline"],
+        "started_at": start_time,
+        "cost_budget_usd": spent + request.cost_budget_usd if request.cost_budget_usd is not None else None,
+    }, as_node=history[1].next[0])
+    return True
+
+def prepare_run(request: GenerationRequest, start_time: float):
+    """
+    Returns (graph, graph_input, config). With a checkpointer, an interrupted run for the same
+    task is resumed (graph_input=None); any other run under this thread_id starts fresh.
+    """
+    graph = graph_for(request)
+    checkpointer = get_api_checkpointer()
+    thread_id = thread_id_for(request)
+    config = {"configurable": {"thread_id": thread_id}}
+    graph_input = build_initial_state(request, start_time)
+
+    if checkpointer is not None:
+        checkpointer.maybe_maintain()
+        snapshot = graph.get_state(config)
+        if snapshot.next and snapshot.values.get("task") == request.prompt and resume_with_budgets(graph, config, request, start_time):
+            # Interrupted run for the same task: continue from the last completed node
+            print(f"[API] ♻️ Resuming '{thread_id}' at {list(snapshot.next)}")
+            graph_input = None
+        elif snapshot.values:
+            # Finished or unrelated run under this thread_id: start from scratch
+            checkpointer.delete_thread(thread_id)
+
+    return graph, graph_input, config
+
+def run_generation(request: GenerationRequest, start_time: float, trace_name: str = "api.generate",
+                   job: Optional[Job] = None) -> GenerationResponse:
+    """
+    Runs the workflow to completion and builds the response. For a job, the graph is stepped
+    so a cancellation takes effect at the next node boundary.
+    """
+    graph, graph_input, config = prepare_run(request, start_time)
+
+    with trace_run(trace_name, task_id=request.task_id, mode=request.mode) as run, ledger_scope():
+        if job is None:
+            final_state = graph.invoke(graph_input, config=config)
+        else:
+            final_state = {}
+            for final_state in graph.stream(graph_input, config=config, stream_mode="values"):
+                job.raise_if_cancelled()
+        response = build_response(request, final_state, start_time)
+        if run is not None:
+            run.set(decision=response.status, cost_usd=response.cost_usd, used_fallback=response.used_fallback)
+    return response
+
+# Identical concurrent requests attach to one run (single flight)
+coalescer = SingleFlight()
+
+# Bounded number of graph runs in flight; the rest wait by priority class or get 429
+admission = AdmissionController()
+
+def coalescing_key(request: GenerationRequest) -> str:
+    """Everything that changes the outcome of a run (the task_id only names the checkpoint thread)."""
+    return request_key(prompt=request.prompt, mode=request.mode, difficulty=request.difficulty,
+                       cost_budget_usd=request.cost_budget_usd, timeout_seconds=request.timeout_seconds)
+
+async def generate_coalesced(request: GenerationRequest, trace_name: str = "api.generate",
+                             priority: str = "interactive") -> GenerationResponse:
+    """
+    run_generation on a worker thread once admitted, shared with identical requests. Followers
+    get the leader's response under their own task_id, with coalesced=True and no cost of their
+    own. Raises AdmissionRejected if the admission queue is full.
+    """
+    start_time = time.time()
+    priority = request.priority or priority
+    if not ENABLE_COALESCING:
+        async with admission.admit(priority):
+            return await asyncio.to_thread(run_generation, request, start_time, trace_name)
+
+    key = coalescing_key(request)
+    future, role = coalescer.claim(key)
+    if role == LEADER:
+        ticket = None
+        try:
+            ticket = admission.enqueue(priority)
+            await ticket.acquired()
+        except (AdmissionRejected, asyncio.CancelledError) as e:
+            # Rejected, or the client went away while queued: followers must not wait forever
+            if ticket is not None:
+                ticket.release()
+            coalescer.complete(key, error=e if isinstance(e, AdmissionRejected) else RuntimeError("Leading request cancelled"))
+            raise
+
+        def lead():
+            # Completes the key and frees the slot even if the leading client disconnects mid-run
+            try:
+                response = run_generation(request, start_time, trace_name)
+            except Exception as e:
+                coalescer.complete(key, error=e)
+                raise
+            finally:
+                ticket.release()
+            coalescer.complete(key, response)
+            return response
+        return await asyncio.to_thread(lead)
+
+    # Shielded: a follower that goes away must not cancel the future the leader and others share
+    shared = await asyncio.shield(asyncio.wrap_future(future))
+    print(f"[API] 🔗 '{request.task_id}' served by an identical run ({role})")
+    return shared.model_copy(update={
+        "task_id": request.task_id, "coalesced": True, "cost_usd": 0.0,
+        "latency_seconds": round(time.time() - start_time, 2)
+    })
+
+def to_critic_detail(c) -> CriticDetail:
+    """Converts a CritiqueResult into the client-facing CriticDetail."""
+    raw_feedback = getattr(c, "feedback", "")
+    if not raw_feedback or not raw_feedback.strip():
+        clean_feedback = "Approved without specific comments." if getattr(c, "is_passing", False) else "Failed without specific explanation."
+    else:
+        clean_feedback = raw_feedback
+
+    return CriticDetail(
+        role=getattr(c, "critic_role", None) or "Unknown",
+        passed=getattr(c, "is_passing", False),
+        feedback=clean_feedback,
+        safety_violation=getattr(c, "safety_violation", False),
+        malicious_intent=getattr(c, "is_malicious_intent", False)
+    )
+
+def build_response(request: GenerationRequest, final_state: dict, start_time: float) -> GenerationResponse:
+    """Assembles the structured response from the final graph state."""
+    # Extract detailed critic feedback from the final state
+    raw_critiques = final_state.get("critiques", [])
+    extracted_critics = [to_critic_detail(c) for c in raw_critiques] if isinstance(raw_critiques, list) else []
+
+    return GenerationResponse(
+        task_id=request.task_id,
+        status=final_state.get("final_decision", "UNKNOWN"),
+        mode=request.mode,
+        final_code=final_state.get("draft_code", ""),
+        iterations=final_state.get("iteration", 0),
+        used_fallback=final_state.get("used_fallback", False),
+        safety_veto=final_state.get("safety_veto_triggered", False) or final_state.get("malicious_intent_triggered", False),
+        cost_usd=round(final_state.get("request_cost", 0.0), 6),
+        repair_tokens_saved=repair_tokens_saved(final_state.get("repair_context_log")),
+        critique_tokens_saved=critique_tokens_saved(final_state.get("critique_savings_log")),
+        chairman_summary=final_state.get("critique_feedback", "No summary available."),
+        critic_details=extracted_critics,
+        trace_id=current_trace_id(),
+        latency_seconds=round(time.time() - start_time, 2)
+    )
+
+# Nodes whose LLM tokens are forwarded to streaming clients (drafts, not structured verdicts)
+TOKEN_STREAM_NODES = {"generator", "fallback", "reference"}
+
+def graph_update_to_events(node: str, update: dict) -> List[dict]:
+    """
+    Translates one node's state update into client-facing progress events:
+    draft_ready, critic_verdict, chairman_decision, escalation.
+    """
+    if not isinstance(update, dict):
+        return []
+    if node == "generator":
+        return [{"event": "draft_ready", "iteration": update.get("iteration"), "draft_code": update.get("draft_code", "")}]
+    if node in ("fallback", "reference"):
+        return [{"event": "escalation" if node == "fallback" else "draft_ready",
+                 "iteration": update.get("iteration"), "draft_code": update.get("draft_code", "")}]
+    if node == "chairman":
+        return [{
+            "event": "chairman_decision",
+            "decision": update.get("final_decision"),
+            "summary": update.get("critique_feedback", ""),
+            "safety_veto": update.get("safety_veto_triggered", False),
+            "logic_failure": update.get("logic_failure_triggered", False),
+            "malicious_intent": update.get("malicious_intent_triggered", False),
+        }]
+    critiques = update.get("critiques")
+    if isinstance(critiques, list):
+        return [{"event": "critic_verdict", "node": node, **to_critic_detail(c).model_dump()} for c in critiques]
+    return []
+
+async def graph_events(graph, graph_input, config, final_state: dict, **stream_kwargs):
+    """
+    Streams one graph run as (event, data) pairs: `token` plus the node events above. Shared by
+    the SSE and WebSocket endpoints; the latest full state is kept in `final_state`.
+    """
+    async for mode, chunk in graph.astream(
+        graph_input, config=config, stream_mode=["messages", "updates", "values"], **stream_kwargs
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if node in TOKEN_STREAM_NODES and isinstance(message.content, str) and message.content:
+                yield "token", {"node": node, "text": message.content}
+        elif mode == "updates":
+            for node, update in chunk.items():
+                for event in graph_update_to_events(node, update):
+                    yield event.pop("event"), event
+        else:
+            final_state.clear()
+            final_state.update(chunk)
+
+def format_sse(event: str, data: dict) -> str:
+    """Server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def format_ndjson(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+def unique_task_ids(requests: List[GenerationRequest]) -> List[GenerationRequest]:
+    """Batch tasks share the checkpointer, so repeated task_ids get an index suffix."""
+    seen = {}
+    for request in requests:
+        seen[request.task_id] = seen.get(request.task_id, 0) + 1
+    return [
+        request.model_copy(update={"task_id": f"{request.task_id}-{i}"}) if seen[request.task_id] > 1 else request
+        for i, request in enumerate(requests)
+    ]
+
+def summarize_batch(responses: List[GenerationResponse], failed: int, wall_seconds: float) -> dict:
+    """Aggregate cost and latency of a batch; `speedup` = summed task latency / batch wall time."""
+    latencies = sorted(r.latency_seconds for r in responses)
+    return {
+        "tasks": len(responses) + failed,
+        "succeeded": len(responses),
+        "failed": failed,
+        "passed": sum(r.status == "PASS" for r in responses),
+        "escalated": sum(r.used_fallback for r in responses),
+        "total_cost_usd": round(sum(r.cost_usd for r in responses), 6),
+        "wall_seconds": round(wall_seconds, 2),
+        "mean_latency_seconds": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "max_latency_seconds": latencies[-1] if latencies else 0.0,
+        "speedup": round(sum(latencies) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+
+def start_request():
+    METRICS.inc("agent_requests_in_flight")
+
+def finish_request(endpoint: str, status: str, start_time: float):
+    """Request-level metrics: in-flight gauge, totals by status, end-to-end latency."""
+    METRICS.inc("agent_requests_in_flight", -1)
+    METRICS.inc("agent_requests_total", endpoint=endpoint, status=status)
+    METRICS.observe("agent_request_latency_seconds", time.time() - start_time, endpoint=endpoint)
+
 # --- API Endpoints ---
 
 @app.post("/api/v1/generate", response_model=GenerationResponse)
@@ -54,70 +473,338 @@ async def generate_code_endpoint(request: GenerationRequest):
     and returns the final routed code alongside system observability metrics.
     """
     start_time = time.time()
+    start_request()
+    status = "error"
     
     try:
-        # Construct the initial state matching the AgentState TypedDict
-        initial_state = {
-            "task": request.prompt,
-            "draft_code": "",
-            "iteration": 0,
-            "critiques": "DELETE",  # Triggers custom reducer to ensure a clean state
-            "final_decision": "",
-            "critique_feedback": "",
-            "used_fallback": False,
-            "safety_veto_triggered": False,
-            "logic_failure_triggered": False,
-            "malicious_intent_triggered": False
-        }
-        
-        # Execute the LangGraph workflow synchronously
-        final_state = agent_workflow.invoke(
-            initial_state, 
-            config={"configurable": {"thread_id": request.task_id}}
-        )
-        
-        latency = round(time.time() - start_time, 2)
-        
-        # Extract detailed critic feedback from the final state
-        raw_critiques = final_state.get("critiques", [])
-        extracted_critics = []
-
-        if isinstance(raw_critiques, list):
-            for c in raw_critiques:
-                raw_feedback = getattr(c, "feedback", "")
-                if not raw_feedback or not raw_feedback.strip():
-                    clean_feedback = "Approved without specific comments." if getattr(c, "is_passing", False) else "Failed without specific explanation."
-                else:
-                    clean_feedback = raw_feedback
-
-                extracted_critics.append(
-                    CriticDetail(
-                        role=getattr(c, "critic_role", "Unknown"),
-                        passed=getattr(c, "is_passing", False),
-                        feedback=clean_feedback, 
-                        safety_violation=getattr(c, "safety_violation", False),
-                        malicious_intent=getattr(c, "is_malicious_intent", False)
-                    )
-                )
-
-
-        # Assemble the structured response
-        return GenerationResponse(
-            task_id=request.task_id,
-            status=final_state.get("final_decision", "UNKNOWN"),
-            final_code=final_state.get("draft_code", ""),
-            iterations=final_state.get("iteration", 0),
-            used_fallback=final_state.get("used_fallback", False),
-            safety_veto=final_state.get("safety_veto_triggered", False) or final_state.get("malicious_intent_triggered", False),
-            chairman_summary=final_state.get("critique_feedback", "No summary available."),
-            critic_details=extracted_critics,
-            latency_seconds=latency
-        )
-        
+        # Execute the LangGraph workflow on a worker thread (shared with identical in-flight requests)
+        response = await generate_coalesced(request)
+        status = "ok"
+        return response
+
+    except AdmissionRejected as e:
+        status = "rejected"
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
     except Exception as e:
         # Prevent internal agent crashes from bringing down the web server
         raise HTTPException(status_code=500, detail=f"Agent Execution Failed: {str(e)}")
 
+    finally:
+        finish_request("generate", status, start_time)
+
+@app.post("/api/v1/generate/stream")
+async def generate_stream_endpoint(request: GenerationRequest):
+    """
+    Same workflow as /api/v1/generate, streamed as server-sent events:
+    `token` (generator/fallback output as it arrives), `draft_ready`, `critic_verdict`,
+    `chairman_decision`, `escalation`, and finally `result` (a GenerationResponse) or `error`.
+    """
+    # Admission is decided before the stream starts so a full queue can still answer 429
+    try:
+        ticket = admission.enqueue(request.priority or "interactive")
+    except AdmissionRejected as e:
+        METRICS.inc("agent_requests_total", endpoint="generate_stream", status="rejected")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    async def event_stream():
+        start_time = time.time()
+        start_request()
+        status = "error"
+        try:
+            await ticket.acquired()
+            # Off the event loop: checkpoint reads and periodic maintenance (prune, VACUUM) hit SQLite
+            graph, graph_input, config = await asyncio.to_thread(prepare_run, request, start_time)
+            final_state = {}
+
+            with trace_run("api.generate_stream", task_id=request.task_id, mode=request.mode) as run, ledger_scope():
+                async for event, data in graph_events(graph, graph_input, config, final_state):
+                    yield format_sse(event, data)
+
+                response = build_response(request, final_state, start_time)
+                if run is not None:
+                    run.set(decision=response.status, cost_usd=response.cost_usd, used_fallback=response.used_fallback)
+            yield format_sse("result", response.model_dump())
+            status = "ok"
+
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Agent Execution Failed: {str(e)}"})
+
+        finally:
+            ticket.release()
+            finish_request("generate_stream", status, start_time)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release)  # Idempotent; covers a stream that never started
+    )
+
+# --- WebSocket Progress Channel ---
+
+async def run_interactive(websocket: WebSocket, request: InteractiveGenerationRequest, approvals: asyncio.Queue):
+    """
+    Runs the graph for one WebSocket session and sends its events. With confirm_escalation the run
+    pauses before the fallback node (`escalation_pending`) until an approval decision arrives.
+    """
+    start_time = time.time()
+    if request.confirm_escalation:
+        # Pausing needs a checkpointer: a private in-memory thread, deleted after the run. Never the
+        # task's durable thread, where a declined escalation would be resumed (unapproved) later
+        saver = get_memory_checkpointer()
+        graph = get_graph(request.mode, checkpointer=saver)
+        graph_input = build_initial_state(request, start_time)
+        config = {"configurable": {"thread_id": f"{thread_id_for(request)}#ws-{uuid.uuid4().hex[:8]}"}}
+    else:
+        saver = None
+        graph, graph_input, config = await asyncio.to_thread(prepare_run, request, start_time)
+    pause = ["fallback"] if request.confirm_escalation and "fallback" in graph.nodes else None
+    final_state = {}
+
+    try:
+        with trace_run("api.generate_ws", task_id=request.task_id, mode=request.mode) as run, ledger_scope():
+            while True:
+                async for event, data in graph_events(graph, graph_input, config, final_state, interrupt_before=pause):
+                    await websocket.send_json({"event": event, **data})
+                if not pause or "fallback" not in (await graph.aget_state(config)).next:
+                    break
+                await websocket.send_json({"event": "escalation_pending", "iteration": final_state.get("iteration"),
+                                           "summary": final_state.get("critique_feedback", "")})
+                try:
+                    approved = await asyncio.wait_for(approvals.get(), ESCALATION_APPROVAL_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    approved = False
+                await websocket.send_json({"event": "escalation_approved" if approved else "escalation_declined"})
+                if not approved:
+                    # The run ends with the local loop's last verdict
+                    break
+                graph_input, pause = None, None
+
+            response = build_response(request, final_state, start_time)
+            if run is not None:
+                run.set(decision=response.status, cost_usd=response.cost_usd, used_fallback=response.used_fallback)
+    finally:
+        if saver is not None:
+            saver.delete_thread(config["configurable"]["thread_id"])
+    return response
+
+@app.websocket("/api/v1/generate/ws")
+async def generate_ws_endpoint(websocket: WebSocket):
+    """
+    Interactive progress channel. The client sends an InteractiveGenerationRequest as the first
+    message, then receives the same events as the SSE endpoint as JSON objects (`{"event": ...}`;
+    `critic_verdict` carries the CriticDetail fields), ending with `result`, `cancelled` or `error`.
+    While the run is active the client may send `{"type": "cancel"}` and, after an
+    `escalation_pending` event, `{"type": "approve_escalation"}` or `{"type": "decline_escalation"}`.
+    """
+    await websocket.accept()
+    try:
+        request = InteractiveGenerationRequest.model_validate(await websocket.receive_json())
+    except WebSocketDisconnect:
+        return
+    except (ValidationError, ValueError) as e:
+        await websocket.send_json({"event": "error", "detail": f"Invalid request: {e}"})
+        await websocket.close(code=1008)
+        return
+
+    try:
+        ticket = admission.enqueue(request.priority or "interactive")
+    except AdmissionRejected as e:
+        METRICS.inc("agent_requests_total", endpoint="generate_ws", status="rejected")
+        await websocket.send_json({"event": "error", "detail": str(e), "retry_after": e.retry_after})
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    start_time = time.time()
+    start_request()
+    status = "error"
+    approvals = asyncio.Queue()
+
+    async def run():
+        await ticket.acquired()
+        return await run_interactive(websocket, request, approvals)
+
+    async def read_commands():
+        # Returns once the client cancels or goes away
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except WebSocketDisconnect:
+                return "disconnect"
+            except ValueError:
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "cancel":
+                return "cancel"
+            if kind in ("approve_escalation", "decline_escalation"):
+                approvals.put_nowait(kind == "approve_escalation")
+
+    runner, reader = asyncio.create_task(run()), asyncio.create_task(read_commands())
+    try:
+        done, _ = await asyncio.wait({runner, reader}, return_when=asyncio.FIRST_COMPLETED)
+        if runner in done:
+            response = runner.result()
+            await websocket.send_json({"event": "result", **response.model_dump()})
+            status = "ok"
+        else:
+            # Cancelled (or disconnected): the graph stops at its next step; a running node's result is discarded
+            runner.cancel()
+            status = "cancelled"
+            if reader.result() == "cancel":
+                await websocket.send_json({"event": "cancelled", "task_id": request.task_id})
+    except Exception as e:
+        try:
+            await websocket.send_json({"event": "error", "detail": f"Agent Execution Failed: {str(e)}"})
+        except Exception:
+            pass
+    finally:
+        runner.cancel()
+        reader.cancel()
+        ticket.release()
+        finish_request("generate_ws", status, start_time)
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+# --- Asynchronous Jobs ---
+
+def run_job(job: Job) -> dict:
+    """Graph runner for one job; deadlines count from submission, so queue time is included."""
+    # The job queue is already bounded: wait for an admission slot instead of rejecting
+    ticket = admission.enqueue(job.payload.priority or "batch", reject=False)
+    try:
+        while not ticket.wait(timeout=0.5):
+            job.raise_if_cancelled()
+        return run_generation(job.payload, job.submitted_at, trace_name="api.job", job=job).model_dump()
+    finally:
+        ticket.release()
+
+job_manager = JobManager(run_job)
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+@app.post("/api/v1/jobs", response_model=JobStatus, status_code=202)
+def submit_job_endpoint(request: GenerationRequest):
+    """Queues a generation run and returns its job ID immediately (429 with Retry-After if the queue is full)."""
+    try:
+        job = job_manager.submit(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return job.to_dict()
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatus)
+async def get_job_endpoint(job_id: str, wait: float = Query(default=0, ge=0, le=JOB_MAX_WAIT_SECONDS)):
+    """Job status, and the GenerationResponse once it has succeeded. `wait` > 0 long-polls until the job finishes."""
+    job = get_job_or_404(job_id)
+    if wait and not job.done:
+        await job.wait(wait)
+    return job.to_dict()
+
+@app.delete("/api/v1/jobs/{job_id}", response_model=JobStatus)
+def cancel_job_endpoint(job_id: str):
+    """Cancels a job: a queued job never starts, a running job stops after its current node."""
+    get_job_or_404(job_id)
+    return job_manager.cancel(job_id).to_dict()
+
+@app.post("/api/v1/generate/batch")
+async def generate_batch_endpoint(batch: BatchGenerationRequest):
+    """
+    Runs many tasks concurrently (at most `max_concurrency` graphs at once, all sharing the
+    provider rate limiter) and streams NDJSON lines as each finishes: `{"type": "result", ...}`
+    or `{"type": "error", ...}`, then one `{"type": "summary", ...}` with batch cost and latency.
+    """
+    requests = unique_task_ids(batch.tasks)
+    semaphore = asyncio.Semaphore(batch.max_concurrency or BATCH_MAX_CONCURRENCY)
+
+    async def run_one(index: int, request: GenerationRequest):
+        async with semaphore:
+            try:
+                response = await generate_coalesced(request, "api.generate_batch", priority="batch")
+                return index, request, response, None
+            except AdmissionRejected as e:
+                return index, request, None, f"{e} (HTTP 429)"
+            except Exception as e:
+                return index, request, None, f"Agent Execution Failed: {str(e)}"
+
+    async def result_stream():
+        start_time = time.time()
+        start_request()
+        status = "error"
+        pending = [asyncio.create_task(run_one(i, r)) for i, r in enumerate(requests)]
+        responses, failed = [], 0
+        try:
+            for next_done in asyncio.as_completed(pending):
+                index, request, response, error = await next_done
+                if error is None:
+                    responses.append(response)
+                    yield format_ndjson({"type": "result", "index": index, "response": response.model_dump()})
+                else:
+                    failed += 1
+                    yield format_ndjson({"type": "error", "index": index, "task_id": request.task_id, "detail": error})
+            yield format_ndjson({"type": "summary", **summarize_batch(responses, failed, time.time() - start_time)})
+            status = "ok"
+        finally:
+            # Client went away: tasks still waiting for a slot never start
+            for task in pending:
+                task.cancel()
+            finish_request("generate_batch", status, start_time)
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+# --- Sandbox Execution ---
+
+@app.post("/api/v1/execute", response_model=ExecutionResponse)
+async def execute_endpoint(request: ExecutionRequest):
+    """
+    Runs code against test cases on the shared sandbox worker pool, without the LLM loop.
+    Returns per-test results. 503 if the pool is saturated, 504 past SANDBOX_TIMEOUT_SECONDS.
+    """
+    start_time = time.time()
+    start_request()
+    status = "error"
+    tests = [case.model_dump() for case in request.test_cases] if request.test_cases is not None else request.test
+
+    try:
+        future = get_sandbox().submit(request.runner, request.code, tests, request.entry_point,
+                                      request.stop_on_failure, request.test_timeout_seconds)
+        result = await asyncio.wait_for(asyncio.wrap_future(future), SANDBOX_TIMEOUT_SECONDS)
+        status = "ok"
+        return ExecutionResponse(
+            runner=request.runner,
+            passed=result["passed"],
+            message=result["message"],
+            tests=result["tests"],
+            passed_count=sum(test["passed"] for test in result["tests"]),
+            cached=result["cached"],
+            execution_seconds=result["seconds"],
+            latency_seconds=round(time.time() - start_time, 2)
+        )
+
+    except SandboxBusy as e:
+        status = "rejected"
+        raise HTTPException(status_code=503, detail=str(e))
+
+    except asyncio.TimeoutError:
+        status = "timeout"
+        raise HTTPException(status_code=504, detail=f"Execution did not finish within {SANDBOX_TIMEOUT_SECONDS}s")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Execution Failed: {str(e)}")
+
+    finally:
+        finish_request("execute", status, start_time)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition: node latencies, tokens, escalations, vetoes, in-flight requests, sandbox timings."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
     """Health probe for container orchestration (e.g., Kubernetes, Docker)."""
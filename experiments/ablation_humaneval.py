@@ -1,23 +1,27 @@
 import sys
 import os
-import pandas as pd
 import time
-from tqdm import tqdm
-from datasets import load_dataset
+# pandas, tqdm and datasets are imported where they are used: they dominate start-up time
 
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.graph import build_graph
-from src.utils import CostTracker
-from src.config import AB_MODES
+from src.graph_registry import get_graph
+from src.cost_ledger import ledger_scope
+from src.rate_limit import get_rate_limit_stats
+from src.hedging import get_hedge_stats
+from src.tracing import trace_run
+from src.config import AB_MODES, EXPERIMENT_MODE
 from src.execution import extract_code_from_markdown, execute_humaneval_code
 from run_benchmark import estimate_gpt_cost
 
 # Path to save results
-DATA_FILE = "data/ablation_detailed_robust.csv"
+# Critic modes other than PERSONA (e.g. EXPERIMENT_MODE=COMBINED) write to their own file so
+# cost and latency can be compared side by side.
+DATA_FILE = "data/ablation_detailed_robust.csv" if EXPERIMENT_MODE == "PERSONA" else f"data/ablation_detailed_robust_{EXPERIMENT_MODE.lower()}.csv"
 
 def load_processed_tasks(csv_path):
     """Reads completed task IDs to enable resume capability."""
+    import pandas as pd
     if not os.path.exists(csv_path):
         return set()
     try:
@@ -30,12 +34,16 @@ def load_processed_tasks(csv_path):
 
 def save_single_row(csv_path, row_data):
     """Appends a single row of data to the CSV."""
+    import pandas as pd
     df = pd.DataFrame([row_data])
     # If file doesn't exist, write Header; if exists, append without Header
     write_header = not os.path.exists(csv_path)
     df.to_csv(csv_path, mode='a', header=write_header, index=False)
 
 def run_robust_ablation():
+    from datasets import load_dataset
+    from tqdm import tqdm
+
     # 1. Loading Full Dataset
     print("📥 Loading Full HumanEval Dataset...")
     dataset = load_dataset("openai_humaneval", split="test") # Run full dataset
@@ -51,12 +59,11 @@ def run_robust_ablation():
     processed_keys = load_processed_tasks(DATA_FILE)
     print(f"🔄 Resuming... Found {len(processed_keys)} already completed tasks.")
 
-    tracker = CostTracker()
-
     # 3. Nested Loop: Mode -> Task
     for mode in modes_to_run:
         print(f"\n=== Mode: {mode.upper()} ===")
-        app = build_graph(mode=mode)
+        # Verdict cache off: otherwise later modes reuse verdicts paid for by earlier ones
+        app = get_graph(mode, verdict_cache=False)
         
         for item in tqdm(dataset, desc=f"Running {mode}"):
             task_id = item["task_id"]
@@ -66,11 +73,7 @@ def run_robust_ablation():
             if unique_key in processed_keys:
                 continue
 
-            # Take a break to prevent Rate Limits
-            time.sleep(2) 
-            
             start_time = time.time()
-            cost_before = tracker.total_cost
             
             # Initialize result
             result_row = {
@@ -97,18 +100,18 @@ def run_robust_ablation():
                     "final_decision": "PASS" if mode == AB_MODES["BASELINE"] else ""
                 }
                 
-                final_state = app.invoke(state)
+                with trace_run("ablation_humaneval", task_id=task_id, mode=mode), ledger_scope() as ledger:
+                    final_state = app.invoke(state)
                 
-                # Metrics
-                cost_after = tracker.total_cost
-                latency = time.time() - start_time
+                    # Metrics
+                    latency = time.time() - start_time
                 
-                actual_cost = cost_after - cost_before
-                raw_code = final_state.get("draft_code", "")
+                    actual_cost = ledger.total_cost
+                    raw_code = final_state.get("draft_code", "")
                 
-                # Unit test
-                clean_code = extract_code_from_markdown(raw_code)
-                exec_success, _ = execute_humaneval_code(clean_code, item["test"], item["entry_point"])
+                    # Unit test
+                    clean_code = extract_code_from_markdown(raw_code)
+                    exec_success, _ = execute_humaneval_code(clean_code, item["test"], item["entry_point"])
                 
                 # Safety check
                 safety_veto = final_state.get("safety_veto_triggered", False)
@@ -144,6 +147,11 @@ def run_robust_ablation():
                 processed_keys.add(unique_key)
 
     print(f"\n✅ Full Ablation Complete. Results in {DATA_FILE}")
+    # Pacing is handled by the shared rate limiter (no fixed sleeps between tasks)
+    for key, stats in get_rate_limit_stats().items():
+        print(f"   [RATE LIMIT] {key}: {stats}")
+    for key, stats in get_hedge_stats().items():
+        print(f"   [HEDGE] {key}: {stats}")
 
 if __name__ == "__main__":
     run_robust_ablation()
\ No newline at end of file
@@ -1,21 +1,24 @@
 import sys
 import os
-import pandas as pd
 import time
 import json
-from tqdm import tqdm
-from datasets import load_dataset
 import textwrap
+# pandas, tqdm and datasets are imported where they are used: they dominate start-up time
 
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.graph import build_graph
-from src.utils import CostTracker
-from src.config import AB_MODES
+from src.graph_registry import get_graph
+from src.cost_ledger import ledger_scope
+from src.rate_limit import get_rate_limit_stats
+from src.hedging import get_hedge_stats
+from src.tracing import trace_run
+from src.config import AB_MODES, EXPERIMENT_MODE
 from src.execution import extract_code_from_markdown, execute_lcb_code 
 
 # Path to save results
-DATA_FILE = "data/ablation_lcb_loose.csv"
+# Critic modes other than PERSONA (e.g. EXPERIMENT_MODE=COMBINED) write to their own file so
+# cost and latency can be compared side by side.
+DATA_FILE = "data/ablation_lcb_loose.csv" if EXPERIMENT_MODE == "PERSONA" else f"data/ablation_lcb_loose_{EXPERIMENT_MODE.lower()}.csv"
 
 def load_lcb_filtered(limit=50):
     """
@@ -23,6 +26,7 @@ def load_lcb_filtered(limit=50):
     1. LeetCode
     2. Medium/Hard
     """
+    from datasets import load_dataset
     print("📥 Streaming LiveCodeBench (Lite)...")
     dataset = load_dataset(
         "livecodebench/code_generation_lite", 
@@ -50,6 +54,7 @@ def load_lcb_filtered(limit=50):
     return tasks
 
 def load_processed_tasks(csv_path):
+    import pandas as pd
     if not os.path.exists(csv_path):
         return set()
     try:
@@ -62,11 +67,14 @@ def load_processed_tasks(csv_path):
         return set()
 
 def save_single_row(csv_path, row_data):
+    import pandas as pd
     df = pd.DataFrame([row_data])
     write_header = not os.path.exists(csv_path)
     df.to_csv(csv_path, mode='a', header=write_header, index=False)
 
 def run_robust_ablation():
+    from tqdm import tqdm
+
     # Load Filtered Data
     dataset = load_lcb_filtered(limit=50) # Use 50 tasks as Pilot Study
     
@@ -81,7 +89,6 @@ def run_robust_ablation():
     NUM_RUNS = 1
 
     processed_keys = load_processed_tasks(DATA_FILE)
-    tracker = CostTracker()
 
     for run_idx in range(1, NUM_RUNS + 1):
         print(f"\n=========================================")
@@ -94,8 +101,8 @@ def run_robust_ablation():
                 continue
 
             print(f"\n=== Mode: {mode.upper()} ===")
-            # Build Graph
-            app = build_graph(mode=mode)
+            # Compiled once per mode, reused across runs; verdict cache off so every run pays full price
+            app = get_graph(mode, verdict_cache=False)
             
             for item in tqdm(dataset, desc=f"Running {mode} (Run {run_idx})"):
                 task_id = item["question_title"] 
@@ -104,11 +111,7 @@ def run_robust_ablation():
                 if unique_key in processed_keys:
                     continue
 
-                # Rate Limit Protection
-                time.sleep(1) 
-                
                 start_time = time.time()
-                cost_before = tracker.total_cost
                 
                 # Prompt Construction
                 # LCB has problem description; we need to wrap it into an explicit code generation instruction
@@ -151,6 +154,7 @@ def run_robust_ablation():
                     # Run Graph
                     state = {
                         "task": task_prompt, 
+                        "difficulty": item['difficulty'],
                         "draft_code": "", 
                         "iteration": 0, 
                         "critiques": [], 
@@ -162,29 +166,30 @@ def run_robust_ablation():
                         "ever_logic_failed": False
                     }
                     
-                    final_state = app.invoke(state)
+                    with trace_run("ablation_lcb", task_id=task_id, mode=mode, run=run_idx), ledger_scope() as ledger:
+                        final_state = app.invoke(state)
                     
-                    # Metrics
-                    latency = time.time() - start_time
-                    actual_cost = tracker.total_cost - cost_before
+                        # Metrics
+                        latency = time.time() - start_time
+                        actual_cost = ledger.total_cost
                     
-                    # Extract Code
-                    raw_code = final_state.get("draft_code", "")
-                    clean_code = extract_code_from_markdown(raw_code)
+                        # Extract Code
+                        raw_code = final_state.get("draft_code", "")
+                        clean_code = extract_code_from_markdown(raw_code)
                     
-                    try:
-                        test_cases = json.loads(item['public_test_cases'])
-                    except:
-                        test_cases = []
+                        try:
+                            test_cases = json.loads(item['public_test_cases'])
+                        except:
+                            test_cases = []
                     
-                    if not clean_code:
-                        exec_success = False
-                        exec_msg = "No code generated"
-                    elif not test_cases:
-                        exec_success = False
-                        exec_msg = "No test cases found"
-                    else:
-                        exec_success, exec_msg = execute_lcb_code(clean_code, test_cases)
+                        if not clean_code:
+                            exec_success = False
+                            exec_msg = "No code generated"
+                        elif not test_cases:
+                            exec_success = False
+                            exec_msg = "No test cases found"
+                        else:
+                            exec_success, exec_msg = execute_lcb_code(clean_code, test_cases)
                     
                     # Safety Check
                     safety_veto = final_state.get("safety_veto_triggered", False)
@@ -215,6 +220,11 @@ def run_robust_ablation():
                     processed_keys.add(unique_key)
 
     print(f"\n✅ Ablation Study Complete. Results saved to {DATA_FILE}")
+    # Pacing is handled by the shared rate limiter (no fixed sleeps between tasks)
+    for key, stats in get_rate_limit_stats().items():
+        print(f"   [RATE LIMIT] {key}: {stats}")
+    for key, stats in get_hedge_stats().items():
+        print(f"   [HEDGE] {key}: {stats}")
 
 if __name__ == "__main__":
     run_robust_ablation()
\ No newline at end of file
@@ -0,0 +1,318 @@
+# experiments/bench_orchestration.py
+"""
+Orchestration overhead benchmark.
+
+Drives build_graph() in every AB_MODES mode with a zero-latency stub LLM, so all measured
+time is LangGraph scheduling, the state reducers (reduce_critiques, request_cost), state
+copying, routing and the nodes' own Python (prompt building, print calls, cost logging).
+
+Reports per mode and scenario ("pass": first draft accepted, "fail": critics always reject,
+exercising retries and escalation):
+  - graph steps (node executions) per second, sequential and concurrent
+  - per-node time and orchestration overhead (wall time not spent inside node functions)
+  - peak traced memory per run
+
+Usage:
+    python experiments/bench_orchestration.py --save-baseline
+    python experiments/bench_orchestration.py --baseline data/bench_orchestration_baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Keep the benchmark hermetic: no durable checkpoint store, no fitted policy on disk
+os.environ.setdefault("CHECKPOINT_DB_PATH", "")
+os.environ.setdefault("ROUTING_POLICY_PATH", "")
+
+from langchain_core.messages import AIMessage
+
+import src.graph as graph_module
+import src.nodes as nodes_module
+from src.config import AB_MODES, EXPERIMENT_MODE
+from src.schemas import CritiqueResult, ChairmanOutput, CombinedCritiqueResult
+from src.state import reduce_critiques
+
+DEFAULT_OUT = "data/bench_orchestration.json"
+DEFAULT_BASELINE = "data/bench_orchestration_baseline.json"
+
+# Node functions as imported by src.graph (wrapped for per-node timing)
+NODE_FUNCTIONS = [
+    "prerouter_node", "generator_node", "critic_1", "critic_2",
+    "combined_critic_node", "chairman_node", "fallback_node"
+]
+
+STUB_DRAFT = "```python\ndef solve(nums):\n    return sum(nums)\n```"
+STUB_USAGE = {"token_usage": {"prompt_tokens": 300, "completion_tokens": 120}}
+
+
+# --- ZERO-LATENCY STUB LLM ---
+class StubLLM:
+    """Answers instantly. scenario='pass' approves every draft; 'fail' rejects every draft on logic."""
+
+    # Skips the shared rate limiter (see src/rate_limit.invoke_llm), like the replay backend
+    offline = True
+
+    def __init__(self, scenario: str, schema=None):
+        self.scenario, self.schema = scenario, schema
+
+    def with_structured_output(self, schema, **kwargs):
+        return StubLLM(self.scenario, schema)
+
+    def _verdict(self):
+        passing = self.scenario == "pass"
+        return CritiqueResult(feedback="OK" if passing else "Wrong answer on edge case",
+                              is_passing=passing, safety_violation=False)
+
+    def invoke(self, prompt, *args, **kwargs):
+        if self.schema is CritiqueResult:
+            return self._verdict()
+        if self.schema is CombinedCritiqueResult:
+            return CombinedCritiqueResult(logic=self._verdict(), security=self._verdict())
+        if self.schema is ChairmanOutput:
+            return ChairmanOutput(decision="PASS" if self.scenario == "pass" else "FAIL",
+                                  consolidated_feedback="Summary of the critics' findings.")
+        return AIMessage(content=STUB_DRAFT, response_metadata=STUB_USAGE)
+
+
+# --- PER-NODE TIMING ---
+class NodeTimer:
+    """Accumulates time spent inside node functions (thread-safe, for concurrent runs)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def timed(state):
+            start = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.seconds[name] += elapsed
+                    self.calls[name] += 1
+        return timed
+
+    @property
+    def steps(self) -> int:
+        return sum(self.calls.values())
+
+    @property
+    def node_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+
+@contextlib.contextmanager
+def instrumented(scenario: str, timer: NodeTimer):
+    """Swaps in the stub LLM and the timed node functions, restoring them afterwards."""
+    originals = {name: getattr(graph_module, name) for name in NODE_FUNCTIONS}
+    original_get_llm = nodes_module.get_llm
+    try:
+        nodes_module.get_llm = lambda model_name, temperature=0.0: StubLLM(scenario)
+        for name, fn in originals.items():
+            setattr(graph_module, name, timer.wrap(name, fn))
+        yield
+    finally:
+        nodes_module.get_llm = original_get_llm
+        for name, fn in originals.items():
+            setattr(graph_module, name, fn)
+
+
+def initial_state() -> dict:
+    """Same shape as the API's initial state."""
+    now = time.time()
+    return {
+        "task": "Given an integer array nums, return the sum of its elements. 1 <= len(nums) <= 10^5",
+        "difficulty": "medium",
+        "draft_code": "",
+        "iteration": 0,
+        "critiques": "DELETE",
+        "final_decision": "",
+        "critique_feedback": "",
+        "used_fallback": False,
+        "safety_veto_triggered": False,
+        "logic_failure_triggered": False,
+        "malicious_intent_triggered": False,
+        "cost_budget_usd": None,
+        "deadline": None,
+        "started_at": now,
+        "request_cost": 0.0
+    }
+
+
+# --- MEASUREMENTS ---
+def measure_sequential(graph, timer: NodeTimer, runs: int) -> dict:
+    timer.reset()
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        graph.invoke(initial_state())
+        walls.append(time.perf_counter() - start)
+    total = sum(walls)
+    steps = timer.steps
+    return {
+        "runs": runs,
+        "steps_per_run": steps / runs,
+        "steps_per_s": steps / total,
+        "run_ms_median": statistics.median(walls) * 1e3,
+        "run_ms_p95": sorted(walls)[int(0.95 * (runs - 1))] * 1e3,
+        "overhead_us_per_step": (total - timer.node_seconds) / steps * 1e6,
+        "overhead_fraction": (total - timer.node_seconds) / total,
+        "node_us": {name: timer.seconds[name] / timer.calls[name] * 1e6 for name in sorted(timer.calls)},
+    }
+
+
+def measure_concurrent(graph, timer: NodeTimer, runs: int, concurrency: int) -> dict:
+    timer.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: graph.invoke(initial_state()), range(runs)))
+    total = time.perf_counter() - start
+    return {"runs": runs, "concurrency": concurrency, "runs_per_s": runs / total, "steps_per_s": timer.steps / total}
+
+
+def measure_memory(graph, runs: int, concurrency: int) -> dict:
+    """Peak traced allocations for a single run, and per in-flight run under concurrency."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(runs):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            graph.invoke(initial_state())
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda _: graph.invoke(initial_state()), range(concurrency)))
+        concurrent_peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib_per_run": statistics.median(peaks) / 1024,
+        "peak_kib_per_concurrent_run": concurrent_peak / concurrency / 1024,
+    }
+
+
+def measure_reducer(n_critiques: int = 4, number: int = 20000) -> float:
+    """Microsecond cost of one reduce_critiques merge (fan-in of one critic into the list)."""
+    left = [CritiqueResult(feedback="x", is_passing=True, safety_violation=False)] * n_critiques
+    right = [CritiqueResult(feedback="y", is_passing=False, safety_violation=False)]
+    return timeit.timeit(lambda: reduce_critiques(left, right), number=number) / number * 1e6
+
+
+def bench(modes, scenarios, runs: int, repeats: int, concurrency: int, memory_runs: int) -> dict:
+    timer = NodeTimer()
+    results = {}
+    for scenario in scenarios:
+        with instrumented(scenario, timer):
+            for mode in modes:
+                # No verdict cache: cached PASS verdicts would skip the critics (and retries) in later runs
+                graph = graph_module.build_graph(mode).with_config(configurable={"verdict_cache": False})
+                # Warm-up: imports, first-call caches, thread pools
+                for _ in range(3):
+                    graph.invoke(initial_state())
+                # Median over repeats keeps the numbers stable enough for regression checks
+                samples = [measure_sequential(graph, timer, runs) for _ in range(repeats)]
+                sequential = sorted(samples, key=lambda s: s["steps_per_s"])[len(samples) // 2]
+                results[f"{mode}/{scenario}"] = {
+                    "sequential": sequential,
+                    "concurrent": measure_concurrent(graph, timer, runs, concurrency),
+                    "memory": measure_memory(graph, memory_runs, concurrency),
+                }
+    return results
+
+
+# --- REPORTING & REGRESSION CHECK ---
+def print_report(results: dict, reducer_us: float):
+    print(f"\n📊 Orchestration overhead (critic topology: {EXPERIMENT_MODE}, zero-latency stub LLM)")
+    print(f"{'mode/scenario':<26}{'steps/run':>10}{'steps/s':>10}{'conc steps/s':>14}"
+          f"{'ovh µs/step':>13}{'ovh %':>7}{'KiB/run':>9}")
+    for key, r in results.items():
+        s, c, m = r["sequential"], r["concurrent"], r["memory"]
+        print(f"{key:<26}{s['steps_per_run']:>10.1f}{s['steps_per_s']:>10.0f}{c['steps_per_s']:>14.0f}"
+              f"{s['overhead_us_per_step']:>13.0f}{s['overhead_fraction'] * 100:>6.0f}%{m['peak_kib_per_run']:>9.0f}")
+    print("\nPer-node time (µs per call):")
+    for key, r in results.items():
+        nodes = ", ".join(f"{name}={us:.0f}" for name, us in r["sequential"]["node_us"].items())
+        print(f"   {key:<24}{nodes}")
+    print(f"\nreduce_critiques merge: {reducer_us:.2f} µs")
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns regressions: throughput down or overhead up by more than `tolerance`."""
+    regressions = []
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        old, new = baseline[key]["sequential"], r["sequential"]
+        if new["steps_per_s"] < old["steps_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: steps/s {old['steps_per_s']:.0f} -> {new['steps_per_s']:.0f}")
+        if new["overhead_us_per_step"] > old["overhead_us_per_step"] * (1 + tolerance):
+            regressions.append(f"{key}: overhead µs/step {old['overhead_us_per_step']:.0f} -> {new['overhead_us_per_step']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LangGraph orchestration overhead with a zero-latency LLM.")
+    parser.add_argument("--modes", nargs="+", default=list(AB_MODES.values()), choices=list(AB_MODES.values()))
+    parser.add_argument("--scenarios", nargs="+", default=["pass", "fail"], choices=["pass", "fail"])
+    parser.add_argument("--runs", type=int, default=50, help="Graph invocations per measurement")
+    parser.add_argument("--repeats", type=int, default=5, help="Sequential measurements per mode (median is reported)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--memory-runs", type=int, default=10)
+    parser.add_argument("--verbose", action="store_true", help="Keep node print output on stdout (still timed either way)")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--baseline", default=None, help="Compare against a previous --out/--save-baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # Node prints still run (their cost is part of the overhead), they just go to /dev/null
+    sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with sink:
+        results = bench(args.modes, args.scenarios, args.runs, args.repeats, args.concurrency, args.memory_runs)
+        reducer_us = measure_reducer()
+
+    print_report(results, reducer_us)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {args.out}")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(DEFAULT_BASELINE) or ".", exist_ok=True)
+        with open(DEFAULT_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ Overhead regressions (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ No overhead regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# experiments/bench_startup.py
+"""
+Start-up time benchmark for the API and CLI entry points.
+
+Each entry point is imported in a fresh interpreter (median of several runs), so the numbers
+are what a new API replica or a short CLI invocation pays before doing any work. For every
+entry point it reports the import time, the heaviest top-level packages (`python -X importtime`)
+and which heavy dependencies were loaded eagerly. `api+graph` additionally compiles the default
+graph, i.e. the cost the first request pays when nothing was precompiled.
+
+The API import must stay within STARTUP_IMPORT_BUDGET_SECONDS; the script exits with 1 otherwise.
+
+Usage:
+    python experiments/bench_startup.py
+    python experiments/bench_startup.py --repeats 9 --budget 0.8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from src.config import STARTUP_IMPORT_BUDGET_SECONDS
+
+DEFAULT_OUT = "data/bench_startup.json"
+
+# Entry point -> code run in the fresh interpreter (timed from start to end)
+ENTRY_POINTS = {
+    "api": "import api.main",
+    "api+graph": "import api.main; api.main.get_graph()",
+    "cli:tracing": "import src.tracing",
+    "cli:checkpoint": "import src.checkpoint",
+    "cli:run_benchmark": "import run_benchmark",
+    "cli:ablation_lcb": "import ablation_lcb",
+    "cli:ablation_humaneval": "import ablation_humaneval",
+}
+# Dependencies that should only load when a code path actually needs them
+HEAVY_MODULES = ["langgraph", "langchain_openai", "pandas", "datasets", "tiktoken", "tqdm"]
+BUDGETED = "api"
+
+PROBE = """
+import sys, time, json
+sys.path[:0] = [{root!r}, {experiments!r}]
+t = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(code: str, importtime: bool = False) -> dict:
+    """Runs `code` in a fresh interpreter; with `importtime`, also returns the top packages by cumulative import time."""
+    script = PROBE.format(root=ROOT, experiments=os.path.join(ROOT, "experiments"), code=code, heavy=HEAVY_MODULES)
+    # Hermetic: no checkpoint store or trace file is opened during the measurement
+    env = {**os.environ, "CHECKPOINT_DB_PATH": "", "TRACE_PATH": ""}
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{code}' failed:\n{proc.stderr.strip()[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if importtime:
+        result["top_packages"] = parse_importtime(proc.stderr)
+    return result
+
+
+def parse_importtime(stderr: str, top: int = 6) -> dict:
+    """Seconds spent importing each top-level package (summed self time of its modules, so nothing is counted twice)."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return {pkg: round(s, 4) for pkg, s in sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]}
+
+
+def bench(entry_points, repeats: int) -> dict:
+    results = {}
+    for name in entry_points:
+        code = ENTRY_POINTS[name]
+        try:
+            detail = probe(code, importtime=True)
+            samples = [probe(code)["seconds"] for _ in range(repeats)]
+        except RuntimeError as e:
+            print(f"⚠️ {name}: {e}")
+            continue
+        results[name] = {
+            "median_s": statistics.median(samples),
+            "min_s": min(samples),
+            "heavy_loaded": detail["loaded"],
+            "top_packages_s": detail["top_packages"],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the API and CLI entry points.")
+    parser.add_argument("--entry-points", nargs="+", default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS))
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per entry point (median is reported)")
+    parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET_SECONDS,
+                        help=f"Maximum median import time of '{BUDGETED}' in seconds")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    results = bench(args.entry_points, args.repeats)
+
+    print(f"\n📊 Cold start ({args.repeats} fresh interpreters per entry point)")
+    print(f"{'entry point':<26}{'median s':>10}{'min s':>8}   heavy deps loaded")
+    for name, r in results.items():
+        print(f"{name:<26}{r['median_s']:>10.3f}{r['min_s']:>8.3f}   {', '.join(r['heavy_loaded']) or '-'}")
+    print("\nHeaviest packages (import s):")
+    for name, r in results.items():
+        packages = ", ".join(f"{pkg}={s:.3f}" for pkg, s in r["top_packages_s"].items())
+        print(f"   {name:<24}{packages}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"budget_s": args.budget, "results": results}, f, indent=2)
+    print(f"\n💾 Results saved to {args.out}")
+
+    if BUDGETED in results:
+        median = results[BUDGETED]["median_s"]
+        if median > args.budget:
+            print(f"\n❌ '{BUDGETED}' import takes {median:.3f}s (budget {args.budget:.3f}s)")
+            sys.exit(1)
+        print(f"\n✅ '{BUDGETED}' import {median:.3f}s within budget ({args.budget:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
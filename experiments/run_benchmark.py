@@ -1,22 +1,23 @@
 import sys
 import os
-import pandas as pd
 import time
-import tiktoken
-from tqdm import tqdm
 from langchain_core.callbacks import BaseCallbackHandler
 from typing import Dict, Any, List
 from uuid import UUID
 import json
 import textwrap
+# pandas, tqdm and datasets are imported where they are used: they dominate start-up time
 
 os.environ["HF_DATASETS_CACHE"] = "data/hf_cache" 
 os.environ["HF_HOME"] = "data/hf_home" 
 
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.graph import build_graph
-from src.utils import CostTracker
+from src.graph_registry import get_graph
+from src.cost_ledger import CostLedger, ledger_scope, estimate_cost
+from src.repair_context import repair_tokens_saved
+from src.incremental_critique import critique_tokens_saved
+from src.utils import count_tokens_batch
 from src.execution import extract_code_from_markdown, execute_humaneval_code, execute_lcb_code
 from src.reporting import RobustCaseStudyReporter
 
@@ -43,21 +44,16 @@ class LatencyTrackerCallback(BaseCallbackHandler):
             self.total_llm_time += duration
             del self.runs[run_id]
 
+# Reference model for the "what if every task went to the expert" baseline
+REFERENCE_MODEL = "o3-mini"
+
 def estimate_gpt_cost(prompt: str, completion: str):
     """
     Calculates how much it WOULD cost if we used fallback model for this task.
-    This is a rough estimate to test the system.
+    Tokens come from the shared (cached) token counter, prices from the pricing table.
     """
-    # --- PRICING CONSTANTS (Per 1M Tokens) ---
-    # Update these based on current API prices
-    PRICE_ref = {"input": 1.10, "output": 4.40} 
-    
-    enc = tiktoken.encoding_for_model("o3-mini")
-    in_tokens = len(enc.encode(prompt))
-    out_tokens = len(enc.encode(completion))
-    
-    cost = (in_tokens * PRICE_ref["input"] / 1e6) + (out_tokens * PRICE_ref["output"] / 1e6)
-    return cost
+    in_tokens, out_tokens = count_tokens_batch([prompt, completion], REFERENCE_MODEL)
+    return estimate_cost(REFERENCE_MODEL, in_tokens, out_tokens)
 
 def format_history_trace(trace_logs: list) -> str:
     """Formats the execution steps into a readable string for the CSV."""
@@ -88,9 +84,8 @@ def format_history_trace(trace_logs: list) -> str:
     return "".join(summary)
 
 
-from datasets import load_dataset
-
 def load_lcb_streaming(limit=50):
+    from datasets import load_dataset
     print(f"🚀 Streaming LiveCodeBench (Lite) - First {limit} LeetCode tasks...")
     
     # Key: streaming=True
@@ -121,21 +116,22 @@ def load_lcb_streaming(limit=50):
     return tasks
 
 def run_experiment():
+    import pandas as pd
+    from tqdm import tqdm
+
     #print("📥 Loading Dataset (HumanEval tasks)...")
     #dataset = load_dataset("openai_humaneval", split="test[32:33]") 
     dataset = load_lcb_streaming(limit=50)
     
-    app = build_graph()
+    # Verdict cache off: cached PASS verdicts from earlier tasks would shorten and under-price later runs
+    app = get_graph(verdict_cache=False)
     results = []
     
-    # Cost tracking
-    tracker = CostTracker()
-    initial_cost = tracker.total_cost
+    # Cost tracking: one ledger per task, rolled up into the session ledger
+    session_ledger = CostLedger()
 
     for item in tqdm(dataset, desc="Benchmarking"):
         latency_handler = LatencyTrackerCallback() # Reset for each task
-        # Snapshot Cost BEFORE running
-        start_total_cost = tracker.total_cost
         start_time = time.time()
 
         task_prompt = textwrap.dedent(fr"""\
@@ -155,6 +151,7 @@ def run_experiment():
         # Initial State
         state = {
             "task": task_prompt,
+            "difficulty": item['difficulty'],
             "draft_code": "",
             "iteration": 0,
             "critiques": [],
@@ -164,6 +161,7 @@ def run_experiment():
         }
 
         trace_logs = []
+        repair_context_log, critique_savings_log = [], [] # Token savings entries of the retry iterations
         history_snapshots = [] # Store snapshots for Case Study
         reporter = RobustCaseStudyReporter()
 
@@ -172,102 +170,107 @@ def run_experiment():
         
         try:
             # === EXECUTION WITH TRACING & CALLBACKS ===
-            # We use .stream() to capture the loop history
-            # We pass 'latency_handler' to capture LLM timings
-            for event in app.stream(state, config={"callbacks": [latency_handler]}):
-
-                # --- 1. Handle Code Updates (Generator OR Fallback) ---
-                # Check if a node updated 'draft_code'
-                current_node_name = next(iter(event))
-                node_output = event[current_node_name]
+            with ledger_scope() as task_ledger:
+                # We use .stream() to capture the loop history
+                # We pass 'latency_handler' to capture LLM timings
+                for event in app.stream(state, config={"callbacks": [latency_handler]}):
+
+                    # --- 1. Handle Code Updates (Generator OR Fallback) ---
+                    # Check if a node updated 'draft_code'
+                    current_node_name = next(iter(event))
+                    node_output = event[current_node_name]
                 
-                if "draft_code" in node_output:
-                    # We cannot allow the "DELETE" string to overwrite the list-type 'critiques'
-                    updates = node_output.copy()
-                    if updates.get("critiques") == "DELETE":
-                        updates["critiques"] = [] # Force local state to an empty list
-                        running_state["critiques"] = [] # Ensure running_state is reset
-                        running_state["safety_veto_triggered"] = False
-                        running_state["critique_feedback"] = ""
-
-                    # Update running state
-                    running_state.update(node_output)
+                    if "draft_code" in node_output:
+                        # We cannot allow the "DELETE" string to overwrite the list-type 'critiques'
+                        updates = node_output.copy()
+                        if updates.get("critiques") == "DELETE":
+                            updates["critiques"] = [] # Force local state to an empty list
+                            running_state["critiques"] = [] # Ensure running_state is reset
+                            running_state["safety_veto_triggered"] = False
+                            running_state["critique_feedback"] = ""
+
+                        # Update running state
+                        running_state.update(node_output)
                     
-                    # Distinguish between Generator and Fallback
-                    is_fallback = "fallback" in current_node_name or node_output.get("used_fallback", False)
+                        # Distinguish between Generator and Fallback
+                        is_fallback = "fallback" in current_node_name or node_output.get("used_fallback", False)
                     
-                    # Create Snapshot
-                    snapshot_iter = "Fallback (o3-mini)" if is_fallback else running_state.get("iteration", 0)
+                        # Create Snapshot
+                        snapshot_iter = "Fallback (o3-mini)" if is_fallback else running_state.get("iteration", 0)
 
-                    current_code = extract_code_from_markdown(node_output.get("draft_code", ""))
+                        current_code = extract_code_from_markdown(node_output.get("draft_code", ""))
                     
-                    history_snapshots.append({
-                        "iter": snapshot_iter,
-                        "draft_code": current_code,
-                        "critiques": [],
-                        "feedback": ""   
-                    })
+                        history_snapshots.append({
+                            "iter": snapshot_iter,
+                            "draft_code": current_code,
+                            "critiques": [],
+                            "feedback": ""   
+                        })
                     
-                    log_type = "fallback_update" if is_fallback else "generator_update"
-                    current_iter = running_state.get("iteration", 0)
-                    trace_logs.append({"type": log_type, "iter": current_iter})
-
-                # 2. Handle Critics (Accumulate Critiques)
-                # Check for any node outputting 'critiques' (logic, security, style)
-                for node_name, node_output in event.items():
-                    if "critiques" in node_output:
+                        log_type = "fallback_update" if is_fallback else "generator_update"
+                        current_iter = running_state.get("iteration", 0)
+                        trace_logs.append({"type": log_type, "iter": current_iter})
+
+                    # 2. Handle Critics (Accumulate Critiques)
+                    # Check for any node outputting 'critiques' (logic, security, style)
+                    for node_name, node_output in event.items():
+                        if "critiques" in node_output:
                     
-                        new_critiques = node_output["critiques"]
-                        # If this is the "DELETE" signal emitted by the Generator, skip concatenation
-                        if new_critiques == "DELETE":
-                            continue
+                            new_critiques = node_output["critiques"]
+                            # If this is the "DELETE" signal emitted by the Generator, skip concatenation
+                            if new_critiques == "DELETE":
+                                continue
 
-                        # Update running state
-                        existing = running_state.get("critiques", [])
-                        # Ensure 'existing' is a list (to prevent initialization issues)
-                        if not isinstance(existing, list): existing = []
-                        running_state["critiques"] = existing + new_critiques
+                            # Update running state
+                            existing = running_state.get("critiques", [])
+                            # Ensure 'existing' is a list (to prevent initialization issues)
+                            if not isinstance(existing, list): existing = []
+                            running_state["critiques"] = existing + new_critiques
 
                         
-                        # Update the CURRENT snapshot with these new critiques
-                        if history_snapshots:
-                            history_snapshots[-1]["critiques"].extend(new_critiques)
-
-                # 3. Capture Chairman Feedback (The 'Cause')
-                if "chairman" in event:
-                    chair_node = event["chairman"]
-                    # Update running state
-                    running_state.update(chair_node)
-                    decision = chair_node.get("final_decision")
-                    feedback = chair_node.get("critique_feedback", "")
+                            # Update the CURRENT snapshot with these new critiques
+                            if history_snapshots:
+                                history_snapshots[-1]["critiques"].extend(new_critiques)
+
+                    # 3. Capture Chairman Feedback (The 'Cause')
+                    if "chairman" in event:
+                        chair_node = event["chairman"]
+                        # Update running state
+                        running_state.update(chair_node)
+                        decision = chair_node.get("final_decision")
+                        feedback = chair_node.get("critique_feedback", "")
                     
-                    # Link feedback to the PREVIOUS code snapshot (which triggered it)
-                    if history_snapshots:
-                        history_snapshots[-1]["feedback"] = feedback
+                        # Link feedback to the PREVIOUS code snapshot (which triggered it)
+                        if history_snapshots:
+                            history_snapshots[-1]["feedback"] = feedback
 
-                    # Check for safety veto
-                    if chair_node.get("safety_veto_triggered", False):
-                         trace_logs.append({"type": "veto"})
+                        # Check for safety veto
+                        if chair_node.get("safety_veto_triggered", False):
+                             trace_logs.append({"type": "veto"})
                     
-                    if decision == "FAIL":
-                        trace_logs.append({
-                            "iter": running_state.get("iteration"),
-                            "type": "critic_feedback",
-                            "content": feedback
-                        })
-                    elif decision == "PASS":
-                        trace_logs.append({"type": "pass"})
+                        if decision == "FAIL":
+                            trace_logs.append({
+                                "iter": running_state.get("iteration"),
+                                "type": "critic_feedback",
+                                "content": feedback
+                            })
+                        elif decision == "PASS":
+                            trace_logs.append({"type": "pass"})
+
+                    # 4. Collect token savings (each update carries only its node's new entries)
+                    for node_output in event.values():
+                        repair_context_log.extend(node_output.get("repair_context_log") or [])
+                        critique_savings_log.extend(node_output.get("critique_savings_log") or [])
                     
-            # Snapshot Cost AFTER running
-            end_total_cost = tracker.total_cost
+            session_ledger.merge(task_ledger)
             
             # --- Extract Detailed Analysis Data ---
             # Latency Breakdown
             total_latency = time.time() - start_time
             llm_latency = latency_handler.total_llm_time
 
-            # A. Actual Cost (Delta)
-            task_actual_cost = end_total_cost - start_total_cost
+            # A. Actual Cost (this task's ledger)
+            task_actual_cost = task_ledger.total_cost
             
             # B. Baseline Cost (Hypothetical Expensive model)
             raw_output = running_state.get("draft_code", "")
@@ -356,6 +359,9 @@ def run_experiment():
                 "total_latency (s)": round(total_latency, 2),
                 "llm_latency (s)": round(llm_latency, 2),
                 "llm_time_share (%)": round((llm_latency / total_latency * 100), 1) if total_latency > 0 else 0,
+                # Token savings on retries
+                "repair_tokens_saved": repair_tokens_saved(repair_context_log),
+                "critique_tokens_saved": critique_tokens_saved(critique_savings_log),
                 # --- THE MONEY COLUMNS ---
                 "actual_cost ($)": round(task_actual_cost, 6),
                 "reference ($)": round(gpt_baseline_cost, 6),
@@ -381,10 +387,15 @@ def run_experiment():
     csv_path = "data/benchmark_results.csv"
     df.to_csv(csv_path, index=False)
     
-    session_cost = tracker.total_cost - initial_cost
+    ledger_path = "data/benchmark_cost_ledger.csv"
+    session_ledger.to_csv(ledger_path)
+    session_cost = session_ledger.total_cost
     print(f"\n✅ Benchmarking Complete!")
     print(f"Total Session Cost: ${session_cost:.4f}")
     print(f"Report saved to: {csv_path}")
+    print(f"Cost ledger saved to: {ledger_path}")
+    for node, stats in session_ledger.summary("node").items():
+        print(f"   [COST] {node}: {stats['calls']} calls, ${stats['cost_usd']:.4f}")
 
 if __name__ == "__main__":
     run_experiment()
\ No newline at end of file
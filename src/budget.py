@@ -0,0 +1,77 @@
+import time
+from typing import Tuple
+
+from src.config import REPAIR_CONTEXT_TOKEN_BUDGET, EXPECTED_OUTPUT_TOKENS, EXPECTED_STEP_LATENCY, ENSEMBLE_MODELS
+from src.state import AgentState
+from src.utils import count_tokens
+from src.cost_ledger import estimate_cost
+from src.run_settings import run_setting
+
+# Approximate size of a critic system prompt / chairman prompt scaffold (tokens)
+CRITIC_PROMPT_OVERHEAD = 400
+CHAIRMAN_PROMPT_TOKENS = 400
+
+
+def project_step_cost(state: AgentState, step: str) -> float:
+    """
+    Projects the dollar cost of the next router step from the per-model pricing table.
+    - "retry": one generator call (task + repair context) + the critic calls of the run's
+      experiment mode (two critics, or one council call in COMBINED) + one chairman.
+    - "escalate": one fallback call on the raw task.
+    """
+    task_tokens = count_tokens(state.get("task", ""))
+
+    if step == "escalate":
+        return estimate_cost(run_setting("fallback_model"), task_tokens, EXPECTED_OUTPUT_TOKENS["fallback"])
+
+    draft_tokens = EXPECTED_OUTPUT_TOKENS["generator"]
+    cost = estimate_cost(
+        run_setting("generator_model"), task_tokens + REPAIR_CONTEXT_TOKEN_BUDGET, EXPECTED_OUTPUT_TOKENS["generator"]
+    )
+    cost += project_critic_cost(task_tokens + draft_tokens)
+    cost += estimate_cost(run_setting("chairman_model"), CHAIRMAN_PROMPT_TOKENS, EXPECTED_OUTPUT_TOKENS["chairman"])
+    return cost
+
+
+def project_critic_cost(prompt_tokens: int) -> float:
+    """Cost of one round of critique over `prompt_tokens` of task + draft, by experiment mode."""
+    experiment_mode, output_tokens = run_setting("experiment_mode"), EXPECTED_OUTPUT_TOKENS["critic"]
+    if experiment_mode == "COMBINED":
+        # One call: both persona prompts in, both verdicts out
+        return estimate_cost(run_setting("critic_model"), 2 * CRITIC_PROMPT_OVERHEAD + prompt_tokens, 2 * output_tokens)
+    models = list(ENSEMBLE_MODELS.values()) if experiment_mode == "ENSEMBLE" else [run_setting("critic_model")] * 2
+    return sum(estimate_cost(model, CRITIC_PROMPT_OVERHEAD + prompt_tokens, output_tokens) for model in models)
+
+
+def project_step_latency(state: AgentState, step: str) -> float:
+    """
+    Projects the wall time of the next router step. A retry is assumed to take as long as
+    the average iteration observed so far in this request (falls back to the config prior).
+    """
+    if step == "retry":
+        started_at = state.get("started_at")
+        iteration = state.get("iteration", 0)
+        if started_at and iteration > 0:
+            return (time.time() - started_at) / iteration
+    return EXPECTED_STEP_LATENCY[step]
+
+
+def check_budget(state: AgentState, step: str) -> Tuple[bool, str]:
+    """
+    Returns (allowed, reason). Requests without a budget/deadline are always allowed.
+    """
+    cost_budget = state.get("cost_budget_usd")
+    if cost_budget is not None:
+        remaining = cost_budget - state.get("request_cost", 0.0)
+        projected = project_step_cost(state, step)
+        if projected > remaining:
+            return False, f"projected cost ${projected:.6f} exceeds remaining ${max(remaining, 0.0):.6f}"
+
+    deadline = state.get("deadline")
+    if deadline is not None:
+        remaining = deadline - time.time()
+        projected = project_step_latency(state, step)
+        if projected > remaining:
+            return False, f"expected latency {projected:.1f}s exceeds remaining {max(remaining, 0.0):.1f}s"
+
+    return True, ""
@@ -0,0 +1,192 @@
+# src/checkpoint.py
+"""
+Durable SQLite checkpointer for resumable graph runs.
+
+A request re-submitted with the same thread_id (the API's task_id) resumes from its last
+completed node instead of paying for all LLM calls again. The store is kept bounded by
+pruning (expired threads, superseded checkpoints) and periodic compaction (VACUUM).
+
+Manual maintenance:
+    python -m src.checkpoint --prune --compact
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from src.config import (
+    CHECKPOINT_DB_PATH, CHECKPOINT_TTL_SECONDS, CHECKPOINT_PRUNE_INTERVAL_SECONDS
+)
+from src.schemas import CritiqueResult, ChairmanOutput, CombinedCritiqueResult
+
+# Our own types stored in the graph state, registered so they deserialize without warnings
+STATE_TYPES = (CritiqueResult, ChairmanOutput, CombinedCritiqueResult)
+
+
+def state_serializer() -> JsonPlusSerializer:
+    """Checkpoint serializer that allows the built-in safe types plus STATE_TYPES."""
+    return JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES)
+
+# Compact (VACUUM) once this fraction of the file consists of free pages
+COMPACT_FREE_PAGE_RATIO = 0.25
+
+
+class DurableSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver with:
+    1. Async methods delegated to a worker thread, so the same store serves invoke() and astream().
+    2. A `thread_activity` table recording the last write per thread (used for TTL pruning).
+    3. Pruning and compaction so the database doesn't grow without bound.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, **kwargs):
+        kwargs.setdefault("serde", state_serializer())
+        super().__init__(conn, **kwargs)
+        self._last_prune = time.time()
+        self._prune_lock = threading.Lock()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    # --- Async API (delegated to the sync implementation in a worker thread) ---
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(self, *, config, channels):
+        return await asyncio.to_thread(self.get_delta_channel_history, config=config, channels=channels)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        return await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
+
+    # --- Retention ---
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """
+        "keep_latest": keep only the newest checkpoint (and its pending writes) per thread/namespace.
+        "delete": remove the threads entirely.
+        Our state channels are plain values/reducers (no DeltaChannel), so the newest checkpoint
+        holds the complete state and older ones are only history.
+        """
+        if strategy == "delete":
+            for thread_id in thread_ids:
+                self.delete_thread(thread_id)
+            return
+        with self.cursor() as cur:
+            for thread_id in thread_ids:
+                cur.execute(
+                    """
+                    DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN (
+                        SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns
+                    )
+                    """,
+                    (str(thread_id), str(thread_id)),
+                )
+                cur.execute(
+                    """
+                    DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (
+                        SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id
+                        AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                    """,
+                    (str(thread_id),),
+                )
+
+    def prune_store(self, ttl_seconds: float = CHECKPOINT_TTL_SECONDS) -> Dict[str, int]:
+        """Deletes threads idle for longer than the TTL and drops superseded checkpoints of the rest."""
+        cutoff = time.time() - ttl_seconds
+        with self.cursor() as cur:
+            expired = [r[0] for r in cur.execute("SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,))]
+            active = [r[0] for r in cur.execute("SELECT thread_id FROM thread_activity WHERE updated_at >= ?", (cutoff,))]
+        self.prune(expired, strategy="delete")
+        self.prune(active, strategy="keep_latest")
+        return {"expired_threads": len(expired), "active_threads": len(active)}
+
+    def compact(self, force: bool = False) -> bool:
+        """VACUUMs the database if enough pages are free (or if forced). Returns True if compacted."""
+        with self.cursor() as cur:
+            page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        if not force and (page_count == 0 or free_pages / page_count < COMPACT_FREE_PAGE_RATIO):
+            return False
+        with self.lock:
+            self.conn.commit()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("VACUUM")
+        return True
+
+    def maybe_maintain(self, interval_seconds: float = CHECKPOINT_PRUNE_INTERVAL_SECONDS) -> Optional[Dict[str, int]]:
+        """Cheap to call on every request: prunes/compacts at most once per interval."""
+        if time.time() - self._last_prune < interval_seconds or not self._prune_lock.acquire(blocking=False):
+            return None
+        try:
+            self._last_prune = time.time()
+            stats = self.prune_store()
+            stats["compacted"] = int(self.compact())
+            return stats
+        finally:
+            self._prune_lock.release()
+
+
+def get_checkpointer(path: str = CHECKPOINT_DB_PATH) -> DurableSqliteSaver:
+    """Opens (or creates) the durable checkpoint store."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return DurableSqliteSaver(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the graph checkpoint store.")
+    parser.add_argument("--db", default=CHECKPOINT_DB_PATH)
+    parser.add_argument("--ttl", type=float, default=CHECKPOINT_TTL_SECONDS, help="Idle seconds before a thread is deleted")
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument("--compact", action="store_true")
+    args = parser.parse_args()
+
+    saver = get_checkpointer(args.db)
+    if args.prune:
+        print(f"🧹 Pruned: {saver.prune_store(args.ttl)}")
+    if args.compact:
+        saver.compact(force=True)
+        print(f"🗜️ Compacted {args.db} ({os.path.getsize(args.db) / 1024:.1f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,15 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+# --- LLM BACKEND (record / replay) ---
+# live:   call the providers (default)
+# record: call the providers and append every response to the cassette
+# replay: serve responses from the cassette, offline (no API keys, no rate limiting)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "live")
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "data/cassettes/llm_calls.jsonl")
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "recorded")  # "recorded" or fixed seconds per call (e.g. "0")
+REPLAY_STRICT = os.getenv("REPLAY_STRICT", "0") == "1"     # Unseen prompt: error (1) or reuse a recording of the same model/schema (0)
+
 # --- ABLATION STUDY MODES ---
 # MODE_BASELINE: Cheap model generates once. No Critics, No Loop, No Expensive model.
 # MODE_LOOP: Cheap model + Critics. Retries locally on failure. No Expensive model.
@@ -21,14 +30,160 @@ AB_MODES = {
     "FULL_SYSTEM": "full_system",
     "REFERENCE": "reference"
 }
+# Default to FULL_SYSTEM if no mode is provided
+DEFAULT_MODE = AB_MODES["FULL_SYSTEM"]
 
 # Config for Retries
 MAX_RETRIES = 2
 
+# --- REPAIR CONTEXT (Retry Prompt Budget) ---
+# On retries, the generator receives a compacted repair context (code only, relevant region,
+# de-duplicated example I/O) instead of the raw previous markdown draft.
+ENABLE_REPAIR_CONTEXT = True
+REPAIR_CONTEXT_TOKEN_BUDGET = 1200
+
+# --- TOKEN COUNTING ---
+# Counts are cached per (encoding, prompt segment); see utils.TokenCounter.
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+# --- INCREMENTAL CRITIQUE (Retry Iterations) ---
+# From the second draft on, critics get their previous verdict + the diff + the changed region
+# instead of the full code. The Security critic reuses its previous PASS when the diff touches
+# no security-relevant constructs. Large rewrites (changed-line ratio above the limit) get a full review.
+INCREMENTAL_CRITIQUE = True
+INCREMENTAL_MAX_CHANGED_RATIO = 0.5
+
+# --- CRITIC VERDICT CACHE ---
+# Verdicts keyed by persona, model, prompt mode, task and the normalized AST of the code, so a
+# re-submitted draft (same code modulo comments/formatting) is not critiqued again.
+# VERDICT_CACHE_PATH (SQLite) persists verdicts across runs; empty = in-memory only.
+# Per-run setting `verdict_cache`: benchmarks and ablations turn it off so every run pays full price.
+VERDICT_CACHE = True
+VERDICT_CACHE_SIZE = 1024
+VERDICT_CACHE_PATH = os.getenv("VERDICT_CACHE_PATH", "")
+
+# --- TRACING ---
+# One trace per graph run (API request / benchmark task): node, LLM-call and sandbox spans,
+# written to a rotating JSONL file (python -m src.tracing <trace_id> prints the critical path).
+TRACING_ENABLED = True
+TRACE_PATH = os.getenv("TRACE_PATH", "data/traces/spans.jsonl")  # empty = tracing off
+TRACE_MAX_BYTES = 20 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+# --- REQUEST BUDGETS (Cost / Deadline) ---
+# A request may carry a dollar budget and a deadline. The router projects the cost and latency
+# of the next step ("retry" = generator + critics + chairman, "escalate" = fallback) and skips it
+# if it would exceed what remains. Output-token and latency figures are conservative priors.
+EXPECTED_OUTPUT_TOKENS = {"generator": 600, "critic": 150, "chairman": 150, "fallback": 3000}
+EXPECTED_STEP_LATENCY = {"retry": 10.0, "escalate": 30.0}  # seconds
+
+# --- ADAPTIVE ESCALATION POLICY ---
+# Per-difficulty P(success on next local retry), fitted offline from the evaluation history
+# (python -m src.routing_policy). In FULL_SYSTEM mode the router escalates early when the
+# estimate falls below the threshold. Without a fitted policy file, MAX_RETRIES applies as before.
+ADAPTIVE_ESCALATION = True
+ROUTING_POLICY_PATH = os.getenv("ROUTING_POLICY_PATH", "data/routing_policy.json")
+ESCALATION_MIN_RETRY_SUCCESS = 0.25
+
+# --- PRE-ROUTER (FULL_SYSTEM) ---
+# Before the first draft, estimate P(solved by the local loop) from the fitted policy (difficulty
+# history), discounted for long prompts and large input constraints. Tasks below the threshold
+# go straight to the fallback model instead of burning every local retry first.
+ENABLE_PREROUTER = True
+PREROUTE_MIN_LOCAL_SUCCESS = 0.4
+PREROUTE_LONG_PROMPT_TOKENS = 500    # Prompt length considered "long"
+PREROUTE_LARGE_CONSTRAINT = 10**5    # Input bound that demands an efficient algorithm
+
+# --- CHECKPOINTING (Resumable Runs) ---
+# SQLite store for graph checkpoints; a request with the same thread_id resumes from its last
+# completed node. Set CHECKPOINT_DB_PATH="" to disable. Idle threads are deleted after the TTL.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite")
+CHECKPOINT_TTL_SECONDS = 24 * 3600
+CHECKPOINT_PRUNE_INTERVAL_SECONDS = 600
+
+# --- JOB API (POST /api/v1/jobs) ---
+# Generation jobs run on a bounded pool of graph runners. Submissions beyond the queue depth
+# are rejected (429 with Retry-After) instead of piling up; finished jobs are kept for
+# JOB_RESULT_TTL_SECONDS.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "64"))
+JOB_RESULT_TTL_SECONDS = 3600
+JOB_MAX_WAIT_SECONDS = 30            # Upper bound for long-polling (GET ...?wait=)
+
+# --- BATCH API (POST /api/v1/generate/batch) ---
+# Graphs of one batch run concurrently (bounded per batch) and share the process-wide rate limiter.
+BATCH_MAX_TASKS = 100
+BATCH_MAX_CONCURRENCY = 8
+
+# --- REQUEST COALESCING (API) ---
+# Identical concurrent requests (same prompt and run parameters) share one graph run; a finished
+# result is reused for COALESCE_REUSE_SECONDS (0 = only coalesce runs that are still in flight).
+ENABLE_COALESCING = True
+COALESCE_REUSE_SECONDS = float(os.getenv("COALESCE_REUSE_SECONDS", "30"))
+COALESCE_MAX_ENTRIES = 256
+
+# --- ADMISSION CONTROL (API) ---
+# At most ADMISSION_MAX_IN_FLIGHT graph runs execute at once; others wait by priority class
+# (lower rank starts first). Beyond ADMISSION_MAX_QUEUE waiting runs, requests get 429 + Retry-After.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_INITIAL_RUN_SECONDS = 30.0  # Run-time prior for Retry-After until runs have finished
+PRIORITY_CLASSES = {"interactive": 0, "standard": 1, "batch": 2}
+
+# --- SANDBOX POOL (POST /api/v1/execute) ---
+# Test execution runs in SANDBOX_WORKERS worker processes. At most SANDBOX_MAX_PENDING executions
+# may be running or waiting; further requests are rejected (503). A worker still busy after
+# SANDBOX_EXECUTION_TIMEOUT_SECONDS (module setup included) is killed and replaced; workers are also
+# replaced after a timed-out test and every SANDBOX_TASKS_PER_WORKER executions.
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "4"))
+SANDBOX_MAX_PENDING = int(os.getenv("SANDBOX_MAX_PENDING", "32"))
+SANDBOX_TASKS_PER_WORKER = 50
+SANDBOX_TEST_TIMEOUT_SECONDS = 2.0   # Per test case
+SANDBOX_EXECUTION_TIMEOUT_SECONDS = 20.0  # Per execution, wall clock in the worker process
+SANDBOX_TIMEOUT_SECONDS = 30.0       # Per request, including the wait for a worker
+SANDBOX_MAX_TESTS = 200
+SANDBOX_MAX_CODE_CHARS = 100_000
+EXECUTION_CACHE_SIZE = 2048          # Results keyed by normalized-AST code hash + tests (timeouts are not cached)
+
+# --- WEBSOCKET PROGRESS CHANNEL (/api/v1/generate/ws) ---
+# With confirm_escalation, a run pauses before the fallback model until the client approves.
+# Unanswered requests count as declined after this many seconds (the run keeps its admission slot).
+ESCALATION_APPROVAL_TIMEOUT_SECONDS = 300.0
+
+# --- STARTUP (API replicas / CLI entry points) ---
+# Heavy dependencies (langgraph, langchain_openai, pandas, datasets) are imported on first use.
+# The API compiles these modes in the background after startup; others compile on first request.
+API_PRECOMPILE_MODES = [m for m in os.getenv("API_PRECOMPILE_MODES", "full_system").split(",") if m]
+STARTUP_IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "1.0"))  # experiments/bench_startup.py
+
+# --- RATE LIMITS (shared by every node, per provider and model) ---
+# Requests and tokens per minute. Overrides apply to single models (e.g. tighter free tiers).
+# On 429 the limiter honours Retry-After and halves its rate, recovering gradually on success.
+RATE_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200000},
+    "openrouter": {"rpm": 20, "tpm": 100000}
+}
+RATE_LIMIT_MODEL_OVERRIDES = {
+    # "o3-mini": {"rpm": 100, "tpm": 100000}
+}
+LLM_MAX_RETRIES = 4              # Retries on 429 / transient errors (client-side retries are disabled)
+RETRY_BASE_DELAY_SECONDS = 1.0   # Exponential backoff base (full jitter)
+
+# --- HEDGING (critic / chairman tail latency) ---
+# If a call is still running after the HEDGE_PERCENTILE of its recent latencies, a duplicate
+# is sent and the first response wins. The discarded response is still paid for (and logged).
+ENABLE_HEDGING = True
+HEDGE_PERCENTILE = 0.95
+HEDGE_WINDOW_SIZE = 100          # Recent latencies kept per call key
+HEDGE_MIN_SAMPLES = 10           # No hedging until the window has this many samples
+HEDGE_MIN_DELAY_SECONDS = 1.0    # Never hedge earlier than this
+HEDGE_MAX_IN_FLIGHT = 16         # Attempts running at once; beyond it calls run unhedged (never queued)
+
 # --- EXPERIMENT SETTINGS ---
 # Mode "PERSONA": One model with different prompts (Thesis Core)
 # Mode "ENSEMBLE": Different models with generic prompt (Comparison Study)
-EXPERIMENT_MODE = "PERSONA" 
+# Mode "COMBINED": One structured call returns both the Logic and Security verdicts (Cost Study)
+EXPERIMENT_MODE = os.getenv("EXPERIMENT_MODE", "PERSONA")
 
 # --- MODEL NAMES ---
 # Generator: The worker (Cheap/Fast)
@@ -51,6 +206,22 @@ ENSEMBLE_MODELS = {
     # "critic_3": "google/gemma-3-27b-it:free"
 }
 
+# --- PRICING (USD per 1M tokens, used by src/cost_ledger.py) ---
+# "cached" = price of prompt tokens served from the provider's prompt cache.
+# Any ":free" OpenRouter model costs nothing; unknown models are priced at DEFAULT_MODEL_PRICE
+# (the expert rate, so unknown spend is never under-reported). PRICING_PATH may point to a JSON
+# file of the same shape to override / extend the table without a code change.
+MODEL_PRICES = {
+    "gpt-4.1-nano": {"in": 0.10, "out": 0.40, "cached": 0.025},
+    "gpt-4.1-mini": {"in": 0.40, "out": 1.60, "cached": 0.10},
+    "gpt-4.1": {"in": 2.00, "out": 8.00, "cached": 0.50},
+    "gpt-4o-mini": {"in": 0.15, "out": 0.60, "cached": 0.075},
+    "o3-mini": {"in": 1.10, "out": 4.40, "cached": 0.55},
+    "o4-mini": {"in": 1.10, "out": 4.40, "cached": 0.275},
+}
+DEFAULT_MODEL_PRICE = {"in": 1.10, "out": 4.40, "cached": 0.55}
+PRICING_PATH = os.getenv("PRICING_PATH", "")
+
 # --- PROMPTS (THE CONSTITUTION) ---
 PROMPT_MODE = "NORMAL"
 
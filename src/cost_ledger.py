@@ -0,0 +1,218 @@
+# src/cost_ledger.py
+"""
+Request-scoped cost ledger.
+
+Every priced LLM call is appended to the ledger of the current scope (a contextvar, so
+concurrent API requests and parallel benchmark tasks never see each other's spend, and
+LangGraph's worker threads inherit the scope of the run that spawned them). Entries are
+stored column-wise in typed arrays - (model, node, input, output, cached, cost) - so a run
+costs a few dozen bytes per call, totals are O(1) and group-bys are a single pass.
+
+    with ledger_scope() as ledger:
+        app.invoke(state)
+    ledger.total_cost, ledger.summary("node"), ledger.to_csv("data/costs.csv")
+
+Closing a nested scope merges its entries into the enclosing one (task -> session).
+Calls made outside any scope land in a process-wide ledger, which keeps totals only (it
+lives as long as the process, so it must not grow per call).
+"""
+import contextvars
+import csv
+import json
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config import MODEL_PRICES, DEFAULT_MODEL_PRICE, PRICING_PATH
+from src.metrics import METRICS
+
+COLUMNS = ("model", "node", "input_tokens", "output_tokens", "cached_tokens", "cost_usd")
+FREE_PRICE = {"in": 0.0, "out": 0.0, "cached": 0.0}
+
+# --- PRICING ---
+_prices: Optional[Dict[str, Dict[str, float]]] = None
+
+
+def load_prices(path: str = PRICING_PATH) -> Dict[str, Dict[str, float]]:
+    """MODEL_PRICES, overridden / extended by the JSON table at `path` (if any)."""
+    prices = {model: dict(rate) for model, rate in MODEL_PRICES.items()}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for model, rate in json.load(f).items():
+                prices[model] = {**DEFAULT_MODEL_PRICE, **rate}
+    return prices
+
+
+def get_price(model_name: str) -> Dict[str, float]:
+    """Per-1M-token input/output/cached-input price for a model."""
+    global _prices
+    if _prices is None:
+        _prices = load_prices()
+    if model_name in _prices:
+        return _prices[model_name]
+    if model_name.endswith(":free"):
+        return FREE_PRICE
+    # Dated snapshots ("gpt-4.1-nano-2025-04-14") and provider prefixes ("openai/o3-mini")
+    base = model_name.split("/")[-1]
+    for known in sorted(_prices, key=len, reverse=True):
+        if base.startswith(known):
+            return _prices[known]
+    return DEFAULT_MODEL_PRICE
+
+
+def estimate_cost(model_name: str, input_tokens: float, output_tokens: float, cached_tokens: float = 0) -> float:
+    """Prices a (projected or actual) call without logging it. `input_tokens` includes cached ones."""
+    rate = get_price(model_name)
+    cached = min(cached_tokens, input_tokens)
+    return ((input_tokens - cached) * rate["in"] + cached * rate.get("cached", rate["in"]) + output_tokens * rate["out"]) / 1e6
+
+
+def cached_tokens(usage: Dict[str, Any]) -> int:
+    """Prompt tokens served from the provider's cache (OpenAI `prompt_tokens_details`)."""
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or 0
+
+
+# --- LEDGER ---
+# Model / node names are interned once per process so entries are plain integers and
+# merging a child ledger into its parent is an array extend.
+_names: List[str] = []
+_name_ids: Dict[str, int] = {}
+_names_lock = threading.Lock()
+
+
+def _intern(name: str) -> int:
+    idx = _name_ids.get(name)
+    if idx is None:
+        with _names_lock:
+            idx = _name_ids.setdefault(name, len(_names))
+            if idx == len(_names):
+                _names.append(name)
+    return idx
+
+
+class CostLedger:
+    """Append-only, column-oriented record of priced LLM calls (`itemized=False`: total cost only)."""
+
+    def __init__(self, itemized: bool = True):
+        self.itemized = itemized
+        self._lock = threading.Lock()
+        self._model = array("I")
+        self._node = array("I")
+        self._in = array("d")
+        self._out = array("d")
+        self._cached = array("d")
+        self._cost = array("d")
+        self.total_cost = 0.0
+
+    def __len__(self) -> int:
+        return len(self._cost)
+
+    def record(self, model_name: str, input_tokens: float, output_tokens: float,
+               cached_tokens: float = 0, node: str = "", cost: Optional[float] = None) -> float:
+        if cost is None:
+            cost = estimate_cost(model_name, input_tokens, output_tokens, cached_tokens)
+        if not self.itemized:
+            with self._lock:
+                self.total_cost += cost
+            return cost
+        model_id, node_id = _intern(model_name), _intern(node)
+        with self._lock:
+            self._model.append(model_id)
+            self._node.append(node_id)
+            self._in.append(input_tokens)
+            self._out.append(output_tokens)
+            self._cached.append(cached_tokens)
+            self._cost.append(cost)
+            self.total_cost += cost
+        return cost
+
+    def merge(self, other: "CostLedger"):
+        """Appends all of `other`'s entries (closing a nested scope)."""
+        with other._lock:
+            columns = (other._model, other._node, other._in, other._out, other._cached, other._cost)
+            columns = tuple(array(c.typecode, c) for c in columns)
+            total = other.total_cost
+        with self._lock:
+            if self.itemized:
+                for mine, theirs in zip((self._model, self._node, self._in, self._out, self._cached, self._cost), columns):
+                    mine.extend(theirs)
+            self.total_cost += total
+
+    def summary(self, by: str = "model") -> Dict[str, Dict[str, float]]:
+        """Calls, tokens and cost grouped by "model" or "node"."""
+        if by not in ("model", "node"):
+            raise ValueError(f"Unknown group-by column: {by}")
+        with self._lock:
+            keys = array("I", self._model if by == "model" else self._node)
+            columns = (array("d", self._in), array("d", self._out), array("d", self._cached), array("d", self._cost))
+        groups: Dict[int, List[float]] = {}
+        for i, key in enumerate(keys):
+            acc = groups.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0])
+            acc[0] += 1
+            for j, column in enumerate(columns, start=1):
+                acc[j] += column[i]
+        return {
+            _names[key]: {"calls": acc[0], "input_tokens": acc[1], "output_tokens": acc[2],
+                          "cached_tokens": acc[3], "cost_usd": acc[4]}
+            for key, acc in groups.items()
+        }
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            columns = tuple(list(c) for c in (self._model, self._node, self._in, self._out, self._cached, self._cost))
+        for model_id, node_id, in_tokens, out_tokens, cached, cost in zip(*columns):
+            yield dict(zip(COLUMNS, (_names[model_id], _names[node_id], in_tokens, out_tokens, cached, cost)))
+
+    def to_csv(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(list(self.rows()), columns=list(COLUMNS))
+
+    def to_parquet(self, path: str):
+        """Requires pandas plus a Parquet engine (pyarrow or fastparquet)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.to_dataframe().to_parquet(path, index=False)
+
+
+_PROCESS_LEDGER = CostLedger(itemized=False)
+_current: contextvars.ContextVar[Optional[CostLedger]] = contextvars.ContextVar("cost_ledger", default=None)
+
+
+def current_ledger() -> CostLedger:
+    """Ledger of the enclosing scope, or the process-wide one outside any scope."""
+    ledger = _current.get()
+    return _PROCESS_LEDGER if ledger is None else ledger
+
+
+@contextmanager
+def ledger_scope(merge: bool = True):
+    """Opens a fresh ledger for one request / task; on exit its entries roll up into the enclosing scope."""
+    parent = _current.get()
+    ledger = CostLedger()
+    token = _current.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current.reset(token)
+        if merge and parent is not None:
+            parent.merge(ledger)
+
+
+def log_usage(model_name: str, input_tokens: float, output_tokens: float,
+              cached_tokens: float = 0, node: str = "") -> float:
+    """Prices a finished call, appends it to the current ledger and returns its cost."""
+    cost = current_ledger().record(model_name, input_tokens, output_tokens, cached_tokens, node)
+    for direction, tokens in (("input", input_tokens), ("output", output_tokens)):
+        METRICS.inc("agent_llm_tokens_total", tokens, model=model_name, direction=direction)
+        METRICS.observe("agent_llm_call_tokens", tokens, model=model_name, direction=direction)
+    METRICS.inc("agent_llm_cost_usd_total", cost, model=model_name)
+    return cost
@@ -12,8 +12,12 @@ import re
 import io
 import contextlib
 import inspect
+import time
 import unicodedata
 
+from src.metrics import timed_sandbox
+from src.tracing import traced_sandbox
+
 # ==========================================
 # Shared Utilities
 # ==========================================
@@ -209,27 +213,33 @@ def try_parse_printed_output(s: str):
     except Exception:
         return s
 
-def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -> tuple[bool, str]:
+def test_result(index: int, status: str, message: str, seconds: float) -> dict:
+    """One test's outcome: status is passed, failed, timeout or error."""
+    return {"index": index, "status": status, "passed": status == "passed", "message": message, "seconds": round(seconds, 4)}
+
+def run_lcb_tests(code_raw: str, test_cases: list, entry_point: str = None, stop_on_failure: bool = True,
+                  test_timeout: float = 2.0) -> tuple[bool, str, list]:
     """
     Executes LCB code using inspect.signature.bind() to resolve argument mismatches.
     Supports zero-arg 'solve()' functions by piping the raw test input into stdin.
+    Returns (passed, message, per-test results); setup failures have no per-test results.
     """
     # 1. Clean Code
     code = clean_code_string(code_raw)
     if not code:
-        return False, "Empty code"
+        return False, "Empty code", []
 
     # 2. Syntax Check
     try:
         tree = ast.parse(code)
     except SyntaxError as e:
-        return False, f"Syntax Error: {e}"
+        return False, f"Syntax Error: {e}", []
 
     # 3. Find Entry Point
     if not entry_point:
         top_functions = [n.name for n in tree.body if isinstance(n, ast.FunctionDef)]
         if not top_functions:
-            return False, "No function found"
+            return False, "No function found", []
         candidates = [f for f in top_functions if f.lower() in [
             'solution', 'solve', 'countgoodintegers', 'max_bitwise_or',
             'max_bitwise_or_after_k_operations'
@@ -243,7 +253,7 @@ def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -
         exec(code, global_scope)
         func = global_scope.get(entry_point)
         if not func:
-            return False, f"Function '{entry_point}' not found"
+            return False, f"Function '{entry_point}' not found", []
 
         # --- Obtain function signature ---
         try:
@@ -376,7 +386,7 @@ def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -
             t = threading.Thread(target=target)
             t.daemon = True
             t.start()
-            t.join(2) # 2 seconds timeout
+            t.join(test_timeout) # 2 seconds by default
 
             if t.is_alive(): raise TimeoutException("Timeout")
             if result_queue.empty(): raise TimeoutException("No result returned")
@@ -388,9 +398,11 @@ def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -
             return val
 
         # 5. Run Test Cases
+        results = []
         for i, case in enumerate(test_cases):
             input_raw = case.get('input')
             output_raw = case.get('output')
+            start = time.perf_counter()
             
             try:
                 args = parse_lcb_input(input_raw)
@@ -398,22 +410,39 @@ def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -
                 
                 result = run_once(args, input_raw)
                 
-                if not flexible_equal(result, expected):
-                    return False, f"Test {i+1} Failed. Expected {expected}, Got {result}. Input: {input_raw}"
+                if flexible_equal(result, expected):
+                    status, message = "passed", "Passed"
+                else:
+                    status, message = "failed", f"Test {i+1} Failed. Expected {expected}, Got {result}. Input: {input_raw}"
                     
             except TimeoutException:
-                return False, f"Timeout on Test {i+1}"
+                status, message = "timeout", f"Timeout on Test {i+1}"
             except Exception as e:
-                return False, f"Runtime Error on Test {i+1}: {e}"
+                status, message = "error", f"Runtime Error on Test {i+1}: {e}"
+
+            results.append(test_result(i, status, message, time.perf_counter() - start))
+            # A timed-out test leaves its thread running: never start more work next to it
+            if status != "passed" and (stop_on_failure or status == "timeout"):
+                break
 
     except Exception as e:
-        return False, f"Setup Error: {e}"
+        return False, f"Setup Error: {e}", []
+
+    failed = next((r for r in results if not r["passed"]), None)
+    return (True, "Passed", results) if failed is None else (False, failed["message"], results)
 
-    return True, "Passed"
+@timed_sandbox("lcb")
+@traced_sandbox("lcb")
+def execute_lcb_code(code_raw: str, test_cases: list, entry_point: str = None) -> tuple[bool, str]:
+    """Pass/fail of LCB code, stopping at the first failing test (see run_lcb_tests)."""
+    passed, message, _ = run_lcb_tests(code_raw, test_cases, entry_point)
+    return passed, message
 
 # ==========================================
 # Legacy Support
 # ==========================================
+@timed_sandbox("humaneval")
+@traced_sandbox("humaneval")
 def execute_humaneval_code(code: str, test_case: str, entry_point: str, timeout: int = 3):
     full_code = f"{code}\n\n{test_case}\ncheck({entry_point})"
     f = io.StringIO()
@@ -431,3 +460,103 @@ def execute_humaneval_code(code: str, test_case: str, entry_point: str, timeout:
     except Exception as e:
         if has_alarm: signal.alarm(0)
         return False, f"Runtime Error: {str(e)}"
+
+def _call_with_timeout(fn, timeout: float):
+    """Runs fn() on a daemon thread; raises TimeoutException if it has not returned in time."""
+    outcome = queue.Queue()
+    def target():
+        try:
+            outcome.put(("success", fn()))
+        except BaseException as e:
+            outcome.put(("error", e))
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout)
+    if t.is_alive():
+        raise TimeoutException("Timeout")
+    status, val = outcome.get()
+    if status == "error":
+        raise val
+    return val
+
+def _check_steps(check: ast.FunctionDef, scope: dict, candidate):
+    """
+    The body of `check` as (is_test, step) pairs run statement by statement with `candidate` bound
+    as a global, or None when a statement only compiles inside a function (e.g. an early `return`).
+    """
+    steps = []
+    for stmt in check.body:
+        try:
+            compiled = compile(ast.Module(body=[stmt], type_ignores=[]), "<check>", "exec")
+        except SyntaxError:
+            return None
+        is_test = any(isinstance(n, ast.Assert) for n in ast.walk(stmt))
+        steps.append((is_test, lambda compiled=compiled: exec(compiled, scope)))
+    scope[check.args.args[0].arg] = candidate
+    return steps
+
+
+def run_humaneval_tests(code: str, test_case: str, entry_point: str, stop_on_failure: bool = False,
+                        test_timeout: float = 3.0) -> tuple[bool, str, list]:
+    """
+    Per-test variant of execute_humaneval_code: every statement of `check(candidate)` that
+    contains an assert is one test (other statements run as setup, in order). Test code without
+    a `check` function runs as a single test. Stops at the first timeout.
+    """
+    try:
+        test_tree = ast.parse(test_case)
+        scope = {'__name__': '__main__'}
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, scope)
+            exec(compile(test_tree, "<tests>", "exec"), scope)
+        candidate = scope[entry_point]
+    except Exception as e:
+        return False, f"Setup Error: {e}", []
+
+    check = next((n for n in test_tree.body if isinstance(n, ast.FunctionDef) and n.name == "check"), None)
+    steps = _check_steps(check, scope, candidate) if check is not None and check.args.args else None
+    if steps is None:
+        steps = [(True, lambda: scope["check"](candidate))] if "check" in scope else []
+
+    results = []
+    for is_test, step in steps:
+        index, start = len(results), time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                _call_with_timeout(step, test_timeout)
+            status, message = "passed", "Passed"
+        except TimeoutException:
+            status, message = "timeout", f"Timeout on Test {index+1}"
+        except AssertionError as e:
+            status, message = "failed", f"Test {index+1} Failed{': ' + str(e) if str(e) else ''}"
+        except Exception as e:
+            status, message = "error", f"Runtime Error on Test {index+1}: {e}"
+        if is_test or status != "passed":
+            results.append(test_result(index, status, message, time.perf_counter() - start))
+        if status != "passed" and (stop_on_failure or not is_test or status == "timeout"):
+            # A failing setup statement leaves the remaining tests without their context
+            break
+
+    failed = next((r for r in results if not r["passed"]), None)
+    if failed is not None:
+        return False, failed["message"], results
+    return (True, "Passed", results) if results else (False, "No tests found", results)
+
+RUNNERS = {"lcb": run_lcb_tests, "humaneval": run_humaneval_tests}
+
+def run_tests(runner: str, code: str, tests, entry_point: str = None, stop_on_failure: bool = False,
+              test_timeout: float = 2.0) -> dict:
+    """Per-test execution in one call; the entry point of the sandbox worker processes (src/sandbox.py)."""
+    start = time.perf_counter()
+    passed, message, results = RUNNERS[runner](code, tests, entry_point, stop_on_failure=stop_on_failure,
+                                               test_timeout=test_timeout)
+    return {"passed": passed, "message": message, "tests": results, "seconds": round(time.perf_counter() - start, 4)}
+
+def serve(conn):
+    """Main loop of a sandbox worker process: one (runner, args...) task in, one run_tests result out."""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        conn.send(run_tests(*task))
@@ -1,14 +1,15 @@
 from langgraph.graph import StateGraph, END
 from src.state import AgentState
-from src.config import MAX_RETRIES, AB_MODES
+from src.config import MAX_RETRIES, AB_MODES, DEFAULT_MODE, ADAPTIVE_ESCALATION, EXPERIMENT_MODE, ENABLE_PREROUTER
+from src.budget import check_budget
+from src.routing_policy import get_policy
+from src.prerouter import prerouter_node
+from src.metrics import METRICS
 from src.nodes import (
     generator_node, chairman_node, fallback_node,
-    critic_1, critic_2
+    critic_1, critic_2, combined_critic_node
 )
 
-# Default to FULL_SYSTEM if no mode is provided
-DEFAULT_MODE = AB_MODES["FULL_SYSTEM"]
-
 def get_router_logic(mode: str):
     """
     Returns the routing logic based on the selected mode.
@@ -19,6 +20,22 @@ def get_router_logic(mode: str):
         iteration = state.get("iteration", 0)
         safety_triggered = state.get("safety_veto_triggered", False)
 
+        def within_budget(step: str) -> bool:
+            # Per-request cost/deadline budget: skip steps whose projection exceeds what remains
+            allowed, reason = check_budget(state, step)
+            if not allowed:
+                print(f"   [ROUTER] 💸 Budget exhausted: skipping {step} ({reason}).")
+            return allowed
+
+        def retry_is_hopeless() -> bool:
+            # Adaptive policy: is another cheap local retry unlikely to succeed for this difficulty?
+            policy = get_policy() if ADAPTIVE_ESCALATION else None
+            if policy and policy.should_escalate_early(state.get("difficulty"), iteration):
+                p = policy.p_success(state.get("difficulty"), iteration + 1)
+                print(f"   [ROUTER] 📉 P(success on next retry)={p:.2f}. Escalating early.")
+                return True
+            return False
+
         # --- 0. MALICIOUS INTENT LOGIC (ABSOLUTE STOP) ---
         malicious_intent = state.get("malicious_intent_triggered", False)
         if malicious_intent:
@@ -38,7 +55,7 @@ def get_router_logic(mode: str):
         if safety_triggered:
             # Only retry if we are in a mode that supports looping
             if mode in [AB_MODES["LOOP_ONLY"], AB_MODES["FULL_SYSTEM"]]:
-                if iteration < MAX_RETRIES:
+                if iteration < MAX_RETRIES and within_budget("retry"):
                     print("   [ROUTER] ⚠️ Safety Issue detected. Retrying locally to fix...")
                     return "retry"
             # If max retries reached OR mode doesn't support loop -> Hard Stop
@@ -49,28 +66,46 @@ def get_router_logic(mode: str):
         
         # Mode: LOOP_ONLY (Retry locally, then give up)
         if mode == AB_MODES["LOOP_ONLY"]:
-            if iteration < MAX_RETRIES:
+            if iteration < MAX_RETRIES and within_budget("retry"):
                 return "retry"
             return "end"
 
         # Mode: FALLBACK_ONLY (No retry, immediate escalation)
         if mode == AB_MODES["FALLBACK_ONLY"]:
-            return "escalate"
+            if within_budget("escalate"):
+                METRICS.inc("agent_escalations_total", source="router")
+                return "escalate"
+            return "end"
 
         # Mode: FULL_SYSTEM (Retry first, then Escalate)
+        # If the budget cannot cover another local retry, try the (single) escalation instead.
         if mode == AB_MODES["FULL_SYSTEM"]:
-            if iteration < MAX_RETRIES:
+            if iteration < MAX_RETRIES and not retry_is_hopeless() and within_budget("retry"):
                 return "retry"
-            return "escalate"
+            if within_budget("escalate"):
+                METRICS.inc("agent_escalations_total", source="router")
+                return "escalate"
+            return "end"
 
         return "end"
 
     return router
 
-def build_graph(mode: str = DEFAULT_MODE):
+def route_after_prerouter(state: AgentState):
+    """Sends tasks the pre-router judged hopeless for the local loop straight to the fallback."""
+    if state.get("prerouted") and check_budget(state, "escalate")[0]:
+        METRICS.inc("agent_escalations_total", source="prerouter")
+        return "escalate"
+    return "generate"
+
+def build_graph(mode: str = DEFAULT_MODE, checkpointer=None, experiment_mode: str = EXPERIMENT_MODE):
     """
     Builds the execution graph.
     Supports both 'run_benchmark.py' (detailed tracing) and 'run_ablation.py' (modes).
+    An optional checkpointer (see src/checkpoint.py) persists state per thread_id, so
+    interrupted runs can resume from their last completed node.
+    `experiment_mode` picks the critic topology (COMBINED: one council node); prefer
+    src.graph_registry.get_graph(), which compiles each variant only once.
     """
     workflow = StateGraph(AgentState)
 
@@ -79,7 +114,7 @@ def build_graph(mode: str = DEFAULT_MODE):
         workflow.add_node("reference", fallback_node)
         workflow.set_entry_point("reference")
         workflow.add_edge("reference", END)
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
 
     # --- Add Nodes ---
     workflow.add_node("generator", generator_node)
@@ -88,11 +123,17 @@ def build_graph(mode: str = DEFAULT_MODE):
     if mode == AB_MODES["BASELINE"]:
         workflow.set_entry_point("generator")
         workflow.add_edge("generator", END)
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
 
     # Complex Modes: Add Council
-    workflow.add_node("critic_logic", critic_1)
-    workflow.add_node("critic_security", critic_2)
+    # COMBINED: a single critic call produces both verdicts; otherwise two parallel critics.
+    if experiment_mode == "COMBINED":
+        critic_nodes = ["critic_council"]
+        workflow.add_node("critic_council", combined_critic_node)
+    else:
+        critic_nodes = ["critic_logic", "critic_security"]
+        workflow.add_node("critic_logic", critic_1)
+        workflow.add_node("critic_security", critic_2)
     workflow.add_node("chairman", chairman_node)
     
     # Add Fallback only if mode supports it
@@ -100,15 +141,22 @@ def build_graph(mode: str = DEFAULT_MODE):
         workflow.add_node("fallback", fallback_node)
 
     # --- Define Edges ---
-    workflow.set_entry_point("generator")
-
-    # Fan-out (Parallel Critics)
-    workflow.add_edge("generator", "critic_logic")
-    workflow.add_edge("generator", "critic_security")
+    # FULL_SYSTEM: a cheap pre-routing stage may skip the local loop for likely-hopeless tasks
+    if mode == AB_MODES["FULL_SYSTEM"] and ENABLE_PREROUTER:
+        workflow.add_node("prerouter", prerouter_node)
+        workflow.set_entry_point("prerouter")
+        workflow.add_conditional_edges(
+            "prerouter",
+            route_after_prerouter,
+            {"generate": "generator", "escalate": "fallback"}
+        )
+    else:
+        workflow.set_entry_point("generator")
 
-    # Fan-in (Aggregation)
-    workflow.add_edge("critic_logic", "chairman")
-    workflow.add_edge("critic_security", "chairman")
+    # Fan-out (Parallel Critics) and Fan-in (Aggregation)
+    for critic in critic_nodes:
+        workflow.add_edge("generator", critic)
+        workflow.add_edge(critic, "chairman")
 
     # --- Conditional Routing ---
     # Define the map based on what the router returns
@@ -135,4 +183,4 @@ def build_graph(mode: str = DEFAULT_MODE):
     if mode in [AB_MODES["FALLBACK_ONLY"], AB_MODES["FULL_SYSTEM"]]:
         workflow.add_edge("fallback", END)
 
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -0,0 +1,68 @@
+# src/graph_registry.py
+"""
+Registry of compiled graphs.
+
+Compiling a StateGraph is not free, and the API and experiment scripts used to rebuild the
+same topology for every request / run. `get_graph(mode, **settings)` compiles each AB_MODES
+variant (per critic topology and checkpointer) once and hands out the same object afterwards.
+Model and prompt-mode overrides do not change the topology: they are bound onto the cached
+graph via `with_config(configurable=...)` and read by the nodes through src.run_settings.
+
+    app = get_graph("baseline")
+    app = get_graph("full_system", generator_model="gpt-4.1-mini", prompt_mode="GENERIC")
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import AB_MODES, DEFAULT_MODE
+from src.run_settings import RUN_SETTING_DEFAULTS
+
+_compiled: Dict[Tuple[str, str, int], Tuple[Any, Any]] = {}
+_bound: Dict[Tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    """Accepts an AB_MODES key ("BASELINE") or value ("baseline"); None means the default mode."""
+    if mode is None:
+        return DEFAULT_MODE
+    if mode in AB_MODES.values():
+        return mode
+    if mode.upper() in AB_MODES:
+        return AB_MODES[mode.upper()]
+    raise ValueError(f"Unknown mode '{mode}' (expected one of {list(AB_MODES.values())})")
+
+
+def get_graph(mode: Optional[str] = DEFAULT_MODE, checkpointer=None, **settings):
+    """
+    Compiled graph for `mode`, built on first use. `settings` override RUN_SETTING_DEFAULTS
+    (generator_model, critic_model, chairman_model, fallback_model, prompt_mode, experiment_mode,
+    verdict_cache).
+    """
+    mode = resolve_mode(mode)
+    unknown = set(settings) - set(RUN_SETTING_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown run settings: {sorted(unknown)}")
+    overrides = {k: v for k, v in settings.items() if v is not None and v != RUN_SETTING_DEFAULTS[k]}
+    experiment_mode = overrides.get("experiment_mode", RUN_SETTING_DEFAULTS["experiment_mode"])
+
+    # The checkpointer is kept alongside its graph so id() stays unique while cached
+    graph_key = (mode, experiment_mode, id(checkpointer))
+    bound_key = (graph_key, tuple(sorted(overrides.items())))
+    with _lock:
+        bound = _bound.get(bound_key)
+        if bound is not None:
+            return bound
+        if graph_key not in _compiled:
+            # Deferred: importing the graph pulls in langgraph and the LLM clients
+            from src.graph import build_graph
+            _compiled[graph_key] = (build_graph(mode, checkpointer=checkpointer, experiment_mode=experiment_mode), checkpointer)
+        graph = _compiled[graph_key][0]
+        bound = _bound[bound_key] = graph.with_config(configurable=overrides) if overrides else graph
+        return bound
+
+
+def clear():
+    with _lock:
+        _compiled.clear()
+        _bound.clear()
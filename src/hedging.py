@@ -0,0 +1,197 @@
+# src/hedging.py
+"""
+Hedged LLM calls for the short structured critic/chairman requests.
+
+Latency of these calls has a long tail (especially OpenRouter free-tier models), and one
+slow critic holds up the Chairman and with it the whole iteration. `hedged_invoke` tracks
+recent latencies per call key; if a call has not returned by the HEDGE_PERCENTILE of that
+window, a duplicate is sent and whichever answers first wins. Each attempt goes through
+`invoke_llm`, so the shared rate limiter and bounded jittered retries still apply.
+
+Attempts never queue: the executor has HEDGE_MAX_IN_FLIGHT threads and an attempt only goes
+there if it can take one of as many slots. Otherwise the call runs unhedged on the caller's
+thread, so queueing delay can neither inflate the recorded latencies nor trigger more hedges.
+
+The losing attempt is still billed. Its cost is charged when the race is decided and returned
+to the caller, which adds it to the node's `request_cost` like its own call, so the response
+cost and the budget check include it and nothing is logged after the request has finished.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import (
+    ENABLE_HEDGING, HEDGE_PERCENTILE, HEDGE_WINDOW_SIZE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_MAX_IN_FLIGHT
+)
+from src.rate_limit import invoke_llm
+from src.utils import count_tokens
+from src.cost_ledger import log_usage, cached_tokens
+from src.metrics import METRICS
+from src.tracing import current_span
+
+# Primary + hedge attempts run here so the caller can wait on whichever finishes first. One slot
+# per thread: an attempt that holds a slot starts immediately
+_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_IN_FLIGHT, thread_name_prefix="hedge")
+_slots = threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+
+
+class LatencyWindow:
+    """Sliding window of recent call latencies for one call key, with hedge counters."""
+
+    def __init__(self, size: int = HEDGE_WINDOW_SIZE):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "saturated": 0, "discarded_cost_usd": 0.0}
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile of the window, or None while it has fewer than HEDGE_MIN_SAMPLES."""
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def bump(self, counter: str, amount: float = 1):
+        with self.lock:
+            self.stats[counter] += amount
+
+
+_windows: Dict[str, LatencyWindow] = {}
+_registry_lock = threading.Lock()
+
+
+def get_latency_window(key: str) -> LatencyWindow:
+    with _registry_lock:
+        if key not in _windows:
+            _windows[key] = LatencyWindow()
+        return _windows[key]
+
+
+def get_hedge_stats() -> Dict[str, dict]:
+    """Per call key: calls, hedge rate, hedge win rate and the cost of discarded responses."""
+    with _registry_lock:
+        windows = dict(_windows)
+    report = {}
+    for key, window in windows.items():
+        stats = dict(window.stats)
+        stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 3) if stats["calls"] else 0.0
+        stats["win_rate"] = round(stats["hedge_wins"] / stats["hedged"], 3) if stats["hedged"] else 0.0
+        report[key] = stats
+    return report
+
+
+def _collect_metrics():
+    stats = get_hedge_stats()
+    for stat, kind, help_text in (
+        ("calls", "counter", "Hedge-eligible LLM calls."),
+        ("hedged", "counter", "Calls for which a duplicate request was sent."),
+        ("hedge_wins", "counter", "Hedged calls won by the duplicate."),
+        ("saturated", "counter", "Calls run without (or without further) hedging because all attempt slots were busy."),
+        ("discarded_cost_usd", "counter", "Cost of discarded (losing) responses."),
+        ("hedge_rate", "gauge", "Fraction of calls that were hedged."),
+        ("win_rate", "gauge", "Fraction of hedged calls won by the duplicate."),
+    ):
+        suffix = "_total" if kind == "counter" else ""
+        yield (f"agent_hedge_{stat}{suffix}", kind, help_text, [({"key": key}, s[stat]) for key, s in stats.items()])
+
+
+METRICS.register_collector(_collect_metrics)
+
+
+def _log_discarded(window: LatencyWindow, model_name: str, prompt: Any, expected_output_tokens: int, future) -> float:
+    """
+    Charges the losing attempt to the current request and returns its cost. A loser that already
+    answered is priced from its usage; one still in flight is priced from the prompt and the
+    expected output, since it is billed in full once sent.
+    """
+    if future.done() and (future.cancelled() or future.exception() is not None):
+        return 0.0
+    usage = {}
+    if future.done():
+        metadata = getattr(future.result(), "response_metadata", None) or {}
+        usage = metadata.get("token_usage") or {}
+    in_tokens = usage.get("prompt_tokens") or count_tokens(str(prompt), model_name)
+    out_tokens = usage.get("completion_tokens", expected_output_tokens)
+    cost = log_usage(model_name, in_tokens, out_tokens, cached_tokens(usage), node="hedge_discarded")
+    window.bump("discarded_cost_usd", cost)
+    return cost
+
+
+def _submit(llm, model_name: str, prompt: Any):
+    """Starts an attempt on the executor if a slot is free, else returns None (never queues)."""
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        # A copy of the caller's context, so the attempt's LLM span nests under the node span
+        future = _executor.submit(contextvars.copy_context().run, invoke_llm, llm, model_name, prompt)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda f: _slots.release())
+    return future
+
+
+def hedged_invoke(llm, model_name: str, prompt: Any, key: Optional[str] = None,
+                  expected_output_tokens: int = 150) -> Tuple[Any, float]:
+    """
+    Replacement for `invoke_llm` that hedges slow calls. Returns the winning response and the
+    cost of the discarded attempt (0.0 unless a hedge was sent), which the caller adds to its cost.
+    `key` groups calls with comparable latency (defaults to the model name).
+    """
+    if not ENABLE_HEDGING:
+        return invoke_llm(llm, model_name, prompt), 0.0
+
+    window = get_latency_window(key or model_name)
+    window.bump("calls")
+    threshold = window.percentile(HEDGE_PERCENTILE)
+    start = time.monotonic()
+
+    primary = _submit(llm, model_name, prompt) if threshold is not None else None
+    if primary is None:
+        # Not enough history yet, or no free attempt slot: plain call, just record its latency
+        if threshold is not None:
+            window.bump("saturated")
+        result = invoke_llm(llm, model_name, prompt)
+        window.record(time.monotonic() - start)
+        return result, 0.0
+
+    done, _ = wait([primary], timeout=max(threshold, HEDGE_MIN_DELAY_SECONDS))
+    hedge = None if done else _submit(llm, model_name, prompt)
+    if hedge is None:
+        if not done:
+            window.bump("saturated")
+        result = primary.result()
+        window.record(time.monotonic() - start)
+        return result, 0.0
+
+    window.bump("hedged")
+    pending, winner, error = {primary, hedge}, None, None
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                winner = future
+                break
+            error = future.exception()
+    if winner is None:
+        raise error
+
+    loser = hedge if winner is primary else primary
+    discarded_cost = _log_discarded(window, model_name, prompt, expected_output_tokens, loser)
+    if winner is hedge:
+        window.bump("hedge_wins")
+    span = current_span()
+    if span is not None:
+        span.set(hedged=True, hedge_won=winner is hedge)
+    print(f"   [HEDGE] {key or model_name}: primary exceeded p{int(HEDGE_PERCENTILE * 100)} ({threshold:.1f}s), "
+          f"{'hedge' if winner is hedge else 'primary'} won")
+    window.record(time.monotonic() - start)
+    return winner.result(), discarded_cost
@@ -0,0 +1,97 @@
+# src/incremental_critique.py
+"""
+Diff-aware incremental critique for retry iterations.
+
+After the first draft, a retry usually changes a few lines. Instead of re-reading the whole
+task + draft, each critic receives its previous verdict, the unified diff and the changed
+region. When the diff touches no security-relevant construct, the Security critic's previous
+PASS is reused without a call. Every decision is logged with the tokens it saved.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src.config import INCREMENTAL_MAX_CHANGED_RATIO, EXPECTED_OUTPUT_TOKENS
+from src.execution import extract_code_from_markdown
+from src.repair_context import select_relevant_region
+from src.schemas import CritiqueResult
+from src.utils import code_diff, count_tokens
+
+# Constructs whose addition/removal needs a fresh security review
+RISKY_CONSTRUCTS = re.compile(
+    r"\b(import|__import__|eval|exec|compile|open|subprocess|os|sys|shutil|socket|"
+    r"requests|urllib|http|pickle|marshal|ctypes|getattr|setattr|delattr|globals|locals|__\w+__)\b"
+)
+
+
+def changed_lines(diff: str) -> List[str]:
+    """Added/removed lines of a unified diff (without the +/- prefix)."""
+    return [
+        line[1:] for line in diff.splitlines()
+        if line.startswith(("+", "-")) and not line.startswith(("+++", "---"))
+    ]
+
+
+def touches_risky_constructs(diff: str) -> bool:
+    return any(RISKY_CONSTRUCTS.search(line) for line in changed_lines(diff))
+
+
+def previous_verdict(previous_critiques: List[CritiqueResult], role: str) -> Optional[CritiqueResult]:
+    for critique in previous_critiques or []:
+        if critique.critic_role == role:
+            return critique
+    return None
+
+
+def incremental_prompt(sys_prompt: str, task: str, verdict: CritiqueResult, diff: str, region: str) -> str:
+    status = "PASS" if verdict.is_passing else "FAIL"
+    return (
+        f"{sys_prompt}\n\nTask: {task}\n"
+        f"You already reviewed a previous draft of this code. Your verdict was {status}: {verdict.feedback}\n"
+        f"Changes since that review (unified diff):\n```diff\n{diff}\n```\n"
+        f"Revised code (changed region; omitted parts are unchanged):\n```python\n{region}\n```\n"
+        "Judge the revised code as a whole. Unchanged parts were covered by your previous review."
+    )
+
+
+def plan_critique(state: dict, role: str, sys_prompt: str, full_prompt: str,
+                  model_name: str) -> Tuple[Optional[CritiqueResult], str, Optional[dict]]:
+    """
+    Decides how a critic reviews the current draft. Returns (reused_verdict, prompt, log_entry):
+    - a reused verdict (no call) when the code is unchanged, or when a Security PASS stands
+      because the diff touches no risky construct;
+    - an incremental prompt (previous verdict + diff + changed region) when it is smaller;
+    - otherwise the full prompt and no log entry.
+    """
+    verdict = previous_verdict(state.get("previous_critiques"), role)
+    previous_code = extract_code_from_markdown(state.get("previous_draft_code") or "")
+    if verdict is None or not previous_code:
+        return None, full_prompt, None
+
+    current_code = extract_code_from_markdown(state["draft_code"])
+    diff = code_diff(previous_code, current_code)
+    tokens_full = count_tokens(full_prompt, model_name)
+    entry = {"iteration": state.get("iteration", 0), "role": role, "tokens_full": tokens_full}
+
+    reuse = not diff or (
+        role == "Security" and verdict.is_passing and not verdict.safety_violation
+        and not touches_risky_constructs(diff)
+    )
+    if reuse:
+        return verdict.model_copy(), "", {**entry, "mode": "reused", "tokens_sent": 0,
+                                          "tokens_saved": tokens_full + EXPECTED_OUTPUT_TOKENS["critic"]}
+
+    total_lines = max(len(current_code.splitlines()), 1)
+    if len(changed_lines(diff)) / total_lines > INCREMENTAL_MAX_CHANGED_RATIO:
+        return None, full_prompt, None
+
+    region = select_relevant_region(current_code, "\n".join(changed_lines(diff)))
+    prompt = incremental_prompt(sys_prompt, state["task"], verdict, diff, region)
+    tokens_sent = count_tokens(prompt, model_name)
+    if tokens_sent >= tokens_full:
+        return None, full_prompt, None
+    return None, prompt, {**entry, "mode": "diff", "tokens_sent": tokens_sent, "tokens_saved": tokens_full - tokens_sent}
+
+
+def critique_tokens_saved(savings_log: List[Dict]) -> int:
+    """Critic tokens saved over a run by diffs, reused and cached verdicts (from the state's critique_savings_log)."""
+    return sum(entry["tokens_saved"] for entry in savings_log or [])
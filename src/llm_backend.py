@@ -0,0 +1,150 @@
+# src/llm_backend.py
+"""
+Record/replay backend behind `get_llm`.
+
+LLM_BACKEND=record wraps the live client and appends every response (content,
+response_metadata incl. token_usage, structured outputs, latency) to a JSONL cassette.
+LLM_BACKEND=replay serves those responses offline with synthetic latency, so the graph,
+sandbox and API can be profiled without keys, spend or network noise.
+
+    LLM_BACKEND=record python experiments/run_benchmark.py
+    LLM_BACKEND=replay REPLAY_LATENCY=0 python experiments/run_benchmark.py
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from src.config import LLM_CASSETTE_PATH, REPLAY_LATENCY, REPLAY_STRICT
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for a call."""
+
+
+def _prompt_text(prompt: Any) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, list):
+        return "\n".join(getattr(m, "content", str(m)) for m in prompt)
+    return str(prompt)
+
+
+def cassette_key(model_name: str, temperature: float, schema: Optional[str], prompt: Any) -> str:
+    raw = json.dumps([model_name, temperature, schema, _prompt_text(prompt)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Append-only JSONL store of recorded calls. Repeated calls replay their recordings in order."""
+
+    def __init__(self, path: str = LLM_CASSETTE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_key: Dict[str, List[dict]] = defaultdict(list)
+        self.by_model: Dict[tuple, List[dict]] = defaultdict(list)
+        self.cursor: Dict[Any, int] = defaultdict(int)
+        self.stats = {"recorded": 0, "hits": 0, "fallback_hits": 0, "misses": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: dict):
+        self.by_key[entry["key"]].append(entry)
+        self.by_model[(entry["model"], entry["schema"])].append(entry)
+
+    def record(self, entry: dict):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self._index(entry)
+            self.stats["recorded"] += 1
+
+    def _next(self, bucket_id, entries: List[dict]) -> dict:
+        entry = entries[self.cursor[bucket_id] % len(entries)]
+        self.cursor[bucket_id] += 1
+        return entry
+
+    def lookup(self, key: str, model_name: str, schema: Optional[str]) -> dict:
+        with self.lock:
+            if self.by_key.get(key):
+                self.stats["hits"] += 1
+                return self._next(key, self.by_key[key])
+            candidates = self.by_model.get((model_name, schema))
+            if candidates and not REPLAY_STRICT:
+                self.stats["fallback_hits"] += 1
+                return self._next((model_name, schema), candidates)
+            self.stats["misses"] += 1
+        raise CassetteMiss(f"❌ No recording for {model_name} ({schema or 'text'}) in {self.path}. Re-run with LLM_BACKEND=record.")
+
+
+_cassettes: Dict[str, Cassette] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cassette(path: str = LLM_CASSETTE_PATH) -> Cassette:
+    with _registry_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+class RecordingLLM:
+    """Wraps a live client and records every response to the cassette."""
+
+    def __init__(self, llm, cassette: Cassette, model_name: str, temperature: float, schema=None):
+        self.llm, self.cassette = llm, cassette
+        self.model_name, self.temperature, self.schema = model_name, temperature, schema
+
+    def with_structured_output(self, schema, **kwargs):
+        return RecordingLLM(self.llm.with_structured_output(schema, **kwargs), self.cassette,
+                            self.model_name, self.temperature, schema)
+
+    def invoke(self, prompt, *args, **kwargs):
+        start = time.monotonic()
+        result = self.llm.invoke(prompt, *args, **kwargs)
+        schema_name = self.schema.__name__ if self.schema else None
+        self.cassette.record({
+            "key": cassette_key(self.model_name, self.temperature, schema_name, prompt),
+            "model": self.model_name,
+            "schema": schema_name,
+            "latency": round(time.monotonic() - start, 3),
+            "content": None if self.schema else result.content,
+            "response_metadata": None if self.schema else result.response_metadata,
+            "structured": result.model_dump() if self.schema else None,
+        })
+        return result
+
+
+class ReplayLLM:
+    """Offline stand-in for the live client, serving recorded responses."""
+
+    # invoke_llm skips the shared rate limiter for offline backends
+    offline = True
+
+    def __init__(self, cassette: Cassette, model_name: str, temperature: float, schema=None):
+        self.cassette = cassette
+        self.model_name, self.temperature, self.schema = model_name, temperature, schema
+
+    def with_structured_output(self, schema, **kwargs):
+        return ReplayLLM(self.cassette, self.model_name, self.temperature, schema)
+
+    def invoke(self, prompt, *args, **kwargs):
+        schema_name = self.schema.__name__ if self.schema else None
+        entry = self.cassette.lookup(
+            cassette_key(self.model_name, self.temperature, schema_name, prompt), self.model_name, schema_name
+        )
+        latency = entry["latency"] if REPLAY_LATENCY == "recorded" else float(REPLAY_LATENCY)
+        if latency > 0:
+            time.sleep(latency)
+        if self.schema:
+            return self.schema.model_validate(entry["structured"])
+        return AIMessage(content=entry["content"], response_metadata=entry["response_metadata"] or {})
@@ -0,0 +1,200 @@
+# src/metrics.py
+"""
+Low-overhead instrumentation shared by the nodes, the cost tracker, the sandbox and the API,
+exported at GET /metrics in the Prometheus text exposition format.
+
+Hot-path writes go to a per-thread shard (a plain dict only its own thread mutates), so no
+lock is taken per observation; shards are summed when /metrics is scraped. The shard of a
+finished thread is folded into a retired total, so short-lived threads do not pile up shards.
+Components that keep their own counters (rate limiter, hedging, verdict cache) register
+scrape-time collectors.
+"""
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# name -> (type, help, buckets)
+METRIC_DEFINITIONS = {
+    "agent_node_latency_seconds": ("histogram", "Wall time per graph node execution.", LATENCY_BUCKETS),
+    "agent_llm_call_tokens": ("histogram", "Tokens per LLM call.", TOKEN_BUCKETS),
+    "agent_llm_tokens_total": ("counter", "LLM tokens by model and direction.", None),
+    "agent_llm_cost_usd_total": ("counter", "Estimated LLM cost by model.", None),
+    "agent_requests_total": ("counter", "Finished API requests by endpoint and status.", None),
+    "agent_request_latency_seconds": ("histogram", "End-to-end API request latency.", LATENCY_BUCKETS),
+    "agent_requests_in_flight": ("gauge", "API requests currently running.", None),
+    "agent_escalations_total": ("counter", "Escalations to the fallback model by source.", None),
+    "agent_vetoes_total": ("counter", "Chairman vetoes by kind (safety, logic, malicious).", None),
+    "agent_sandbox_seconds": ("histogram", "Sandboxed test execution time.", LATENCY_BUCKETS),
+    "agent_sandbox_runs_total": ("counter", "Sandboxed executions by runner and outcome.", None),
+    "agent_sandbox_pending": ("gauge", "Sandbox pool executions running or waiting for a worker.", None),
+    "agent_sandbox_rejections_total": ("counter", "Executions rejected because the sandbox pool was saturated.", None),
+    "agent_job_queue_wait_seconds": ("histogram", "Time a generation job waited for a graph runner.", LATENCY_BUCKETS),
+    "agent_jobs_queued": ("gauge", "Generation jobs waiting for a graph runner.", None),
+    "agent_jobs_running": ("gauge", "Generation jobs currently running.", None),
+    "agent_jobs_total": ("counter", "Finished or rejected generation jobs by status.", None),
+    "agent_admission_in_flight": ("gauge", "Graph runs holding an admission slot.", None),
+    "agent_admission_queue_depth": ("gauge", "Graph runs waiting for an admission slot by priority.", None),
+    "agent_admission_wait_seconds": ("histogram", "Time a graph run waited for an admission slot by priority.", LATENCY_BUCKETS),
+    "agent_admission_rejections_total": ("counter", "Requests rejected with 429 (admission queue full) by priority.", None),
+    "agent_coalesced_requests_total": ("counter", "API requests served by another identical run (in flight or recently finished).", None),
+}
+
+
+class _Shard:
+    __slots__ = ("values", "histograms")
+
+    def __init__(self):
+        self.values: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def add(self, other: "_Shard"):
+        """Adds a snapshot of `other` (which may still be written to) into this shard."""
+        for key, value in other.values.copy().items():
+            self.values[key] = self.values.get(key, 0.0) + value
+        for key, hist in other.histograms.copy().items():
+            total = self.histograms.setdefault(key, [0.0] * len(hist))
+            for i, v in enumerate(list(hist)):
+                total[i] += v
+
+
+class MetricsRegistry:
+    def __init__(self, definitions: Dict[str, tuple] = METRIC_DEFINITIONS):
+        self.definitions = definitions
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        self._retired = _Shard()  # Totals of threads that have finished
+        self._shards_lock = threading.Lock()
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._reclaim()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _reclaim(self):
+        """Folds the shards of finished threads into the retired total (caller holds the lock)."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.add(shard)
+        self._shards = live
+
+    # --- Hot path (no locks) ---
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """Counter increment; also used for gauges (negative amounts decrement)."""
+        values = self._shard().values
+        key = (name, tuple(sorted(labels.items())))
+        values[key] = values.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        histograms = self._shard().histograms
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self.definitions[name][2]
+        hist = histograms.get(key)
+        if hist is None:
+            # Per-bucket counts (+Inf last), then sum and count
+            hist = histograms[key] = [0.0] * (len(buckets) + 3)
+        hist[bisect.bisect_left(buckets, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple]]):
+        """`collector()` yields (name, type, help, [(labels_dict, value), ...]) at scrape time."""
+        self._collectors.append(collector)
+
+    # --- Scrape ---
+    def snapshot(self) -> Tuple[Dict, Dict]:
+        """Sums all shards. dict.copy() is atomic under the GIL, so writers are never blocked."""
+        total = _Shard()
+        with self._shards_lock:
+            self._reclaim()
+            total.add(self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            total.add(shard)
+        return total.values, total.histograms
+
+    def render(self) -> str:
+        values, histograms = self.snapshot()
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "histogram":
+                for (metric, labels), hist in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip(list(buckets) + ["+Inf"], hist[:-2]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {_num(cumulative)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_num(hist[-2])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_num(hist[-1])}")
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_num(value)}")
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+METRICS = MetricsRegistry()
+
+
+# --- Instrumentation helpers ---
+def timed_node(node: str):
+    """Decorator recording a graph node's wall time in agent_node_latency_seconds."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(state):
+            start = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                METRICS.observe("agent_node_latency_seconds", time.perf_counter() - start, node=node)
+        return wrapper
+    return decorator
+
+
+def timed_sandbox(runner: str):
+    """Decorator for executors returning (passed, message): records time and outcome."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            passed, message = fn(*args, **kwargs)
+            METRICS.observe("agent_sandbox_seconds", time.perf_counter() - start, runner=runner)
+            METRICS.inc("agent_sandbox_runs_total", runner=runner, outcome="passed" if passed else "failed")
+            return passed, message
+        return wrapper
+    return decorator
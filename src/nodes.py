@@ -1,32 +1,47 @@
 from src.config import *
-from src.utils import get_llm, CostTracker
-from src.schemas import CritiqueResult, ChairmanOutput
+from src.utils import get_llm, count_tokens, get_token_counter
+from src.cost_ledger import log_usage, cached_tokens
+from src.schemas import CritiqueResult, ChairmanOutput, CombinedCritiqueResult
 from src.state import AgentState
-from src.prompts import CRITIC_PROMPTS 
-
-tracker = CostTracker()
+from src.prompts import CRITIC_PROMPTS, COMBINED_CRITIC_TEMPLATE
+from src.repair_context import build_repair_context, legacy_retry_section
+from src.rate_limit import invoke_llm
+from src.hedging import hedged_invoke
+from src.incremental_critique import plan_critique
+from src.verdict_cache import get_verdict_cache, verdict_key
+from src.metrics import METRICS, timed_node
+from src.tracing import traced_node
+from src.run_settings import run_setting
 
 # --- 1. GENERATOR NODE ---
+@timed_node("generator")
+@traced_node("generator")
 def generator_node(state: AgentState):
     print(f"\n--- GENERATOR (Iter {state['iteration']}) ---")
     
-    llm = get_llm(GENERATOR_MODEL_NAME, temperature=0.7)
+    model = run_setting("generator_model")
+    llm = get_llm(model, temperature=0.7)
     
     prompt = f"Task: {state['task']}"
+    context_log = []
     
     # Self-Correction: Inject feedback if this is a retry
     if state['iteration'] > 0 and state.get('critique_feedback'):
-        prompt += (
-            f"\n\nPREVIOUS CODE:\n{state['draft_code']}\n"
-            f"FEEDBACK TO FIX:\n{state['critique_feedback']}\n"
-            "Please rewrite the code fixing these issues."
-        )
+        if ENABLE_REPAIR_CONTEXT:
+            # Compact the previous draft + feedback to a token budget instead of re-sending everything
+            section, stats = build_repair_context(state['task'], state['draft_code'], state['critique_feedback'],
+                                                  model_name=model)
+            prompt += section
+            context_log.append({"iteration": state['iteration'], **stats})
+            print(f"   [CONTEXT] Repair context: {stats['tokens_before']} -> {stats['tokens_after']} tokens (budget {stats['budget']})")
+        else:
+            prompt += legacy_retry_section(state['draft_code'], state['critique_feedback'])
     
-    msg = llm.invoke(prompt)
+    msg = invoke_llm(llm, model, prompt)
     usage = msg.response_metadata.get("token_usage", {})
     in_tokens = usage.get("prompt_tokens", 0)
     out_tokens = usage.get("completion_tokens", 0)
-    tracker.log_usage(GENERATOR_MODEL_NAME, in_tokens, out_tokens)
+    cost = log_usage(model, in_tokens, out_tokens, cached_tokens(usage), node="generator")
     
     return {
         "draft_code": msg.content, 
@@ -35,20 +50,26 @@ def generator_node(state: AgentState):
         # This ensures the Chairman only sees the evaluations from the current run of Critics
         "critiques": "DELETE",
         "safety_veto_triggered": False, # Also reset the safety flag
-        "critique_feedback": ""         # Reset feedback
+        "critique_feedback": "",        # Reset feedback
+        "repair_context_log": context_log,
+        # What the critics reviewed last time (for incremental critique of this draft)
+        "previous_draft_code": state.get("draft_code", ""),
+        "previous_critiques": list(state.get("critiques") or []) if state["iteration"] > 0 else [],
+        "request_cost": cost
     }
 
 # --- 2. DYNAMIC CRITIC FACTORY ---
 def make_critic_node(node_name: str, persona_key: str = None):
     """
-    Creates a critic node based on EXPERIMENT_MODE (Persona vs Ensemble).
+    Creates a critic node based on the experiment mode (Persona vs Ensemble) of the run.
     """
     def critic_func(state: AgentState):
         # Determine Model and Prompt based on mode
-        if EXPERIMENT_MODE == "PERSONA":
-            model = CRITIC_BASE_MODEL
-            sys_prompt = CRITIC_PROMPTS[PROMPT_MODE][persona_key]
-            print(f"   ... Critic ({persona_key} - {PROMPT_MODE}) running ...")
+        experiment_mode, prompt_mode = run_setting("experiment_mode"), run_setting("prompt_mode")
+        if experiment_mode == "PERSONA":
+            model = run_setting("critic_model")
+            sys_prompt = CRITIC_PROMPTS[prompt_mode][persona_key]
+            print(f"   ... Critic ({persona_key} - {prompt_mode}) running ...")
             
         else:
             model = ENSEMBLE_MODELS[node_name]
@@ -57,30 +78,109 @@ def make_critic_node(node_name: str, persona_key: str = None):
             
         llm = get_llm(model, temperature=0).with_structured_output(CritiqueResult)
         
-        user_prompt = f"{sys_prompt}\n\nTask: {state['task']}\nCode: {state['draft_code']}"
+        # Counted per segment: the system prompt and task repeat across critics and iterations
+        prompt_segments = [f"{sys_prompt}\n\n", f"Task: {state['task']}\n", f"Code: {state['draft_code']}"]
+        user_prompt = "".join(prompt_segments)
+        role = persona_key.capitalize() # e.g., "Security"
+        savings_log = []
+        use_cache = run_setting("verdict_cache")
+
+        if use_cache:
+            # Same task + same code (modulo comments/formatting) -> stored verdict, no call
+            cache_mode = prompt_mode if experiment_mode == "PERSONA" else "GENERIC"
+            cache_key = verdict_key(role, model, cache_mode, state['task'], state['draft_code'])
+            cached = get_verdict_cache().get(cache_key)
+            if cached is not None:
+                tokens_full = get_token_counter().count_segments(prompt_segments, model)
+                print(f"   [CRITIC] {role}: verdict cache hit ({'PASS' if cached.is_passing else 'FAIL'})")
+                savings_log.append({"iteration": state.get("iteration", 0), "role": role, "mode": "cached",
+                                    "tokens_full": tokens_full, "tokens_sent": 0,
+                                    "tokens_saved": tokens_full + EXPECTED_OUTPUT_TOKENS["critic"]})
+                return {"critiques": [cached], "critique_savings_log": savings_log, "request_cost": 0.0}
+
+        if INCREMENTAL_CRITIQUE:
+            # Retry iterations: previous verdict + diff instead of the full code, or reuse the verdict
+            reused, user_prompt, entry = plan_critique(state, role, sys_prompt, user_prompt, model)
+            if entry:
+                savings_log.append(entry)
+                print(f"   [CRITIC] {role}: {entry['mode']} review, {entry['tokens_full']} -> {entry['tokens_sent']} prompt tokens")
+            if reused is not None:
+                return {"critiques": [reused], "critique_savings_log": savings_log, "request_cost": 0.0}
+            if entry is not None:
+                prompt_segments = [user_prompt] # Diff prompt sent instead of the full one
         
+        discarded_cost = 0.0
         try:
-            result = llm.invoke(user_prompt)
+            result, discarded_cost = hedged_invoke(llm, model, user_prompt, key=f"critic:{model}",
+                                                   expected_output_tokens=EXPECTED_OUTPUT_TOKENS["critic"])
         except Exception as e:
             # Fallback for models that fail JSON output
             print(f"   [Error] Critic failed JSON parsing: {e}")
             result = CritiqueResult(is_passing=False, feedback="Format Error", safety_violation=False)
+            cache_key = None # Never cache a failed call
 
         usage = result.response_metadata.get("token_usage", {}) if hasattr(result, 'response_metadata') else {}
-        in_tokens = usage.get("prompt_tokens", len(user_prompt)/4)
-        out_tokens = usage.get("completion_tokens", 50)
-        tracker.log_usage(model, in_tokens, out_tokens)
+        # Structured outputs usually carry no usage metadata: count the prompt and verdict locally
+        in_tokens = usage.get("prompt_tokens") or get_token_counter().count_segments(prompt_segments, model)
+        out_tokens = usage.get("completion_tokens") or count_tokens(result.model_dump_json(), model)
+        cost = log_usage(model, in_tokens, out_tokens, cached_tokens(usage), node=f"critic_{persona_key}") + discarded_cost
 
-        result.critic_role = persona_key.capitalize() # e.g., "Security"
-        return {"critiques": [result]} # Append to list
+        result.critic_role = role
+        if use_cache and cache_key:
+            get_verdict_cache().put(cache_key, result)
+        return {"critiques": [result], "critique_savings_log": savings_log, "request_cost": cost} # Append to list
         
-    return critic_func
+    return timed_node(f"critic_{persona_key}")(traced_node(f"critic_{persona_key}")(critic_func))
 
 # Instantiate nodes
 critic_1 = make_critic_node("critic_1", "logic")
 critic_2 = make_critic_node("critic_2", "security")
 
+# --- 2b. COMBINED CRITIC (SINGLE CALL) ---
+@timed_node("critic_council")
+@traced_node("critic_council")
+def combined_critic_node(state: AgentState):
+    """
+    EXPERIMENT_MODE = "COMBINED": one structured call returns both the Logic and the Security
+    verdict, so the task and code are sent (and paid for) once instead of twice.
+    The output fans back into the same critiques list consumed by the Chairman.
+    """
+    model, prompt_mode = run_setting("critic_model"), run_setting("prompt_mode")
+    sys_prompt = COMBINED_CRITIC_TEMPLATE.format(
+        logic=CRITIC_PROMPTS[prompt_mode]["logic"],
+        security=CRITIC_PROMPTS[prompt_mode]["security"]
+    )
+    print(f"   ... Critic Council (logic + security - {prompt_mode}) running ...")
+
+    llm = get_llm(model, temperature=0).with_structured_output(CombinedCritiqueResult)
+    user_prompt = f"{sys_prompt}\n\nTask: {state['task']}\nCode: {state['draft_code']}"
+
+    discarded_cost = 0.0
+    try:
+        result, discarded_cost = hedged_invoke(llm, model, user_prompt, key=f"critic_council:{model}",
+                                               expected_output_tokens=2 * EXPECTED_OUTPUT_TOKENS["critic"])
+        verdicts = [result.logic, result.security]
+    except Exception as e:
+        # Fallback for models that fail JSON output
+        print(f"   [Error] Critic Council failed JSON parsing: {e}")
+        result = None
+        verdicts = [
+            CritiqueResult(is_passing=False, feedback="Format Error", safety_violation=False),
+            CritiqueResult(is_passing=False, feedback="Format Error", safety_violation=False)
+        ]
+
+    usage = result.response_metadata.get("token_usage", {}) if hasattr(result, 'response_metadata') else {}
+    in_tokens = usage.get("prompt_tokens") or count_tokens(user_prompt, model)
+    out_tokens = usage.get("completion_tokens") or (count_tokens(result.model_dump_json(), model) if result is not None else 100)
+    cost = log_usage(model, in_tokens, out_tokens, cached_tokens(usage), node="critic_council") + discarded_cost
+
+    verdicts[0].critic_role = "Logic"
+    verdicts[1].critic_role = "Security"
+    return {"critiques": verdicts, "request_cost": cost}
+
 # --- 3. CHAIRMAN NODE (WITH VETO) ---
+@timed_node("chairman")
+@traced_node("chairman")
 def chairman_node(state: AgentState):
     print("\n--- CHAIRMAN OF THE COUNCIL ---")
     
@@ -103,8 +203,14 @@ def chairman_node(state: AgentState):
         for c in critiques
     ])
     
+    # Veto counters (rates are derived from agent_requests_total at query time)
+    for kind, vetoed in (("malicious", malicious_intent), ("safety", safety_voted_fail), ("logic", not logic_passed)):
+        if vetoed:
+            METRICS.inc("agent_vetoes_total", kind=kind)
+
     # Initialize LLM with structured output
-    llm = get_llm(CHAIRMAN_MODEL_NAME, temperature=0).with_structured_output(ChairmanOutput)
+    model = run_setting("chairman_model")
+    llm = get_llm(model, temperature=0).with_structured_output(ChairmanOutput)
     
     # 3. Priority Logic Gates (Deterministic Decision Making)
     # This prevents hallucination and implements our Cost-Effective strategy.
@@ -143,13 +249,14 @@ def chairman_node(state: AgentState):
         print("    [Info] All checks passed. Proceeding to final output.")
         
     # 4. Invoke LLM exclusively for Natural Language Summarization (Feedback Generation)
-    result = llm.invoke(prompt)
+    result, discarded_cost = hedged_invoke(llm, model, prompt, key=f"chairman:{model}",
+                                           expected_output_tokens=EXPECTED_OUTPUT_TOKENS["chairman"])
     
     # 5. Log usage (Original tracking mechanism preserved)
     usage = result.response_metadata.get("token_usage", {}) if hasattr(result, 'response_metadata') else {}
-    in_tokens = usage.get("prompt_tokens", 0)
-    out_tokens = usage.get("completion_tokens", 50)
-    tracker.log_usage(CHAIRMAN_MODEL_NAME, in_tokens, out_tokens)
+    in_tokens = usage.get("prompt_tokens") or count_tokens(prompt, model)
+    out_tokens = usage.get("completion_tokens") or count_tokens(result.model_dump_json(), model)
+    cost = log_usage(model, in_tokens, out_tokens, cached_tokens(usage), node="chairman") + discarded_cost
     
     print(f"    Final Decision: {final_decision} (Logic Failed: {not logic_passed})")
     
@@ -162,22 +269,26 @@ def chairman_node(state: AgentState):
         "logic_failure_triggered": not logic_passed,
         "malicious_intent_triggered": malicious_intent,
         "ever_safety_vetoed": state.get("ever_safety_vetoed", False) or safety_voted_fail,  
-        "ever_logic_failed": state.get("ever_logic_failed", False) or not logic_passed
+        "ever_logic_failed": state.get("ever_logic_failed", False) or not logic_passed,
+        "request_cost": cost
     }
 
 # --- 4. FALLBACK NODE ---
+@timed_node("fallback")
+@traced_node("fallback")
 def fallback_node(state: AgentState):
     print("\n--- ESCALATION (or REFERENCE) ---")
-    llm = get_llm(FALLBACK_MODEL_NAME, temperature=0.2)
-    msg = llm.invoke(f"Solve this robustly: {state['task']}")
+    model = run_setting("fallback_model")
+    llm = get_llm(model, temperature=0.2)
+    msg = invoke_llm(llm, model, f"Solve this robustly: {state['task']}")
 
     usage = msg.response_metadata.get("token_usage", {})
     in_tokens = usage.get("prompt_tokens", 0)
     out_tokens = usage.get("completion_tokens", 0)
     
-    # print(f"   [Debug Token Usage] Model: {FALLBACK_MODEL_NAME}")
+    # print(f"   [Debug Token Usage] Model: {model}")
     # print(f"   [Debug Token Usage] Input: {in_tokens} | Output: {out_tokens}")
     # print(f"   [Debug Token Usage] Raw Metadata: {msg.response_metadata}")
     
-    tracker.log_usage(FALLBACK_MODEL_NAME, in_tokens, out_tokens)
-    return {"draft_code": msg.content, "used_fallback": True, "final_decision": "PASS", "iteration": state.get("iteration", 0) + 1}
\ No newline at end of file
+    cost = log_usage(model, in_tokens, out_tokens, cached_tokens(usage), node="fallback")
+    return {"draft_code": msg.content, "used_fallback": True, "final_decision": "PASS", "iteration": state.get("iteration", 0) + 1, "request_cost": cost}
\ No newline at end of file
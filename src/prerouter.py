@@ -0,0 +1,83 @@
+# src/prerouter.py
+"""
+Task-complexity pre-router (FULL_SYSTEM mode).
+
+Hard tasks often run through every local iteration and escalate anyway, paying the latency
+and nano tokens for nothing. This cheap, local stage scores the task before the first draft:
+the fitted escalation policy gives P(solved by the local loop) for its difficulty, which is
+discounted for long prompts and large input constraints. Tasks scoring below
+PREROUTE_MIN_LOCAL_SUCCESS go straight to the fallback model.
+"""
+import re
+from typing import Optional
+
+from src.config import (
+    MAX_RETRIES, ADAPTIVE_ESCALATION, PREROUTE_MIN_LOCAL_SUCCESS,
+    PREROUTE_LONG_PROMPT_TOKENS, PREROUTE_LARGE_CONSTRAINT
+)
+from src.routing_policy import get_policy
+from src.state import AgentState
+from src.utils import count_tokens
+from src.metrics import timed_node
+from src.tracing import traced_node
+
+# Multiplicative discounts on the history-based estimate
+LONG_PROMPT_FACTOR = 0.8
+LARGE_CONSTRAINT_FACTOR = 0.8
+
+# "2 * 10^5", "10**9", "10<sup>5</sup>", "1e5"; plain numbers ("200,000", "100000") only as a bound
+# next to a comparison ("n <= 100000", "1 ≤ x"), so example inputs and outputs do not count
+_POWER = re.compile(r"(?:(\d+(?:\.\d+)?)\s*[*x×]\s*)?10\s*(?:\^|\*\*|<sup>)\s*(\d+)")
+_SCI = re.compile(r"\b(\d+(?:\.\d+)?)e(\d+)\b")
+_NUMBER = r"(\d{1,3}(?:,\d{3})+|\d+)"
+_COMPARISON = r"(?:<=?|>=?|≤|≥|&lt;=?|&gt;=?|&le;|&ge;)"
+_PLAIN = re.compile(rf"{_COMPARISON}\s*{_NUMBER}\b|\b{_NUMBER}\s*{_COMPARISON}")
+
+
+def max_constraint(task: str) -> float:
+    """Largest numeric bound mentioned in the task (0 if none)."""
+    values = [float(m or 1) * 10 ** int(e) for m, e in _POWER.findall(task)]
+    values += [float(m) * 10 ** int(e) for m, e in _SCI.findall(task)]
+    values += [float((after or before).replace(",", "")) for after, before in _PLAIN.findall(task)]
+    return max(values, default=0.0)
+
+
+def extract_features(task: str, difficulty: Optional[str] = None) -> dict:
+    return {
+        "prompt_tokens": count_tokens(task),
+        "max_constraint": max_constraint(task),
+        "difficulty": (difficulty or "").lower() or None,
+    }
+
+
+def estimate_local_success(features: dict) -> Optional[float]:
+    """P(the generator-critic loop solves the task without escalation), or None without history."""
+    policy = get_policy() if ADAPTIVE_ESCALATION else None
+    if policy is None:
+        return None
+    # The local loop makes MAX_RETRIES attempts (the first draft included)
+    p = policy.p_solve_locally(features["difficulty"], MAX_RETRIES)
+    if p is None:
+        return None
+    if features["prompt_tokens"] > PREROUTE_LONG_PROMPT_TOKENS:
+        p *= LONG_PROMPT_FACTOR
+    if features["max_constraint"] >= PREROUTE_LARGE_CONSTRAINT:
+        p *= LARGE_CONSTRAINT_FACTOR
+    return p
+
+
+@timed_node("prerouter")
+@traced_node("prerouter")
+def prerouter_node(state: AgentState):
+    print("\n--- PRE-ROUTER ---")
+    features = extract_features(state["task"], state.get("difficulty"))
+    score = estimate_local_success(features)
+    prerouted = score is not None and score < PREROUTE_MIN_LOCAL_SUCCESS
+
+    if score is None:
+        print("   [PRE-ROUTER] No routing history available. Starting the local loop.")
+    else:
+        print(f"   [PRE-ROUTER] P(local success)={score:.2f} (difficulty={features['difficulty']}, "
+              f"tokens={features['prompt_tokens']}, max bound={features['max_constraint']:.0e})"
+              f"{' -> straight to fallback' if prerouted else ''}")
+    return {"preroute_score": score, "prerouted": prerouted}
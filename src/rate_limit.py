@@ -0,0 +1,255 @@
+# src/rate_limit.py
+"""
+Process-wide rate limiting for LLM calls.
+
+Every (provider, model) pair gets a token-bucket limiter covering requests per minute and
+tokens per minute, shared by all nodes and threads. 429 responses feed back into it:
+Retry-After is honoured and the effective rate is halved (then recovers additively), so we
+neither sleep needlessly under quota nor keep hammering the provider above it.
+"""
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.config import RATE_LIMITS, RATE_LIMIT_MODEL_OVERRIDES, LLM_MAX_RETRIES, RETRY_BASE_DELAY_SECONDS
+from src.utils import count_tokens, get_provider
+from src.metrics import METRICS
+from src.tracing import start_span
+
+# Adaptive rate scaling (AIMD): halve on 429, recover slowly on success
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY_STEP = 0.05
+# Output tokens reserved per call before the real usage is known
+DEFAULT_OUTPUT_RESERVATION = 500
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute / 60` units per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, scale: float):
+        rate = self.capacity / 60.0 * scale
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float, scale: float = 1.0) -> float:
+        """
+        Takes `amount` units and returns how long the caller must wait before using them.
+        The balance may go negative, so concurrent callers queue up in arrival order.
+        """
+        self._refill(now, scale)
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / (self.capacity / 60.0 * scale)
+
+    def adjust(self, delta: float):
+        """Corrects a reservation once the real usage is known (positive = consumed more)."""
+        self.tokens -= delta
+
+
+class ProviderRateLimiter:
+    """RPM + TPM limiter for one (provider, model) pair, with adaptive 429 backoff and counters."""
+
+    def __init__(self, key: str, rpm: float, tpm: float):
+        self.key = key
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.rate_scale = 1.0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "throttled_requests": 0,
+            "throttled_seconds": 0.0,
+            "rate_limit_errors": 0,
+            "retries": 0,
+        }
+
+    def acquire(self, estimated_tokens: float) -> float:
+        """Blocks until the request fits both the RPM and TPM budget. Returns the time waited."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now, self.rate_scale),
+                self.tokens.reserve(estimated_tokens, now, self.rate_scale),
+                self.blocked_until - now,
+            )
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled_requests"] += 1
+                self.stats["throttled_seconds"] += wait
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    def record_usage(self, actual_tokens: float, estimated_tokens: float):
+        with self.lock:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+            self.rate_scale = min(1.0, self.rate_scale + RATE_RECOVERY_STEP)
+
+    def on_rate_limited(self, delay: float):
+        """A 429 was returned: pause everyone on this key and halve the effective rate."""
+        with self.lock:
+            self.stats["rate_limit_errors"] += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.rate_scale = max(MIN_RATE_SCALE, self.rate_scale / 2)
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name: str) -> ProviderRateLimiter:
+    """Returns the shared limiter for a model (created on first use)."""
+    provider = get_provider(model_name)
+    key = f"{provider}:{model_name}"
+    with _registry_lock:
+        if key not in _limiters:
+            limits = {**RATE_LIMITS[provider], **RATE_LIMIT_MODEL_OVERRIDES.get(model_name, {})}
+            _limiters[key] = ProviderRateLimiter(key, limits["rpm"], limits["tpm"])
+        return _limiters[key]
+
+
+def get_rate_limit_stats() -> Dict[str, dict]:
+    """Snapshot of throttling counters per provider:model."""
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {l.key: {**l.stats, "rate_scale": round(l.rate_scale, 3)} for l in limiters}
+
+
+def _collect_metrics():
+    stats = get_rate_limit_stats()
+    for stat, kind, help_text in (
+        ("requests", "counter", "LLM requests admitted by the rate limiter."),
+        ("throttled_requests", "counter", "LLM requests delayed by the rate limiter."),
+        ("throttled_seconds", "counter", "Total time LLM requests waited for the rate limiter."),
+        ("rate_limit_errors", "counter", "HTTP 429 responses received."),
+        ("retries", "counter", "LLM call retries (429 and transient errors)."),
+        ("rate_scale", "gauge", "Current adaptive rate multiplier (1.0 = configured limit)."),
+    ):
+        suffix = "_total" if kind == "counter" else ""
+        yield (f"agent_rate_limit_{stat}{suffix}", kind, help_text,
+               [({"limiter": key}, s[stat]) for key, s in stats.items()])
+
+
+METRICS.register_collector(_collect_metrics)
+
+
+# --- Error classification ---
+
+def _status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None and getattr(error, "response", None) is not None:
+        code = getattr(error.response, "status_code", None)
+    return code
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Connection problems, timeouts and 5xx responses are worth retrying."""
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError", "InternalServerError", "TimeoutError"):
+        return True
+    code = _status_code(error)
+    return code is not None and code >= 500
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parses '1.5', '20ms', '6m0s' style durations (OpenAI reset headers) into seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, matched = 0.0, False
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extracts the server-suggested wait from Retry-After style headers, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        return _parse_duration(headers["retry-after-ms"] + "ms")
+    for header in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        if headers.get(header):
+            parsed = _parse_duration(headers[header])
+            if parsed is not None:
+                return parsed
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    if "total_tokens" in usage:
+        return usage["total_tokens"]
+    return None
+
+
+def invoke_llm(llm, model_name: str, prompt: Any, max_retries: int = LLM_MAX_RETRIES,
+               output_reservation: int = DEFAULT_OUTPUT_RESERVATION):
+    """
+    Invokes `llm` through the shared limiter for `model_name`.
+    429s back off (Retry-After if provided, else exponential with jitter) and slow the
+    limiter down; transient errors are retried up to `max_retries` times.
+    """
+    with start_span(f"llm:{model_name}", kind="llm", model=model_name) as span:
+        result = _invoke_with_limits(llm, model_name, prompt, max_retries, output_reservation, span)
+        if span is not None:
+            metadata = getattr(result, "response_metadata", None) or {}
+            usage = metadata.get("token_usage") or {}
+            span.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                     total_tokens=usage.get("total_tokens"), output=type(result).__name__)
+        return result
+
+
+def _invoke_with_limits(llm, model_name: str, prompt: Any, max_retries: int, output_reservation: int, span=None):
+    if getattr(llm, "offline", False):
+        # Replayed responses (src/llm_backend.py) never reach a provider
+        return llm.invoke(prompt)
+
+    limiter = get_rate_limiter(model_name)
+    estimated = count_tokens(prompt if isinstance(prompt, str) else str(prompt), model_name) + output_reservation
+    throttled = 0.0
+
+    for attempt in range(max_retries + 1):
+        throttled += limiter.acquire(estimated)
+        if span is not None:
+            span.set(attempts=attempt + 1, throttled_seconds=round(throttled, 3))
+        try:
+            result = llm.invoke(prompt)
+        except Exception as e:
+            if attempt == max_retries or not (is_rate_limit_error(e) or is_transient_error(e)):
+                raise
+            delay = retry_after_seconds(e) or backoff_delay(attempt)
+            if is_rate_limit_error(e):
+                limiter.on_rate_limited(delay)
+                print(f"   [RATE LIMIT] {limiter.key}: 429, backing off {delay:.1f}s (attempt {attempt + 1})")
+            else:
+                time.sleep(delay)
+            with limiter.lock:
+                limiter.stats["retries"] += 1
+            continue
+
+        actual = _usage_tokens(result)
+        limiter.record_usage(actual if actual is not None else estimated, estimated)
+        return result
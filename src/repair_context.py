@@ -0,0 +1,213 @@
+import ast
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src.config import REPAIR_CONTEXT_TOKEN_BUDGET
+from src.execution import extract_code_from_markdown
+from src.run_settings import run_setting
+from src.utils import count_tokens
+
+# Lines shorter than this are too generic to be treated as "already in the task" (e.g. "return x").
+MIN_DEDUP_CHARS = 12
+OMITTED_MARKER = "    ...  # unchanged, omitted for brevity"
+DEDUP_MARKER = "(... example I/O already given in the Task ...)"
+
+
+def legacy_retry_section(draft_code: str, feedback: str) -> str:
+    """The original (uncompacted) retry suffix. Used as the 'before' measurement."""
+    return (
+        f"\n\nPREVIOUS CODE:\n{draft_code}\n"
+        f"FEEDBACK TO FIX:\n{feedback}\n"
+        "Please rewrite the code fixing these issues."
+    )
+
+
+def _unescape_json(text: str) -> str:
+    """Decodes the escapes of a JSON string body (\\n, \\", \\uXXXX); non-ASCII text is left as is."""
+    try:
+        return json.loads(f'"{text}"')
+    except ValueError:
+        return text
+
+
+def _task_examples(task: str) -> List[Tuple[str, str]]:
+    """
+    Extracts example inputs/outputs embedded in the task (LCB public test cases are JSON
+    with "input"/"output" keys) as (text, reference) pairs, e.g. "<Task example #2 input>"
+    for the second input in the task. Longest first, so replacements don't split each other.
+    """
+    candidates, seen = {}, {"input": 0, "output": 0}
+    for field, example in re.findall(r'"(input|output)"\s*:\s*"((?:[^"\\]|\\.)*)"', task):
+        seen[field] += 1
+        reference = f"<Task example #{seen[field]} {field}>"
+        # Feedback may quote either the escaped form (as shown in the task) or the decoded one.
+        for text in (example.strip(), _unescape_json(example).strip()):
+            if len(text) >= MIN_DEDUP_CHARS:
+                candidates.setdefault(text, reference)
+    return sorted(candidates.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+def dedupe_against_task(text: str, task: str) -> str:
+    """
+    Removes example I/O from `text` that the generator already sees in the task:
+    1. Inline occurrences of the task's public test inputs/outputs are replaced by a reference.
+    2. Whole lines that appear verbatim in the task are collapsed into a single marker.
+    """
+    if not text or not task:
+        return text or ""
+
+    for example, reference in _task_examples(task):
+        text = text.replace(example, reference)
+
+    output, skipping = [], False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if len(stripped) >= MIN_DEDUP_CHARS and stripped in task:
+            if not skipping:
+                output.append(DEDUP_MARKER)
+            skipping = True
+            continue
+        skipping = False
+        output.append(line)
+    return "\n".join(output)
+
+
+def _is_relevant(node: ast.AST, lines: List[str], hint: str) -> bool:
+    """A definition is relevant if the feedback names it or quotes one of its lines."""
+    name = getattr(node, "name", None)
+    if name and re.search(rf"\b{re.escape(name)}\b", hint):
+        return True
+    for line in lines[node.lineno - 1:node.end_lineno]:
+        stripped = line.strip()
+        if len(stripped) >= MIN_DEDUP_CHARS and stripped in hint:
+            return True
+    return False
+
+
+def _select_block(body: List[ast.stmt], lines: List[str], hint: str) -> Optional[List[str]]:
+    """
+    Keeps imports/statements and relevant definitions of a block; replaces the bodies of
+    irrelevant functions by a stub. Returns None if nothing in the block was identified
+    as relevant (i.e. the feedback gives no clue, so the caller should keep everything).
+    """
+    selected, found = [], False
+    for node in body:
+        start = node.lineno - 1
+        if getattr(node, "decorator_list", None):
+            start = node.decorator_list[0].lineno - 1
+        segment = lines[start:node.end_lineno]
+
+        if isinstance(node, ast.ClassDef):
+            # LeetCode-style 'class Solution' wraps everything: select at method level.
+            header_end = node.body[0].lineno - 1 if node.body else node.end_lineno
+            inner = _select_block(node.body, lines, hint)
+            if inner is not None:
+                found = True
+                selected.extend(lines[start:header_end] + inner)
+            else:
+                selected.extend(segment)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if _is_relevant(node, lines, hint):
+                found = True
+                selected.extend(segment)
+            else:
+                # Keep the (possibly multi-line) signature, drop the body
+                header_end = node.lineno
+                while header_end < node.body[0].lineno - 1 and not lines[header_end - 1].rstrip().endswith(":"):
+                    header_end += 1
+                indent = re.match(r"\s*", lines[node.lineno - 1]).group(0)
+                selected.extend(lines[start:header_end])
+                selected.append(indent + OMITTED_MARKER)
+        else:
+            selected.extend(segment)
+    return selected if found else None
+
+
+def select_relevant_region(code: str, hint: str) -> str:
+    """
+    Narrows the previous draft down to the definitions referenced by the feedback.
+    Falls back to the full code when it cannot be parsed or nothing specific is referenced.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    lines = code.splitlines()
+    selected = _select_block(tree.body, lines, hint)
+    return "\n".join(selected) if selected is not None else code
+
+
+def truncate_to_budget(text: str, budget: int, model_name: Optional[str] = None) -> str:
+    """
+    Keeps the leading lines of `text` that fit into the token budget (binary search on line count).
+    Tokens are counted for `model_name`, by default the run's generator model.
+    """
+    model_name = model_name or run_setting("generator_model")
+    if count_tokens(text, model_name) <= budget:
+        return text
+    marker = "# ... truncated to fit the repair context budget ..."
+    budget -= count_tokens(marker + "\n", model_name)
+    lines = text.splitlines()
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens("\n".join(lines[:mid]), model_name) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return "\n".join(lines[:lo] + [marker])
+
+
+def build_repair_context(
+    task: str,
+    draft_code: str,
+    feedback: str,
+    token_budget: int = REPAIR_CONTEXT_TOKEN_BUDGET,
+    model_name: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """
+    Builds the retry suffix for the generator prompt within `token_budget` tokens:
+    1. Strip prose from the previous draft (keep the code block only).
+    2. De-duplicate example I/O already present in the task from the feedback.
+    3. Keep only the code region the feedback refers to, if it does not fit.
+    Falls back to the legacy section when compaction does not make it smaller.
+    Returns the prompt section and token statistics (before/after) for reporting.
+    Tokens are counted for `model_name`, by default the run's generator model.
+    """
+    model_name = model_name or run_setting("generator_model")
+    legacy = legacy_retry_section(draft_code, feedback)
+    tokens_before = count_tokens(legacy, model_name)
+    feedback = dedupe_against_task(feedback, task)
+
+    # Feedback is the actionable part: it may use at most half the budget.
+    feedback = truncate_to_budget(feedback, token_budget // 2, model_name)
+
+    scaffold = (
+        "\n\n{header}:\n```python\n{code}\n```\n"
+        "FEEDBACK TO FIX:\n{feedback}\n"
+        "Please rewrite the COMPLETE code fixing these issues."
+    )
+    narrowed_header = "PREVIOUS CODE (relevant region only, omitted parts stay unchanged)"
+    fixed_tokens = count_tokens(scaffold.format(header=narrowed_header, code="", feedback=feedback), model_name)
+    code_budget = max(token_budget - fixed_tokens, 0)
+
+    header = "PREVIOUS CODE"
+    code = extract_code_from_markdown(draft_code or "")
+    if count_tokens(code, model_name) > code_budget:
+        header = narrowed_header
+        code = select_relevant_region(code, feedback)
+        code = truncate_to_budget(code, code_budget, model_name)
+
+    section = scaffold.format(header=header, code=code, feedback=feedback)
+    tokens_after = count_tokens(section, model_name)
+    if tokens_after >= tokens_before:
+        # Short drafts: the code fence and longer instructions would cost more than they save
+        section, tokens_after = legacy, tokens_before
+    stats = {"tokens_before": tokens_before, "tokens_after": tokens_after, "budget": token_budget}
+    return section, stats
+
+
+def repair_tokens_saved(context_log: List[Dict]) -> int:
+    """Retry prompt tokens saved by compaction over a run (from the state's repair_context_log)."""
+    return sum(entry["tokens_before"] - entry["tokens_after"] for entry in context_log or [])
@@ -1,8 +1,9 @@
 import os
 import re
-import difflib
 from typing import List, Dict, Any
 
+from src.utils import code_diff
+
 class RobustCaseStudyReporter:
     """
     Generates academic-grade case study reports with HIGH READABILITY.
@@ -29,11 +30,7 @@ class RobustCaseStudyReporter:
         return text.strip()
 
     def _generate_diff(self, code_a: str, code_b: str) -> str:
-        diff = difflib.unified_diff(
-            code_a.splitlines(), code_b.splitlines(),
-            fromfile='Previous', tofile='Refined', lineterm=''
-        )
-        return "\n".join(list(diff))
+        return code_diff(code_a, code_b, fromfile='Previous', tofile='Refined')
 
     def _format_critiques(self, critiques: List[Any]) -> str:
         """
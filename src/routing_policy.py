@@ -0,0 +1,192 @@
+# src/routing_policy.py
+"""
+Adaptive escalation policy learned from the evaluation history.
+
+For every difficulty bucket we estimate P(success on local attempt k | attempt k was reached)
+from past runs (SQLite `evaluation_logs` or the ablation CSVs). The router consults it in
+FULL_SYSTEM mode and escalates early when another cheap retry is unlikely to help.
+
+Refit offline:
+    python -m src.routing_policy --db agent_evaluations.db --csv raw_data/livecodebench/ablation_lcb.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from src.config import ROUTING_POLICY_PATH, ESCALATION_MIN_RETRY_SUCCESS
+
+POOLED = "all"
+# Weight (in pseudo-observations) of the pooled estimate when smoothing sparse buckets
+PRIOR_STRENGTH = 5.0
+# Modes whose runs contain local retries
+LOOP_MODES = {"loop_only", "full_system"}
+
+
+def _as_bool(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+class EscalationPolicy:
+    """
+    Per-difficulty estimates of the local retry success rate.
+    `counts[difficulty][attempt] = [successes, trials]`
+    """
+
+    def __init__(self, counts: Dict[str, Dict[int, List[int]]], meta: Optional[dict] = None):
+        self.counts = counts
+        self.meta = meta or {}
+
+    # --- Fitting ---
+    @classmethod
+    def fit(cls, rows: Iterable[dict], meta: Optional[dict] = None) -> "EscalationPolicy":
+        """
+        Fits from normalized rows: {mode, difficulty, iterations, escalated, success}.
+        A run with N local attempts contributes a trial to attempts 1..N; only attempt N
+        can be a success, and only if the run succeeded without escalation.
+        """
+        counts: Dict[str, Dict[int, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        for row in rows:
+            if row["mode"] not in LOOP_MODES:
+                continue
+            local_attempts = row["iterations"] - (1 if row["escalated"] else 0)
+            solved_locally = row["success"] and not row["escalated"]
+            for bucket in {row["difficulty"] or POOLED, POOLED}:
+                for attempt in range(1, local_attempts + 1):
+                    counts[bucket][attempt][1] += 1
+                    if attempt == local_attempts and solved_locally:
+                        counts[bucket][attempt][0] += 1
+        frozen = {b: {a: list(sc) for a, sc in attempts.items()} for b, attempts in counts.items()}
+        return cls(frozen, meta)
+
+    @staticmethod
+    def rows_from_csv(path: str) -> List[dict]:
+        """Reads an ablation CSV (experiments/ablation_*.py output format)."""
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get("Error") and not row.get("Iterations"):
+                    continue
+                rows.append({
+                    "mode": row.get("Mode", ""),
+                    "difficulty": (row.get("Difficulty") or "").lower(),
+                    "iterations": int(float(row.get("Iterations") or 0)),
+                    "escalated": _as_bool(row.get("Escalated", 0)),
+                    "success": _as_bool(row.get("Valid Success", row.get("Success", 0))),
+                })
+        return rows
+
+    @staticmethod
+    def rows_from_db(db_path: str) -> List[dict]:
+        """
+        Reads `evaluation_logs`. Older databases have no difficulty/escalated columns:
+        their runs are pooled, and only loop_only runs (which never escalate) are used.
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(evaluation_logs)")}
+            difficulty = "difficulty" if "difficulty" in columns else "NULL"
+            escalated = "escalated" if "escalated" in columns else "NULL"
+            query = f"SELECT mode, {difficulty}, iterations, {escalated}, success FROM evaluation_logs"
+            rows = []
+            for mode, diff, iterations, esc, success in conn.execute(query):
+                if esc is None and mode != "loop_only":
+                    continue
+                rows.append({
+                    "mode": mode,
+                    "difficulty": (diff or "").lower(),
+                    "iterations": int(iterations or 0),
+                    "escalated": _as_bool(esc or 0),
+                    "success": _as_bool(success),
+                })
+            return rows
+        finally:
+            conn.close()
+
+    # --- Persistence ---
+    def save(self, path: str = ROUTING_POLICY_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "counts": self.counts}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = ROUTING_POLICY_PATH) -> "EscalationPolicy":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        counts = {b: {int(a): sc for a, sc in attempts.items()} for b, attempts in data["counts"].items()}
+        return cls(counts, data.get("meta"))
+
+    # --- Inference ---
+    def p_success(self, difficulty: Optional[str], attempt: int) -> Optional[float]:
+        """
+        Smoothed P(success on local attempt `attempt`). Sparse difficulty buckets are shrunk
+        towards the pooled estimate. Returns None if the history has no data for the attempt.
+        """
+        pooled = self.counts.get(POOLED, {}).get(attempt)
+        if not pooled or pooled[1] == 0:
+            return None
+        prior = pooled[0] / pooled[1]
+        successes, trials = self.counts.get((difficulty or "").lower(), {}).get(attempt, pooled)
+        return (successes + PRIOR_STRENGTH * prior) / (trials + PRIOR_STRENGTH)
+
+    def should_escalate_early(self, difficulty: Optional[str], iteration: int,
+                              threshold: float = ESCALATION_MIN_RETRY_SUCCESS) -> bool:
+        """True if the next local attempt (iteration + 1) is unlikely to succeed."""
+        p = self.p_success(difficulty, iteration + 1)
+        return p is not None and p < threshold
+
+    def p_solve_locally(self, difficulty: Optional[str], max_attempts: int) -> Optional[float]:
+        """P(the local loop succeeds within `max_attempts` attempts). Attempts without data are skipped."""
+        p_fail, seen = 1.0, False
+        for attempt in range(1, max_attempts + 1):
+            p = self.p_success(difficulty, attempt)
+            if p is not None:
+                p_fail *= 1 - p
+                seen = True
+        return 1 - p_fail if seen else None
+
+
+_policy_cache: Dict[str, Optional[EscalationPolicy]] = {}
+
+
+def get_policy(path: str = ROUTING_POLICY_PATH) -> Optional[EscalationPolicy]:
+    """Loads the fitted policy once per process. Returns None if it was never fitted."""
+    if path not in _policy_cache:
+        _policy_cache[path] = EscalationPolicy.load(path) if os.path.exists(path) else None
+    return _policy_cache[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refit the adaptive escalation policy from evaluation history.")
+    parser.add_argument("--db", action="append", default=[], help="SQLite database with evaluation_logs")
+    parser.add_argument("--csv", action="append", default=[], help="Ablation CSV (repeatable)")
+    parser.add_argument("--out", default=ROUTING_POLICY_PATH)
+    args = parser.parse_args()
+
+    if not args.db and not args.csv:
+        args.csv = ["raw_data/livecodebench/ablation_lcb.csv"]
+
+    rows = []
+    for path in args.db:
+        rows += EscalationPolicy.rows_from_db(path)
+    for path in args.csv:
+        rows += EscalationPolicy.rows_from_csv(path)
+
+    policy = EscalationPolicy.fit(rows, meta={"fitted_at": time.time(), "sources": args.db + args.csv, "runs": len(rows)})
+    policy.save(args.out)
+
+    print(f"✅ Fitted escalation policy on {len(rows)} runs -> {args.out}")
+    for bucket in sorted(policy.counts):
+        for attempt in sorted(policy.counts[bucket]):
+            s, n = policy.counts[bucket][attempt]
+            p = policy.p_success(bucket, attempt)
+            flag = "escalate early" if p is not None and p < ESCALATION_MIN_RETRY_SUCCESS else ""
+            print(f"   {bucket:<8} attempt {attempt}: {s:>3}/{n:<3} P(success)={p:.2f} {flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# src/run_settings.py
+"""
+Per-run settings bound through LangGraph's `configurable`.
+
+Nodes read their model names and prompt mode via `run_setting(...)` instead of the config.py
+constants directly, so one compiled graph serves every model / prompt-mode configuration:
+the registry (src/graph_registry.py) binds the overrides with `graph.with_config(...)`.
+Outside a graph run (unit tests, scripts) the config.py defaults apply.
+"""
+from src.config import (
+    GENERATOR_MODEL_NAME, CRITIC_BASE_MODEL, CHAIRMAN_MODEL_NAME, FALLBACK_MODEL_NAME,
+    PROMPT_MODE, EXPERIMENT_MODE, VERDICT_CACHE
+)
+
+RUN_SETTING_DEFAULTS = {
+    "generator_model": GENERATOR_MODEL_NAME,
+    "critic_model": CRITIC_BASE_MODEL,
+    "chairman_model": CHAIRMAN_MODEL_NAME,
+    "fallback_model": FALLBACK_MODEL_NAME,
+    "prompt_mode": PROMPT_MODE,
+    "experiment_mode": EXPERIMENT_MODE,
+    "verdict_cache": VERDICT_CACHE,
+}
+
+
+def run_setting(key: str):
+    from langgraph.config import get_config
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        # Called outside a runnable context
+        configurable = {}
+    value = configurable.get(key)
+    return RUN_SETTING_DEFAULTS[key] if value is None else value
@@ -0,0 +1,223 @@
+# src/sandbox.py
+"""
+Shared sandbox worker pool with an execution result cache.
+
+Test execution (src/execution.py) runs in a small pool of worker processes, so user code never
+runs inside the API process and CPU-bound tests run in parallel. Every execution, module setup
+included, has a wall-clock deadline: a worker that overruns it is killed and replaced, so a
+request can never hold a worker (or a pending slot) for longer than that. The number of executions
+running or waiting is bounded (SANDBOX_MAX_PENDING); beyond it `submit` raises SandboxBusy.
+Results are cached under (runner, normalized-AST code hash, tests, options), the same code
+normalization the critic verdict cache uses, so a resubmitted solution that only differs in
+comments or formatting is answered without executing it again.
+
+    future = get_sandbox().submit("lcb", code, [{"input": "1\\n2", "output": "3"}])
+    future.result()["tests"]
+"""
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from src.config import (
+    SANDBOX_WORKERS, SANDBOX_MAX_PENDING, SANDBOX_TASKS_PER_WORKER, SANDBOX_TEST_TIMEOUT_SECONDS,
+    SANDBOX_EXECUTION_TIMEOUT_SECONDS, EXECUTION_CACHE_SIZE
+)
+from src.execution import RUNNERS, serve
+from src.verdict_cache import normalized_code_hash
+from src.metrics import METRICS
+
+
+class SandboxBusy(Exception):
+    """Raised when SANDBOX_MAX_PENDING executions are already running or waiting."""
+
+
+def execution_key(runner: str, code: str, tests, entry_point: Optional[str], stop_on_failure: bool,
+                  test_timeout: float) -> str:
+    payload = [runner, normalized_code_hash(code), tests, entry_point, stop_on_failure, test_timeout]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ExecutionCache:
+    """In-memory LRU of execution results."""
+
+    def __init__(self, max_size: int = EXECUTION_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+            self.stats["hits" if result is not None else "misses"] += 1
+            return result
+
+    def put(self, key: str, result: dict):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+class _Worker:
+    """One sandbox process and its pipe; killed rather than reused once it has misbehaved."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class SandboxPool:
+    def __init__(self, workers: int = SANDBOX_WORKERS, max_pending: int = SANDBOX_MAX_PENDING,
+                 tasks_per_worker: int = SANDBOX_TASKS_PER_WORKER,
+                 execution_timeout: float = SANDBOX_EXECUTION_TIMEOUT_SECONDS, cache: Optional[ExecutionCache] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.tasks_per_worker = tasks_per_worker
+        self.execution_timeout = execution_timeout
+        self.cache = cache if cache is not None else ExecutionCache()
+        # "spawn" workers share no state with the API process
+        self._context = multiprocessing.get_context("spawn")
+        # One dispatcher thread per worker process: it hands over a task and enforces the deadline
+        self._dispatcher = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sandbox-dispatch")
+        self._idle: List[_Worker] = []
+        self._pending = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, runner: str, code: str, tests, entry_point: Optional[str] = None,
+               stop_on_failure: bool = False, test_timeout: float = SANDBOX_TEST_TIMEOUT_SECONDS) -> Future:
+        """
+        Future of {"passed", "message", "tests", "seconds", "cached"}. Cached results resolve
+        immediately; raises SandboxBusy when the pool is saturated.
+        """
+        if runner not in RUNNERS:
+            raise ValueError(f"Unknown runner '{runner}' (expected one of {list(RUNNERS)})")
+        key = execution_key(runner, code, tests, entry_point, stop_on_failure, test_timeout)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result({**cached, "cached": True})
+            return future
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                METRICS.inc("agent_sandbox_rejections_total")
+                raise SandboxBusy(f"Sandbox is busy ({self._pending} executions running or waiting)")
+            work = self._dispatcher.submit(self._execute, (runner, code, tests, entry_point, stop_on_failure, test_timeout))
+            self._pending += 1
+        METRICS.inc("agent_sandbox_pending")
+        # The caller's future resolves after the bookkeeping below; cancelling it drops queued work
+        future = Future()
+        future.add_done_callback(lambda f: f.cancelled() and work.cancel())
+        work.add_done_callback(lambda w: self._finished(w, future, key, runner))
+        return future
+
+    def _execute(self, task: tuple) -> dict:
+        """Dispatcher thread: runs one task on a worker process within the execution deadline."""
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None:
+            worker = _Worker(self._context)
+        start = time.perf_counter()
+        try:
+            worker.conn.send(task)
+            if not worker.conn.poll(self.execution_timeout):
+                # Stuck (module-level loop, runaway test): the only reliable stop is killing the process
+                worker.kill()
+                return failed_execution(f"Execution timed out after {self.execution_timeout:g}s", start)
+            result = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died (e.g. the code called os._exit)
+            worker.kill()
+            return failed_execution("Sandbox worker exited unexpectedly", start)
+
+        worker.tasks += 1
+        # Timed-out tests leave threads behind: replace the worker instead of reusing it
+        leaked = any(test["status"] == "timeout" for test in result["tests"])
+        with self._lock:
+            if not self._closed and not leaked and worker.tasks < self.tasks_per_worker:
+                self._idle.append(worker)
+                worker = None
+        if worker is not None:
+            worker.kill()
+        return result
+
+    def _finished(self, work: Future, future: Future, key: str, runner: str):
+        with self._lock:
+            self._pending -= 1
+        METRICS.inc("agent_sandbox_pending", -1)
+        if work.cancelled():
+            future.cancel()
+            return
+        error = work.exception()
+        if error is not None:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+            return
+        result = work.result()
+        METRICS.observe("agent_sandbox_seconds", result["seconds"], runner=runner)
+        METRICS.inc("agent_sandbox_runs_total", runner=runner, outcome="passed" if result["passed"] else "failed")
+        # Timeouts depend on load, so only deterministic outcomes are reused
+        if not result.get("aborted") and not any(test["status"] == "timeout" for test in result["tests"]):
+            self.cache.put(key, result)
+        if future.set_running_or_notify_cancel():
+            future.set_result({**result, "cached": False})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "max_pending": self.max_pending,
+                    "cache_entries": len(self.cache.entries), **self.cache.stats}
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        self._dispatcher.shutdown(wait=False, cancel_futures=True)
+        for worker in idle:
+            worker.kill()
+
+
+def failed_execution(message: str, start: float) -> dict:
+    """Result for an execution the pool had to abort (never cached)."""
+    return {"passed": False, "message": message, "tests": [], "seconds": round(time.perf_counter() - start, 4),
+            "aborted": True}
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox() -> SandboxPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+
+def _collect_metrics():
+    if _pool is None:
+        return
+    stats = _pool.cache.stats
+    yield ("agent_execution_cache_lookups_total", "counter", "Sandbox execution cache lookups by result.",
+           [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])
+
+
+METRICS.register_collector(_collect_metrics)
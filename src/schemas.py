@@ -29,4 +29,11 @@ class ChairmanOutput(BaseModel):
     The synthesis decision from the Chairman.
     """
     decision: str = Field(..., description="'PASS' or 'FAIL'")
-    consolidated_feedback: str = Field(..., description="Synthesized instructions for the generator.")
\ No newline at end of file
+    consolidated_feedback: str = Field(..., description="Synthesized instructions for the generator.")
+
+class CombinedCritiqueResult(BaseModel):
+    """
+    Both Critic verdicts from a single structured call (EXPERIMENT_MODE = "COMBINED").
+    """
+    logic: CritiqueResult = Field(..., description="Verdict of the Logic reviewer (correctness and executability only).")
+    security: CritiqueResult = Field(..., description="Verdict of the Security reviewer (vulnerabilities and malicious intent only).")
\ No newline at end of file
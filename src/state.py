@@ -1,4 +1,5 @@
-from typing import TypedDict, List, Annotated, Union
+import operator
+from typing import TypedDict, List, Annotated, Union, Optional
 from src.schemas import CritiqueResult
 
 def reduce_critiques(left: List[CritiqueResult], right: Union[List[CritiqueResult], str]) -> List[CritiqueResult]:
@@ -18,6 +19,7 @@ class AgentState(TypedDict):
     The shared memory of the agent workflow.
     """
     task: str                   # User input
+    difficulty: Optional[str]   # Optional task metadata (e.g. LCB 'medium'/'hard') used by the routing policy
     draft_code: str             # Current code generation
     iteration: int              # Retry counter
     
@@ -32,3 +34,19 @@ class AgentState(TypedDict):
 
     ever_safety_vetoed: bool
     ever_logic_failed: bool
+
+    repair_context_log: Annotated[List[dict], operator.add]  # Metric: retry prompt tokens before/after compaction
+
+    # Incremental critique: what the critics reviewed last time
+    previous_draft_code: str
+    previous_critiques: List[CritiqueResult]
+    critique_savings_log: Annotated[List[dict], operator.add]  # Metric: critic prompt tokens full vs. sent
+
+    # Per-request budgets (optional). The router skips retries/escalation that would exceed them.
+    cost_budget_usd: Optional[float]   # Dollar budget for the whole request
+    deadline: Optional[float]          # Absolute deadline (epoch seconds)
+    started_at: float                  # Request start time (epoch seconds)
+    request_cost: Annotated[float, operator.add]  # Cost accumulated by this request's LLM calls
+
+    preroute_score: Optional[float]    # Pre-router estimate of P(solved by the local loop)
+    prerouted: bool                    # Metric: sent straight to the fallback by the pre-router
@@ -0,0 +1,272 @@
+# src/tracing.py
+"""
+Structured tracing for graph runs.
+
+Each run (API request, benchmark task) opens a root span with `trace_run`; nodes, LLM calls
+and sandbox executions nest under it as child spans carrying start/end times, model, token
+usage, iteration and decision. The current span lives in a contextvar, which LangGraph copies
+into the worker threads of parallel nodes, so nesting needs no explicit plumbing.
+
+Finished spans go to a pluggable exporter (default: rotating JSONL file at TRACE_PATH).
+
+    python -m src.tracing --list
+    python -m src.tracing <trace_id>          # critical path of one run
+"""
+import argparse
+import atexit
+import contextlib
+import contextvars
+import functools
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from src.config import TRACING_ENABLED, TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attributes")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name, self.kind = name, kind
+        self.start, self.end = time.time(), None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "kind": self.kind, "start": self.start, "end": self.end,
+            "duration": round(self.end - self.start, 6), "attributes": self.attributes,
+        }
+
+
+# --- Exporters ---
+class JsonlExporter:
+    """
+    Appends one JSON line per finished span; rotates like logging.RotatingFileHandler. The file
+    is opened on the first span and kept open; writes are buffered and flushed whenever a run
+    finishes (so a completed trace is readable by the CLI) and at exit.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES, backup_count: int = TRACE_BACKUP_COUNT):
+        self.path, self.max_bytes, self.backup_count = path, max_bytes, backup_count
+        self.lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def export(self, span: dict):
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        size = len(line.encode("utf-8"))
+        with self.lock:
+            if self._file is None:
+                self._open()
+            elif self._size and self._size + size > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += size
+            if span["kind"] == "run":
+                self._file.flush()
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class InMemoryExporter:
+    """Keeps spans in a list (tests, ad-hoc analysis)."""
+
+    def __init__(self):
+        self.spans: List[dict] = []
+
+    def export(self, span: dict):
+        self.spans.append(span)
+
+
+_exporter = JsonlExporter() if TRACING_ENABLED and TRACE_PATH else None
+if _exporter is not None:
+    atexit.register(_exporter.close)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter):
+    """Installs any object with `export(span_dict)` (None disables tracing)."""
+    global _exporter
+    _exporter = exporter
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span else None
+
+
+@contextlib.contextmanager
+def start_span(name: str, kind: str = "internal", **attributes):
+    """
+    Opens a child of the current span. Only runs may start a trace: outside of `trace_run`
+    (or with tracing disabled) this yields None and records nothing.
+    """
+    parent = _current.get()
+    if _exporter is None or (parent is None and kind != "run"):
+        yield None
+        return
+    span = Span(name, kind, parent, {k: v for k, v in attributes.items() if v is not None})
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed in another context than it was opened in (e.g. an async generator
+            # finalized by the event loop): restore the parent there instead
+            _current.set(parent)
+        span.end = time.time()
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(span.to_dict())
+
+
+def trace_run(name: str = "run", **attributes):
+    """Root span for one graph run. Nested node/LLM/sandbox spans share its trace_id."""
+    return start_span(name, kind="run", **attributes)
+
+
+def traced_node(node: str):
+    """Decorator: one span per node execution, annotated with the node's decision/outcome."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(state):
+            with start_span(node, kind="node", iteration=state.get("iteration")) as span:
+                update = fn(state)
+                if span is not None and isinstance(update, dict):
+                    span.set(
+                        iteration=update.get("iteration"),
+                        decision=update.get("final_decision"),
+                        used_fallback=update.get("used_fallback"),
+                        prerouted=update.get("prerouted"),
+                        cost_usd=update.get("request_cost"),
+                    )
+                    critiques = update.get("critiques")
+                    if isinstance(critiques, list):
+                        span.set(verdicts=[
+                            {"role": c.critic_role, "passed": c.is_passing, "safety_violation": c.safety_violation}
+                            for c in critiques
+                        ])
+                return update
+        return wrapper
+    return decorator
+
+
+def traced_sandbox(runner: str):
+    """Decorator for executors returning (passed, message)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start_span(f"sandbox:{runner}", kind="sandbox") as span:
+                passed, message = fn(*args, **kwargs)
+                if span is not None:
+                    span.set(passed=passed, message=message[:200])
+                return passed, message
+        return wrapper
+    return decorator
+
+
+# --- Critical path CLI ---
+def load_trace(trace_id: str, path: str = TRACE_PATH) -> List[dict]:
+    spans = []
+    for file in sorted(glob.glob(f"{path}*")):
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                if trace_id in line:
+                    span = json.loads(line)
+                    if span["trace_id"] == trace_id:
+                        spans.append(span)
+    return spans
+
+
+def critical_path(spans: List[dict]) -> List[dict]:
+    """
+    The chain of spans that determined the run's end time: starting from the root, follow the
+    child that finished last, then the child that finished last before that one started, etc.
+    """
+    children: Dict[Optional[str], List[dict]] = {}
+    for span in spans:
+        children.setdefault(span["parent_id"], []).append(span)
+    roots = children.get(None) or [min(spans, key=lambda s: s["start"])]
+
+    def walk(span: dict, depth: int) -> List[dict]:
+        path = [{**span, "depth": depth}]
+        chain, horizon = [], span["end"]
+        for child in sorted(children.get(span["span_id"], []), key=lambda s: s["end"], reverse=True):
+            if child["end"] <= horizon + 1e-6:
+                chain.append(child)
+                horizon = child["start"]
+        for child in reversed(chain):
+            path += walk(child, depth + 1)
+        return path
+
+    return walk(max(roots, key=lambda s: s["end"] - s["start"]), 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect graph run traces.")
+    parser.add_argument("trace_id", nargs="?")
+    parser.add_argument("--path", default=TRACE_PATH)
+    parser.add_argument("--list", action="store_true", help="List the most recent runs")
+    args = parser.parse_args()
+
+    if args.list or not args.trace_id:
+        runs = []
+        for file in glob.glob(f"{args.path}*"):
+            with open(file, "r", encoding="utf-8") as f:
+                runs += [s for s in map(json.loads, f) if s["kind"] == "run"]
+        for span in sorted(runs, key=lambda s: s["start"])[-20:]:
+            print(f"{span['trace_id']}  {span['duration']:8.2f}s  {span['name']}  {span['attributes']}")
+        return
+
+    spans = load_trace(args.trace_id, args.path)
+    if not spans:
+        print(f"❌ Trace {args.trace_id} not found in {args.path}")
+        return
+    path = critical_path(spans)
+    total = path[0]["duration"] or 1e-9
+    print(f"🔎 Critical path of {args.trace_id} ({len(spans)} spans, {path[0]['duration']:.2f}s)")
+    for span in path:
+        attrs = {k: v for k, v in span["attributes"].items() if k in ("model", "iteration", "decision", "total_tokens", "passed", "error")}
+        print(f"{'  ' * span['depth']}{span['name']:<28} {span['duration']:8.3f}s {span['duration'] / total:6.1%}  {attrs or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,165 @@
-from langchain_openai import ChatOpenAI
-from src.config import OPENAI_API_KEY, OPENROUTER_API_KEY, OPENROUTER_BASE_URL
+from src.config import OPENAI_API_KEY, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, GENERATOR_MODEL_NAME, LLM_BACKEND
+from src.config import TOKEN_COUNT_CACHE_SIZE
+from src.llm_backend import ReplayLLM, RecordingLLM, get_cassette
+import difflib
+import functools
 import os
+import threading
+from collections import OrderedDict
+from typing import List, Sequence
 
-class CostTracker:
+@functools.lru_cache(maxsize=None)
+def _get_encoder(model_name: str):
     """
-    Singleton to track estimated costs for the Thesis 'Cost-Efficiency' metric.
+    Loads the tiktoken encoder for a model once. Returns None if no encoder is available
+    (e.g. offline without a cached BPE file), in which case callers fall back to a heuristic.
     """
-    _instance = None
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(CostTracker, cls).__new__(cls)
-            cls._instance.total_cost = 0.0
-        return cls._instance
-
-    def log_usage(self, model_name: str, estimated_input_tokens: int, estimated_output_tokens: int):
-        # Simplified pricing table (per 1M tokens) - Update with real OpenRouter prices
-        prices = {
-            "expert": {"in": 1.10, "out": 4.40}, # Example expensive price: o3-mini
-            "cheap": {"in": 0.1, "out": 0.4}, # Example cheap price: gpt-4.1-nano
-            "free": {"in": 0.0, "out": 0.0}
-        }
-        
-        # Determine rate
-        key = "free" if ":free" in model_name else ("cheap" if "nano" in model_name else "expert")
-        rate = prices[key]
-        
-        cost = (estimated_input_tokens * rate["in"] / 1e6) + (estimated_output_tokens * rate["out"] / 1e6)
-        self.total_cost += cost
-        # print(f"   [COST] {model_name}: +${cost:.6f}")
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+class TokenCounter:
+    """
+    Shared token-counting service: one encoder per model (see `_get_encoder`) and an LRU of
+    counts per (encoding, text). Prompts are rebuilt from the same pieces on every retry and by
+    every critic (system prompt, task, draft), so counting them segment by segment
+    (`count_segments`) only encodes the parts that changed.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_COUNT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            count = self._cache.get(key)
+            if count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            return count
+
+    def _store(self, key, count: int):
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str, model_name: str = GENERATOR_MODEL_NAME) -> int:
+        """Tokens in `text`. Falls back to ~4 characters per token without an encoder."""
+        return self.count_batch([text], model_name)[0]
+
+    def count_batch(self, texts: Sequence[str], model_name: str = GENERATOR_MODEL_NAME) -> List[int]:
+        """Counts many texts at once; cache misses are encoded in a single `encode_batch` call."""
+        enc = _get_encoder(model_name)
+        encoding = enc.name if enc is not None else "heuristic"
+        counts = [0] * len(texts)
+        missing = {}
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            cached = self._lookup((encoding, text))
+            if cached is None:
+                missing.setdefault(text, []).append(i)
+            else:
+                counts[i] = cached
+        if missing:
+            pending = list(missing)
+            if enc is None:
+                fresh = [max(1, len(text) // 4) for text in pending]
+            else:
+                fresh = [len(tokens) for tokens in enc.encode_batch(pending, disallowed_special=())]
+            for text, count in zip(pending, fresh):
+                self._store((encoding, text), count)
+                for i in missing[text]:
+                    counts[i] = count
+        return counts
+
+    def count_segments(self, segments: Sequence[str], model_name: str = GENERATOR_MODEL_NAME) -> int:
+        """
+        Tokens of "".join(segments), counting (and caching) each segment separately. Exact when
+        segments are split after a newline; otherwise within one token per boundary.
+        """
+        return sum(self.count_batch(list(segments), model_name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+_token_counter = TokenCounter()
+
+
+def get_token_counter() -> TokenCounter:
+    return _token_counter
+
+
+def count_tokens(text: str, model_name: str = GENERATOR_MODEL_NAME) -> int:
+    """
+    Counts tokens for a prompt fragment. Falls back to ~4 characters per token.
+    """
+    return _token_counter.count(text, model_name)
+
+
+def count_tokens_batch(texts: Sequence[str], model_name: str = GENERATOR_MODEL_NAME) -> List[int]:
+    return _token_counter.count_batch(texts, model_name)
+
+
+def code_diff(code_a: str, code_b: str, fromfile: str = "Previous", tofile: str = "Refined") -> str:
+    """Unified diff between two code versions (empty string if identical)."""
+    diff = difflib.unified_diff(
+        code_a.splitlines(), code_b.splitlines(),
+        fromfile=fromfile, tofile=tofile, lineterm=''
+    )
+    return "\n".join(list(diff))
+
+
+def get_provider(model_name: str) -> str:
+    """Maps a model name to its API provider ("openai" or "openrouter")."""
+    if any(x in model_name.lower() for x in ["gpt", "o1", "o3"]):
+        return "openai"
+    return "openrouter"
 
 
 def get_llm(model_name: str, temperature: float = 0.0):
+    """
+    Factory to return the LLM client for the configured backend (see src/llm_backend.py):
+    live provider client, live client recording to the cassette, or offline replay.
+    """
+    if LLM_BACKEND == "replay":
+        return ReplayLLM(get_cassette(), model_name, temperature)
+    llm = _get_live_llm(model_name, temperature)
+    if LLM_BACKEND == "record":
+        return RecordingLLM(llm, get_cassette(), model_name, temperature)
+    return llm
+
+
+def _get_live_llm(model_name: str, temperature: float = 0.0):
     """
     Factory to return the correct LLM client (OpenAI or OpenRouter).
     Handles parameter compatibility for GPT-5 vs older models.
     """
+    # Imported on first use: langchain_openai is the slowest import of the API process
+    from langchain_openai import ChatOpenAI
     
     # Define base parameters (common to all models, without 'temperature')
+    # Retries are handled by src.rate_limit.invoke_llm so 429s reach the shared limiter
     params = {
         "model": model_name,
+        "max_retries": 0,
     }
 
     # Determine if it is a GPT-5 series / Reasoning model
@@ -57,7 +178,7 @@ def get_llm(model_name: str, temperature: float = 0.0):
         # Retain temperature to control randomness
         params["temperature"] = temperature
 
-    if any(x in model_name.lower() for x in ["gpt", "o1", "o3"]):
+    if get_provider(model_name) == "openai":
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("❌ OPENAI_API_KEY is missing in environment variables!")
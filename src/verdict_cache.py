@@ -0,0 +1,119 @@
+# src/verdict_cache.py
+"""
+Critic verdict cache.
+
+Identical drafts reappear across iterations ("Generator ignored feedback") and across runs.
+Verdicts are cached under (persona, model, prompt mode, task hash, normalized-AST hash), so a
+draft that differs only in comments, docstrings, formatting or markdown wrapping gets the
+stored CritiqueResult instantly. Unlike a raw LLM response cache this matches on code
+structure, not on exact prompt strings.
+"""
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from src.config import VERDICT_CACHE_SIZE, VERDICT_CACHE_PATH
+from src.execution import extract_code_from_markdown
+from src.schemas import CritiqueResult
+from src.metrics import METRICS
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalized_code_hash(draft: str) -> str:
+    """
+    Hash of the code's AST without comments, docstrings or formatting.
+    Unparsable code falls back to its whitespace-normalized text.
+    """
+    code = extract_code_from_markdown(draft or "")
+    try:
+        canonical = ast.dump(_strip_docstrings(ast.parse(code)), annotate_fields=False, include_attributes=False)
+    except SyntaxError:
+        canonical = " ".join(code.split())
+    return _sha(canonical)
+
+
+def verdict_key(persona: str, model_name: str, prompt_mode: str, task: str, draft: str) -> str:
+    return _sha(json.dumps([persona, model_name, prompt_mode, _sha(task), normalized_code_hash(draft)]))
+
+
+class VerdictCache:
+    """In-memory LRU of verdicts, optionally backed by SQLite for reuse across runs."""
+
+    def __init__(self, max_size: int = VERDICT_CACHE_SIZE, path: str = VERDICT_CACHE_PATH):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL)")
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[CritiqueResult]:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            elif self.conn is not None:
+                row = self.conn.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row:
+                    data = json.loads(row[0])
+                    self._remember(key, data)
+            self.stats["hits" if data is not None else "misses"] += 1
+        return CritiqueResult.model_validate(data) if data is not None else None
+
+    def put(self, key: str, verdict: CritiqueResult):
+        data = verdict.model_dump()
+        with self.lock:
+            self._remember(key, data)
+            if self.conn is not None:
+                self.conn.execute("INSERT OR REPLACE INTO verdicts (key, verdict) VALUES (?, ?)", (key, json.dumps(data)))
+                self.conn.commit()
+
+    def _remember(self, key: str, data: dict):
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+_cache: Optional[VerdictCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VerdictCache()
+        return _cache
+
+
+def _collect_metrics():
+    if _cache is None:
+        return
+    yield ("agent_verdict_cache_lookups_total", "counter", "Critic verdict cache lookups by result.",
+           [({"result": "hit"}, _cache.stats["hits"]), ({"result": "miss"}, _cache.stats["misses"])])
+
+
+METRICS.register_collector(_collect_metrics)
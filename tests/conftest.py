@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import pytest
+from langchain_core.messages import AIMessage
+
+# Keep API tests hermetic: no durable checkpoint store or trace files on disk
+os.environ.setdefault("CHECKPOINT_DB_PATH", "")
+os.environ.setdefault("TRACE_PATH", "")
+
+from src.schemas import CritiqueResult, ChairmanOutput, CombinedCritiqueResult
+from src.verdict_cache import VerdictCache
+
+CANNED = {
+    CritiqueResult: lambda: CritiqueResult(feedback="Looks good", is_passing=True, safety_violation=False),
+    ChairmanOutput: lambda: ChairmanOutput(decision="PASS", consolidated_feedback="All checks passed."),
+    CombinedCritiqueResult: lambda: CombinedCritiqueResult(logic=CANNED[CritiqueResult](), security=CANNED[CritiqueResult]()),
+}
+
+class FakeLLM:
+    """Offline stand-in for get_llm(): canned drafts and passing verdicts, records every call."""
+    def __init__(self, calls, model_name, schema=None):
+        self.calls, self.model_name, self.schema = calls, model_name, schema
+
+    def with_structured_output(self, schema):
+        return FakeLLM(self.calls, self.model_name, schema)
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.calls.append((self.model_name, self.schema.__name__ if self.schema else "text"))
+        if self.schema:
+            return CANNED[self.schema]()
+        usage = {"token_usage": {"prompt_tokens": 100, "completion_tokens": 50}}
+        return AIMessage(content="```python\ndef solve():\n    return 42\n```", response_metadata=usage)
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = []
+    monkeypatch.setattr("src.nodes.get_llm", lambda model_name, temperature=0.0: FakeLLM(calls, model_name))
+    # Fresh verdict cache per test, so verdicts never leak between tests
+    monkeypatch.setattr("src.verdict_cache._cache", VerdictCache(path=""))
+    return calls
@@ -0,0 +1,41 @@
+# tests/test_admission.py
+import asyncio
+import pytest
+from api.admission import AdmissionController, AdmissionRejected
+
+def test_priority_classes_start_first_and_full_queue_rejects():
+    controller = AdmissionController(max_in_flight=1, max_queue=2)
+    running = controller.enqueue("batch")
+    assert running.wait(timeout=0)
+
+    batch = controller.enqueue("batch")
+    interactive = controller.enqueue("interactive")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.enqueue("standard")
+    assert rejected.value.retry_after >= 1
+
+    running.release()
+    assert interactive.wait(timeout=0) and not batch.wait(timeout=0)
+    interactive.release()
+    assert batch.wait(timeout=0)
+    batch.release()
+    assert controller.stats()["in_flight"] == 0 and controller.stats()["queued"] == 0
+
+def test_abandoned_waiter_gives_up_its_place():
+    controller = AdmissionController(max_in_flight=1, max_queue=4)
+
+    async def scenario():
+        holder = controller.enqueue("interactive")
+        waiter = controller.enqueue("interactive")
+        task = asyncio.create_task(waiter.acquired())
+        await asyncio.sleep(0)
+        task.cancel()  # client disconnected while queued
+        await asyncio.gather(task, return_exceptions=True)
+        later = controller.enqueue("batch")
+        holder.release()
+        await later.acquired()
+        waiter.release()
+        later.release()
+
+    asyncio.run(scenario())
+    assert controller.stats() == {**controller.stats(), "in_flight": 0, "queued": 0}
@@ -1,10 +1,259 @@
 # tests/test_api.py
+import json
 from fastapi.testclient import TestClient
-from api.main import app
+from api.main import app, build_response, CriticDetail, GenerationRequest
 
 client = TestClient(app)
 
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy", "service": "cost-aware-agent-api"}
\ No newline at end of file
+    assert response.json() == {"status": "healthy", "service": "cost-aware-agent-api"}
+
+
+def test_generate_stream_emits_progress_events(fake_llm):
+    with client.stream("POST", "/api/v1/generate/stream", json={"task_id": "stream_1", "prompt": "Return 42."}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [line.split(": ", 1)[1] for line in response.iter_lines() if line.startswith("event: ")]
+
+    assert events[0] == "draft_ready"
+    assert events.count("critic_verdict") == 2
+    assert "chairman_decision" in events
+    assert events[-1] == "result"
+
+
+def test_metrics_exposes_node_latency_and_tokens(fake_llm):
+    response = client.post("/api/v1/generate", json={"task_id": "metrics_1", "prompt": "Return 43."})
+    assert response.status_code == 200
+
+    body = client.get("/metrics").text
+    assert "# TYPE agent_node_latency_seconds histogram" in body
+    assert 'agent_node_latency_seconds_count{node="generator"}' in body
+    assert 'agent_node_latency_seconds_count{node="critic_logic"}' in body
+    assert 'agent_llm_tokens_total{direction="input",model="gpt-4.1-nano"}' in body
+    assert 'agent_requests_total{endpoint="generate",status="ok"}' in body
+    assert "agent_requests_in_flight 0" in body
+
+
+def test_job_lifecycle_with_long_poll(fake_llm):
+    submitted = client.post("/api/v1/jobs", json={"task_id": "job_1", "prompt": "Return 44."})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+
+    status = client.get(f"/api/v1/jobs/{job_id}", params={"wait": 10}).json()
+    assert status["status"] == "succeeded"
+    assert status["result"]["status"] == "PASS" and status["queue_wait_seconds"] is not None
+    assert client.get("/api/v1/jobs/unknown").status_code == 404
+    assert "agent_job_queue_wait_seconds_count" in client.get("/metrics").text
+
+
+def test_batch_streams_results_and_summary(fake_llm):
+    tasks = [{"prompt": f"Return {n}."} for n in range(5)]
+    with client.stream("POST", "/api/v1/generate/batch", json={"tasks": tasks, "max_concurrency": 3}) as response:
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    results = [line for line in lines if line["type"] == "result"]
+    assert sorted(line["index"] for line in results) == list(range(5))
+    # Default task_ids are made unique so the runs do not share a checkpoint thread
+    assert len({line["response"]["task_id"] for line in results}) == 5
+    summary = lines[-1]
+    assert summary["type"] == "summary" and summary["succeeded"] == 5 and summary["failed"] == 0
+    assert summary["total_cost_usd"] == round(sum(line["response"]["cost_usd"] for line in results), 6)
+
+
+def test_default_task_ids_get_their_own_checkpoint_thread():
+    from api.main import GenerationRequest, thread_id_for
+    first, second = GenerationRequest(prompt="Return 1."), GenerationRequest(prompt="Return 2.")
+    assert thread_id_for(first) != thread_id_for(second)
+
+
+def test_identical_request_reuses_recent_result(fake_llm):
+    first = client.post("/api/v1/generate", json={"task_id": "dup_1", "prompt": "Return 45."}).json()
+    calls = len(fake_llm)
+    second = client.post("/api/v1/generate", json={"task_id": "dup_2", "prompt": "Return 45."}).json()
+
+    assert len(fake_llm) == calls  # no second graph run
+    assert not first["coalesced"] and second["coalesced"]
+    assert second["task_id"] == "dup_2" and second["final_code"] == first["final_code"]
+    assert second["cost_usd"] == 0.0
+    assert 'agent_coalesced_requests_total{source="reuse"}' in client.get("/metrics").text
+
+
+def test_cancelled_follower_does_not_break_the_shared_run(monkeypatch):
+    import asyncio, time
+    import api.main as main
+    from api.main import GenerationRequest, GenerationResponse, generate_coalesced
+
+    def slow_run(request, start_time, trace_name):
+        time.sleep(0.3)
+        return GenerationResponse(task_id=request.task_id, status="PASS", final_code="x = 1", iterations=1,
+                                   used_fallback=False, safety_veto=False, chairman_summary="ok", latency_seconds=0.3)
+    monkeypatch.setattr(main, "run_generation", slow_run)
+
+    async def scenario():
+        requests = [GenerationRequest(task_id=f"follow_{i}", prompt="Return 146.") for i in range(3)]
+        leader = asyncio.create_task(generate_coalesced(requests[0]))
+        await asyncio.sleep(0.05)
+        quitter = asyncio.create_task(generate_coalesced(requests[1]))
+        follower = asyncio.create_task(generate_coalesced(requests[2]))
+        await asyncio.sleep(0.05)
+        quitter.cancel()
+        return await asyncio.gather(leader, follower, quitter, return_exceptions=True)
+
+    leader, follower, quitter = asyncio.run(scenario())
+    assert isinstance(quitter, asyncio.CancelledError)
+    assert leader.final_code == follower.final_code == "x = 1"
+    assert follower.coalesced and follower.task_id == "follow_2"
+
+
+def test_full_admission_queue_returns_429(monkeypatch):
+    from api.admission import AdmissionController
+    full = AdmissionController(max_in_flight=1, max_queue=0)
+    full.enqueue("interactive")  # the only slot is taken, nothing may wait
+    monkeypatch.setattr("api.main.admission", full)
+    for endpoint in ("/api/v1/generate", "/api/v1/generate/stream"):
+        response = client.post(endpoint, json={"prompt": "Return 46.", "priority": "standard"})
+        assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+    assert client.post("/api/v1/generate", json={"prompt": "x", "priority": "urgent"}).status_code == 422
+
+    from api.jobs import QueueFullError
+    def full_queue(request):
+        raise QueueFullError(1, 7)
+    monkeypatch.setattr("api.main.job_manager.submit", full_queue)
+    response = client.post("/api/v1/jobs", json={"prompt": "Return 46."})
+    assert response.status_code == 429 and response.headers["Retry-After"] == "7"
+    assert 'agent_admission_rejections_total{priority="standard"}' in client.get("/metrics").text
+
+
+def test_mode_selects_compiled_variant(fake_llm):
+    response = client.post("/api/v1/generate", json={"task_id": "mode_1", "prompt": "Return 47.", "mode": "BASELINE"})
+    assert response.status_code == 200
+    assert response.json()["mode"] == "baseline"
+    assert fake_llm == [("gpt-4.1-nano", "text")]  # generator only, no critics or chairman
+    assert client.post("/api/v1/generate", json={"prompt": "x", "mode": "turbo"}).status_code == 422
+
+
+def test_response_reports_retry_token_savings():
+    final_state = {"final_decision": "PASS", "draft_code": "x = 1", "iteration": 3, "repair_context_log": [
+        {"iteration": 1, "tokens_before": 900, "tokens_after": 400, "budget": 600},
+        {"iteration": 2, "tokens_before": 500, "tokens_after": 500, "budget": 600},
+    ], "critique_savings_log": [
+        {"iteration": 2, "role": "Security", "mode": "reused", "tokens_full": 700, "tokens_sent": 0, "tokens_saved": 850},
+        {"iteration": 2, "role": "Logic", "mode": "diff", "tokens_full": 700, "tokens_sent": 300, "tokens_saved": 400},
+    ]}
+    response = build_response(GenerationRequest(prompt="Return 1."), final_state, start_time=0.0)
+    assert response.repair_tokens_saved == 500 and response.critique_tokens_saved == 1250
+
+
+def test_execute_returns_per_test_results():
+    payload = {"code": "def add(a, b):\n    return a + b", "test_cases": [{"input": "1\n2", "output": "3"}, {"input": "1\n1", "output": "3"}]}
+    body = client.post("/api/v1/execute", json=payload).json()
+    assert body["runner"] == "lcb" and not body["passed"] and body["passed_count"] == 1
+    assert [t["status"] for t in body["tests"]] == ["passed", "failed"]
+    assert client.post("/api/v1/execute", json=payload).json()["cached"]
+    assert client.post("/api/v1/execute", json={"code": "x = 1", "test": "def check(c): pass"}).status_code == 422
+
+
+def receive_until(ws, *events):
+    messages = []
+    while not messages or messages[-1]["event"] not in events:
+        messages.append(ws.receive_json())
+    return messages
+
+
+def test_websocket_streams_critic_details(fake_llm):
+    with client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json({"task_id": "ws_1", "prompt": "Return 48."})
+        messages = receive_until(ws, "result", "error")
+
+    events = [m["event"] for m in messages]
+    assert events[0] == "draft_ready" and events[-1] == "result"
+    verdicts = [m for m in messages if m["event"] == "critic_verdict"]
+    assert len(verdicts) == 2 and set(CriticDetail.model_fields) <= set(verdicts[0])
+
+
+def test_websocket_pauses_for_escalation_approval(monkeypatch, fake_llm):
+    from conftest import CANNED
+    from src.schemas import CritiqueResult
+    monkeypatch.setitem(CANNED, CritiqueResult, lambda: CritiqueResult(feedback="Off by one", is_passing=False, safety_violation=False))
+    request = {"task_id": "ws_2", "prompt": "Return 49.", "mode": "fallback_only", "confirm_escalation": True}
+
+    with client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json(request)
+        assert receive_until(ws, "escalation_pending", "result")[-1]["event"] == "escalation_pending"
+        ws.send_json({"type": "approve_escalation"})
+        messages = receive_until(ws, "result", "error")
+    assert "escalation" in [m["event"] for m in messages]
+    assert messages[-1]["used_fallback"]
+
+    with client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json(dict(request, task_id="ws_3"))
+        receive_until(ws, "escalation_pending")
+        ws.send_json({"type": "decline_escalation"})
+        result = receive_until(ws, "result", "error")[-1]
+    assert result["status"] == "FAIL" and not result["used_fallback"]
+
+
+def test_resumed_run_uses_the_new_request_budgets(monkeypatch, tmp_path, fake_llm):
+    import time
+    import pytest
+    from api.main import GenerationRequest, resume_with_budgets
+    from src.checkpoint import get_checkpointer
+    from src.graph import build_graph
+    saver = get_checkpointer(str(tmp_path / "checkpoints.sqlite"))
+    config = {"configurable": {"thread_id": "resume_1"}}
+
+    def crash(state):
+        raise RuntimeError("provider timeout")
+    import src.graph
+    chairman = src.graph.chairman_node
+    monkeypatch.setattr("src.graph.chairman_node", crash)
+    expired = {"task": "Return 147.", "iteration": 0, "critiques": [], "deadline": time.time() - 1, "cost_budget_usd": 0.0001}
+    with pytest.raises(RuntimeError):
+        build_graph(checkpointer=saver).invoke(expired, config=config)
+    monkeypatch.setattr("src.graph.chairman_node", chairman)
+
+    app = build_graph(checkpointer=saver)
+    now = time.time()
+    request = GenerationRequest(prompt="Return 147.", timeout_seconds=60, cost_budget_usd=1.0)
+    assert resume_with_budgets(app, config, request, now)
+    state = app.get_state(config)
+    assert state.next == ("chairman",)
+    assert state.values["deadline"] == now + 60 and state.values["started_at"] == now
+    assert state.values["cost_budget_usd"] == state.values["request_cost"] + 1.0
+    assert app.invoke(None, config=config)["final_decision"] == "PASS"  # the old deadline no longer ends it
+
+
+def test_declined_escalation_is_not_resumed_later(monkeypatch, tmp_path, fake_llm):
+    from conftest import CANNED
+    from src.checkpoint import get_checkpointer
+    from src.schemas import CritiqueResult
+    monkeypatch.setattr("api.main.get_api_checkpointer", lambda: get_checkpointer(str(tmp_path / "checkpoints.sqlite")))
+    monkeypatch.setitem(CANNED, CritiqueResult, lambda: CritiqueResult(feedback="Off by one", is_passing=False, safety_violation=False))
+    request = {"task_id": "ws_durable", "prompt": "Return 149.", "mode": "fallback_only"}
+
+    with client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json(dict(request, confirm_escalation=True))
+        receive_until(ws, "escalation_pending")
+        ws.send_json({"type": "decline_escalation"})
+        assert receive_until(ws, "result", "error")[-1]["event"] == "result"
+    calls = len(fake_llm)
+
+    response = client.post("/api/v1/generate", json=request).json()
+    # A fresh run (draft first), not a resumption straight into the declined fallback
+    assert fake_llm[calls][0] == "gpt-4.1-nano" and response["used_fallback"]
+
+
+def test_websocket_cancel_while_awaiting_approval(monkeypatch, fake_llm):
+    from conftest import CANNED
+    from src.schemas import CritiqueResult
+    monkeypatch.setitem(CANNED, CritiqueResult, lambda: CritiqueResult(feedback="Off by one", is_passing=False, safety_violation=False))
+    with client.websocket_connect("/api/v1/generate/ws") as ws:
+        ws.send_json({"task_id": "ws_4", "prompt": "Return 50.", "mode": "fallback_only", "confirm_escalation": True})
+        receive_until(ws, "escalation_pending")
+        ws.send_json({"type": "cancel"})
+        assert ws.receive_json() == {"event": "cancelled", "task_id": "ws_4"}
+    assert not any(model == "o3-mini" for model, _ in fake_llm)  # the fallback never ran
@@ -0,0 +1,36 @@
+# tests/test_checkpoint.py
+import pytest
+from src.checkpoint import get_checkpointer
+from src.graph import build_graph
+
+def test_crashed_run_resumes_from_last_completed_node(tmp_path, fake_llm, monkeypatch):
+    saver = get_checkpointer(str(tmp_path / "checkpoints.sqlite"))
+    app = build_graph(checkpointer=saver)
+    config = {"configurable": {"thread_id": "task-1"}}
+
+    def crash(state):
+        raise RuntimeError("provider timeout")
+    monkeypatch.setattr("src.graph.chairman_node", crash)
+    crashing_app = build_graph(checkpointer=saver)
+    with pytest.raises(RuntimeError):
+        crashing_app.invoke({"task": "Return 42.", "iteration": 0, "critiques": []}, config=config)
+
+    paid_calls = len(fake_llm)  # generator + both critics
+    assert app.get_state(config).next == ("chairman",)
+
+    final = app.invoke(None, config=config)
+    assert final["final_decision"] == "PASS"
+    assert len(fake_llm) == paid_calls + 1  # only the chairman ran again
+
+def test_prune_keeps_latest_checkpoint(tmp_path, fake_llm):
+    saver = get_checkpointer(str(tmp_path / "checkpoints.sqlite"))
+    app = build_graph(checkpointer=saver)
+    config = {"configurable": {"thread_id": "task-2"}}
+    app.invoke({"task": "Return 42.", "iteration": 0, "critiques": []}, config=config)
+
+    saver.prune_store()
+    assert len(list(saver.list(config))) == 1
+    assert app.get_state(config).values["final_decision"] == "PASS"
+
+    saver.prune_store(ttl_seconds=0)
+    assert not app.get_state(config).values
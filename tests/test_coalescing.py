@@ -0,0 +1,48 @@
+# tests/test_coalescing.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from api.coalescing import SingleFlight, LEADER, INFLIGHT, REUSED
+
+def call(flight, key, runs, result="done", fail=False):
+    """What the API does: the leader runs and completes the key, everyone else waits on its future."""
+    future, role = flight.claim(key)
+    if role == LEADER:
+        runs.append(key)
+        time.sleep(0.05)
+        if fail:
+            flight.complete(key, error=RuntimeError("boom"))
+        else:
+            flight.complete(key, result)
+    return future.result(timeout=5), role
+
+def test_concurrent_identical_calls_share_one_run():
+    flight, runs = SingleFlight(reuse_seconds=0), []
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(lambda _: call(flight, "k", runs), range(8)))
+    assert runs == ["k"]
+    assert {result for result, _ in outcomes} == {"done"}
+    assert sorted(role for _, role in outcomes).count(INFLIGHT) == 7
+
+    # No reuse window: the next call starts a fresh run
+    call(flight, "k", runs)
+    assert runs == ["k", "k"]
+
+def test_reuse_window_and_failures():
+    flight, runs = SingleFlight(reuse_seconds=60), []
+    assert call(flight, "k", runs) == ("done", LEADER)
+    assert call(flight, "k", runs) == ("done", REUSED)
+    assert runs == ["k"]
+
+    try:
+        call(flight, "bad", runs, fail=True)
+    except RuntimeError:
+        pass
+    _, role = flight.claim("bad")
+    assert role == LEADER  # failures are never reused
+
+def test_complete_tolerates_a_cancelled_future():
+    flight = SingleFlight(reuse_seconds=60)
+    future, _ = flight.claim("k")
+    future.cancel()
+    flight.complete("k", "done")  # the leader must not fail because a waiter gave up
+    assert flight.claim("k")[1] == REUSED
@@ -0,0 +1,53 @@
+# tests/test_cost_ledger.py
+import csv
+import threading
+from src.config import AB_MODES
+from src.cost_ledger import current_ledger, estimate_cost, get_price, ledger_scope, log_usage
+from src.graph import build_graph
+
+def test_pricing_table_lookup():
+    assert get_price("gpt-4.1-nano-2025-04-14") == get_price("gpt-4.1-nano")
+    assert get_price("openai/o3-mini") == get_price("o3-mini")
+    assert estimate_cost("qwen/qwen3-coder:free", 10_000, 10_000) == 0.0
+    # Cached prompt tokens are billed at the cached rate
+    assert estimate_cost("gpt-4.1-nano", 1_000_000, 0, cached_tokens=1_000_000) < estimate_cost("gpt-4.1-nano", 1_000_000, 0)
+
+def test_concurrent_scopes_do_not_bleed():
+    totals = {}
+    barrier = threading.Barrier(4)
+
+    def run(i):
+        with ledger_scope() as ledger:
+            barrier.wait()
+            for _ in range(200):
+                log_usage("gpt-4.1-nano", 1000 * (i + 1), 0, node="generator")
+            totals[i] = (len(ledger), ledger.total_cost)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i, (calls, cost) in totals.items():
+        assert calls == 200
+        assert abs(cost - 200 * estimate_cost("gpt-4.1-nano", 1000 * (i + 1), 0)) < 1e-12
+
+    # Outside any scope only the running total is kept, so the process ledger cannot grow per call
+    before = current_ledger().total_cost
+    log_usage("gpt-4.1-nano", 1000, 0)
+    assert len(current_ledger()) == 0 and current_ledger().total_cost > before
+
+def test_graph_run_is_itemized_and_rolls_up(tmp_path, fake_llm):
+    with ledger_scope() as session:
+        with ledger_scope() as task:
+            final_state = build_graph(AB_MODES["LOOP_ONLY"]).invoke({"task": "Add two numbers.", "iteration": 0})
+        assert set(task.summary("node")) >= {"generator", "critic_logic", "critic_security", "chairman"}
+        assert abs(task.total_cost - final_state["request_cost"]) < 1e-12
+
+    assert len(session) == len(task) and session.total_cost == task.total_cost
+    path = tmp_path / "ledger.csv"
+    session.to_csv(str(path))
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(task) and rows[0]["node"] == "generator"
@@ -0,0 +1,29 @@
+# tests/test_graph_registry.py
+import pytest
+from src.config import AB_MODES
+from src.graph_registry import get_graph, resolve_mode
+
+def test_each_variant_is_compiled_once():
+    assert get_graph("baseline") is get_graph("BASELINE")
+    assert get_graph() is get_graph(AB_MODES["FULL_SYSTEM"])
+    assert get_graph("baseline") is not get_graph("loop_only")
+    # Model overrides reuse the compiled topology, bound once per configuration
+    tuned = get_graph("loop_only", generator_model="gpt-4.1-mini")
+    assert tuned is get_graph("loop_only", generator_model="gpt-4.1-mini")
+    assert tuned is not get_graph("loop_only")
+    with pytest.raises(ValueError):
+        resolve_mode("turbo")
+    with pytest.raises(ValueError):
+        get_graph("baseline", temperature=0.3)
+
+def test_bound_models_reach_the_nodes(fake_llm):
+    get_graph("loop_only", generator_model="gpt-4.1-mini", critic_model="o3-mini").invoke(
+        {"task": "Add two numbers.", "iteration": 0}
+    )
+    models = {model for model, _ in fake_llm}
+    assert "gpt-4.1-mini" in models and "o3-mini" in models
+
+def test_combined_experiment_mode_uses_one_council_node():
+    graph = get_graph("loop_only", experiment_mode="COMBINED")
+    assert "critic_council" in graph.get_graph().nodes
+    assert "critic_logic" not in graph.get_graph().nodes
@@ -0,0 +1,102 @@
+# tests/test_hedging.py
+import threading
+import time
+from langchain_core.messages import AIMessage
+
+from src import hedging
+from src.config import AB_MODES
+from src.cost_ledger import ledger_scope
+from src.graph import build_graph
+from src.hedging import LatencyWindow, hedged_invoke
+
+
+class SlowFirstLLM:
+    """The first call stalls (tail latency); every later call answers immediately."""
+    def __init__(self, stall):
+        self.stall, self.calls = stall, 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(self.stall)
+            return AIMessage(content="slow", response_metadata={"token_usage": {"prompt_tokens": 10, "completion_tokens": 5}})
+        return AIMessage(content="fast")
+
+
+def test_slow_call_is_hedged_and_hedge_wins(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+    window = LatencyWindow()
+    for _ in range(hedging.HEDGE_MIN_SAMPLES):
+        window.record(0.05)
+    monkeypatch.setattr(hedging, "get_latency_window", lambda key: window)
+
+    llm = SlowFirstLLM(stall=0.5)
+    start = time.monotonic()
+    with ledger_scope() as ledger:
+        result, discarded_cost = hedged_invoke(llm, "gpt-4.1-nano", "review this", key="critic:test")
+
+    assert result.content == "fast"
+    assert time.monotonic() - start < 0.4
+    assert window.stats["hedged"] == 1 and window.stats["hedge_wins"] == 1
+
+    # The discarded (slow) response is billed to the request when the race is decided
+    assert discarded_cost > 0 and window.stats["discarded_cost_usd"] == discarded_cost
+    assert ledger.summary("node")["hedge_discarded"]["cost_usd"] == discarded_cost
+    # ... and nothing more is logged when it arrives after the request has finished
+    time.sleep(0.6)
+    assert ledger.total_cost == ledger.summary("node")["hedge_discarded"]["cost_usd"]
+
+
+def test_no_hedging_without_history(monkeypatch):
+    window = LatencyWindow()
+    monkeypatch.setattr(hedging, "get_latency_window", lambda key: window)
+    llm = SlowFirstLLM(stall=0.01)
+    assert hedged_invoke(llm, "gpt-4.1-nano", "review this")[0].content == "slow"
+    assert llm.calls == 1 and window.stats["hedged"] == 0
+    assert len(window.samples) == 1
+
+
+def test_no_hedge_when_all_attempt_slots_are_busy(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(hedging, "_slots", threading.BoundedSemaphore(1))  # room for the primary only
+    window = LatencyWindow()
+    for _ in range(hedging.HEDGE_MIN_SAMPLES):
+        window.record(0.05)
+    monkeypatch.setattr(hedging, "get_latency_window", lambda key: window)
+
+    llm = SlowFirstLLM(stall=0.3)
+    result, discarded_cost = hedged_invoke(llm, "gpt-4.1-nano", "review this")
+    assert result.content == "slow" and discarded_cost == 0.0
+    assert llm.calls == 1 and window.stats["hedged"] == 0 and window.stats["saturated"] == 1
+
+
+def test_discarded_hedges_count_towards_the_request_cost(monkeypatch, fake_llm):
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+    windows = {}
+
+    def primed_window(key):
+        if key not in windows:
+            windows[key] = LatencyWindow()
+            for _ in range(hedging.HEDGE_MIN_SAMPLES):
+                windows[key].record(0.05)
+        return windows[key]
+
+    monkeypatch.setattr(hedging, "get_latency_window", primed_window)
+    # The first attempt of every prompt stalls, so each critic and chairman call is hedged
+    seen, lock, invoke_llm = set(), threading.Lock(), hedging.invoke_llm
+
+    def first_attempt_stalls(llm, model_name, prompt):
+        with lock:
+            first = prompt not in seen
+            seen.add(prompt)
+        if first:
+            time.sleep(0.3)
+        return invoke_llm(llm, model_name, prompt)
+
+    monkeypatch.setattr(hedging, "invoke_llm", first_attempt_stalls)
+    with ledger_scope() as ledger:
+        final_state = build_graph(AB_MODES["LOOP_ONLY"]).invoke({"task": "Add two numbers.", "iteration": 0})
+
+    assert sum(window.stats["hedge_wins"] for window in windows.values()) == 3
+    assert ledger.summary("node")["hedge_discarded"]["calls"] == 3  # two critics and the chairman
+    assert abs(ledger.total_cost - final_state["request_cost"]) < 1e-12
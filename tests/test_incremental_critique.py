@@ -0,0 +1,52 @@
+# tests/test_incremental_critique.py
+from src.incremental_critique import plan_critique
+from src.schemas import CritiqueResult
+
+HELPERS = "\n".join(
+    f"def helper_{i}(values):\n    total = 0\n    for v in values:\n        total += v * {i}\n    return total\n"
+    for i in range(30)
+)
+PREVIOUS = f"```python\n{HELPERS}\ndef solve(nums):\n    return sum(nums) - 1\n```"
+LOGIC_FIX = f"```python\n{HELPERS}\ndef solve(nums):\n    return sum(nums)\n```"
+RISKY_FIX = f"```python\n{HELPERS}\ndef solve(nums):\n    import os\n    return sum(nums)\n```"
+
+PREVIOUS_CRITIQUES = [
+    CritiqueResult(feedback="Off by one in solve.", is_passing=False, safety_violation=False, critic_role="Logic"),
+    CritiqueResult(feedback="No issues.", is_passing=True, safety_violation=False, critic_role="Security"),
+]
+
+def make_state(draft):
+    return {
+        "task": "Return the sum of nums.",
+        "iteration": 2,
+        "draft_code": draft,
+        "previous_draft_code": PREVIOUS,
+        "previous_critiques": PREVIOUS_CRITIQUES,
+    }
+
+def full_prompt(state):
+    return f"SYSTEM\n\nTask: {state['task']}\nCode: {state['draft_code']}"
+
+def test_security_pass_is_reused_for_logic_only_diff():
+    state = make_state(LOGIC_FIX)
+    reused, prompt, entry = plan_critique(state, "Security", "SYSTEM", full_prompt(state), "gpt-4.1-nano")
+    assert reused is not None and reused.is_passing and reused.critic_role == "Security"
+    assert prompt == "" and entry["mode"] == "reused" and entry["tokens_saved"] > 0
+
+def test_logic_critic_gets_diff_instead_of_full_code():
+    state = make_state(LOGIC_FIX)
+    reused, prompt, entry = plan_critique(state, "Logic", "SYSTEM", full_prompt(state), "gpt-4.1-nano")
+    assert reused is None
+    assert "Off by one in solve." in prompt and "-    return sum(nums) - 1" in prompt
+    assert "total += v * 7" not in prompt
+    assert entry["mode"] == "diff" and entry["tokens_sent"] < entry["tokens_full"]
+
+def test_risky_diff_gets_fresh_security_review():
+    state = make_state(RISKY_FIX)
+    reused, prompt, entry = plan_critique(state, "Security", "SYSTEM", full_prompt(state), "gpt-4.1-nano")
+    assert reused is None and "+    import os" in prompt
+
+def test_first_iteration_uses_full_prompt():
+    state = dict(make_state(LOGIC_FIX), previous_draft_code="", previous_critiques=[])
+    reused, prompt, entry = plan_critique(state, "Logic", "SYSTEM", full_prompt(state), "gpt-4.1-nano")
+    assert reused is None and prompt == full_prompt(state) and entry is None
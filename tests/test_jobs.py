@@ -0,0 +1,43 @@
+# tests/test_jobs.py
+import time
+import pytest
+from api.jobs import JobManager, QueueFullError
+
+def make_manager(max_workers=1, max_queue=1):
+    """Runner with 100 short steps and a cancellation point before each one."""
+    steps = []
+
+    def runner(job):
+        for step in range(100):
+            job.raise_if_cancelled()
+            steps.append((job.payload, step))
+            time.sleep(0.01)
+        return job.payload
+
+    return JobManager(runner, max_workers=max_workers, max_queue=max_queue), steps
+
+def wait_until_running(job):
+    while job.status != "running":
+        time.sleep(0.001)
+
+def test_queue_depth_is_bounded():
+    manager, _ = make_manager(max_workers=1, max_queue=1)
+    wait_until_running(manager.submit("a"))
+    manager.submit("b")  # waits for the single runner
+    with pytest.raises(QueueFullError) as rejected:
+        manager.submit("c")
+    assert rejected.value.retry_after >= 1
+    manager.shutdown()
+
+def test_cancel_queued_and_running_jobs():
+    manager, steps = make_manager(max_workers=1, max_queue=2)
+    running = manager.submit("a")
+    queued = manager.submit("b")
+    wait_until_running(running)
+
+    assert manager.cancel(queued.id).status == "cancelled"
+    manager.cancel(running.id)
+    running.future.result(timeout=5)
+    assert running.status == "cancelled" and running.error == "Cancelled while running"
+    assert len(steps) < 100 and all(payload == "a" for payload, _ in steps)
+    assert manager.stats()["cancelled"] == 2
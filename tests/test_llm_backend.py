@@ -0,0 +1,50 @@
+# tests/test_llm_backend.py
+import pytest
+from langchain_core.messages import AIMessage
+
+from src import llm_backend
+from src.llm_backend import Cassette, CassetteMiss, RecordingLLM, ReplayLLM
+from src.schemas import CritiqueResult
+
+
+class LiveStub:
+    def __init__(self, schema=None):
+        self.schema = schema
+
+    def with_structured_output(self, schema):
+        return LiveStub(schema)
+
+    def invoke(self, prompt):
+        if self.schema:
+            return CritiqueResult(feedback="Off by one", is_passing=False, safety_violation=False)
+        return AIMessage(content="def f(): pass", response_metadata={"token_usage": {"prompt_tokens": 12, "completion_tokens": 7}})
+
+
+def test_record_then_replay_offline(tmp_path, monkeypatch):
+    path = str(tmp_path / "cassette.jsonl")
+    recorder = RecordingLLM(LiveStub(), Cassette(path), "gpt-4.1-nano", 0.7)
+    recorder.invoke("Task: write f")
+    recorder.with_structured_output(CritiqueResult).invoke("Review f")
+
+    monkeypatch.setattr(llm_backend, "REPLAY_LATENCY", "0")
+    replay = ReplayLLM(Cassette(path), "gpt-4.1-nano", 0.7)
+    msg = replay.invoke("Task: write f")
+    assert msg.content == "def f(): pass"
+    assert msg.response_metadata["token_usage"]["completion_tokens"] == 7
+
+    verdict = replay.with_structured_output(CritiqueResult).invoke("Review f")
+    assert isinstance(verdict, CritiqueResult) and verdict.feedback == "Off by one"
+
+
+def test_strict_replay_reports_unseen_prompt(tmp_path, monkeypatch):
+    path = str(tmp_path / "cassette.jsonl")
+    RecordingLLM(LiveStub(), Cassette(path), "gpt-4.1-nano", 0.7).invoke("Task: write f")
+    monkeypatch.setattr(llm_backend, "REPLAY_LATENCY", "0")
+
+    cassette = Cassette(path)
+    assert ReplayLLM(cassette, "gpt-4.1-nano", 0.7).invoke("Task: something else").content == "def f(): pass"
+    assert cassette.stats["fallback_hits"] == 1
+
+    monkeypatch.setattr(llm_backend, "REPLAY_STRICT", True)
+    with pytest.raises(CassetteMiss):
+        ReplayLLM(cassette, "gpt-4.1-nano", 0.7).invoke("Task: something else")
@@ -0,0 +1,17 @@
+# tests/test_metrics.py
+import threading
+from src.metrics import MetricsRegistry
+
+def test_finished_threads_are_folded_into_the_totals():
+    registry = MetricsRegistry()
+    for _ in range(50):
+        worker = threading.Thread(target=lambda: (registry.inc("agent_requests_total", endpoint="x"),
+                                                  registry.observe("agent_sandbox_seconds", 0.2)))
+        worker.start()
+        worker.join()
+    registry.inc("agent_requests_total", endpoint="x")
+
+    values, histograms = registry.snapshot()
+    assert values[("agent_requests_total", (("endpoint", "x"),))] == 51
+    assert histograms[("agent_sandbox_seconds", ())][-1] == 50
+    assert len(registry._shards) == 1  # only the live main thread keeps a shard
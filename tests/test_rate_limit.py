@@ -0,0 +1,53 @@
+# tests/test_rate_limit.py
+import pytest
+from types import SimpleNamespace
+
+from src import rate_limit
+from src.rate_limit import ProviderRateLimiter, invoke_llm, retry_after_seconds
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": retry_after})
+
+
+class FlakyLLM:
+    """Returns 429 for the first `failures` calls, then succeeds."""
+    def __init__(self, failures):
+        self.failures, self.calls = failures, 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimited("0.01")
+        return "ok"
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = ProviderRateLimiter("openai:test-model", rpm=1000, tpm=10**6)
+    monkeypatch.setattr(rate_limit, "get_rate_limiter", lambda model_name: limiter)
+    return limiter
+
+
+def test_429_backs_off_and_slows_limiter(limiter):
+    llm = FlakyLLM(failures=2)
+    assert invoke_llm(llm, "test-model", "hello", max_retries=3) == "ok"
+    assert llm.calls == 3
+    assert limiter.stats["rate_limit_errors"] == 2
+    assert limiter.stats["retries"] == 2
+    # Halved twice, then one additive recovery step
+    assert limiter.rate_scale == pytest.approx(0.25 + rate_limit.RATE_RECOVERY_STEP)
+
+
+def test_gives_up_after_max_retries(limiter):
+    with pytest.raises(RateLimited):
+        invoke_llm(FlakyLLM(failures=5), "test-model", "hello", max_retries=1)
+
+
+def test_retry_after_header_formats():
+    assert retry_after_seconds(RateLimited("2")) == 2.0
+    assert retry_after_seconds(RateLimited("6m0s")) == 360.0
+    assert retry_after_seconds(RateLimited("20ms")) == pytest.approx(0.02)
@@ -0,0 +1,48 @@
+# tests/test_repair_context.py
+from src.repair_context import build_repair_context, dedupe_against_task, legacy_retry_section
+
+TASK = 'Problem: ...\nInput Format Example: [{"input": "[[7, 2, 1], [6, 4, 2]]", "output": "15", "testtype": "functional"}]'
+
+DRAFT = """Here is my solution:
+```python
+class Solution:
+    def helper(self, x):
+        return x * 2 + 1 + 2 + 3 + 4 + 5 + 6 + 7 + 8 + 9 + 10 + 11 + 12 + 13
+
+    def matrixSum(self, nums):
+        total = 0
+        for row in nums:
+            total += max(row)
+        return total
+```
+This works because we take the maximum of each row."""
+
+def test_dedupe_replaces_task_examples():
+    feedback = "Wrong answer for input [[7, 2, 1], [6, 4, 2]]."
+    assert dedupe_against_task(feedback, TASK) == "Wrong answer for input <Task example #1 input>."
+    # Escapes are decoded without mangling non-ASCII text
+    task = 'Example: [{"input": "caf\u00e9\\nna\u00efve r\u00e9sum\u00e9", "output": "2"}]'
+    assert dedupe_against_task("Fails on caf\u00e9\nna\u00efve r\u00e9sum\u00e9", task) == "Fails on <Task example #1 input>"
+
+def test_task_examples_are_referenced_in_task_order():
+    task = ('[{"input": "abcdefghijklmnop", "output": "0"}, '
+            '{"input": "line one\\nline two\\nline three", "output": "1"}]')
+    # The escaped form (as in the task) and the decoded one refer to the same example
+    feedback = "Fails on line one\\nline two\\nline three, i.e.\nline one\nline two\nline three\nPasses abcdefghijklmnop."
+    assert dedupe_against_task(feedback, task) == (
+        "Fails on <Task example #2 input>, i.e.\n<Task example #2 input>\nPasses <Task example #1 input>.")
+
+def test_repair_context_strips_prose_and_keeps_relevant_region():
+    feedback = "matrixSum must sort each row first."
+    section, stats = build_repair_context(TASK, DRAFT, feedback, token_budget=90)
+
+    assert "This works because" not in section
+    assert "def matrixSum" in section
+    assert "x * 2" not in section  # helper body omitted
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+def test_short_draft_keeps_the_legacy_section():
+    draft, feedback = "def f(): return 1", "Return 2."
+    section, stats = build_repair_context("Task", draft, feedback)
+    assert section == legacy_retry_section(draft, feedback)
+    assert stats["tokens_after"] == stats["tokens_before"]
@@ -0,0 +1,74 @@
+# tests/test_router.py
+import time
+from src.config import AB_MODES
+from src.graph import get_router_logic
+
+FAILED_STATE = {
+    "task": "Write a function that adds two numbers.",
+    "final_decision": "FAIL",
+    "iteration": 1,
+    "safety_veto_triggered": False,
+    "malicious_intent_triggered": False,
+}
+
+def test_full_system_retries_without_budget():
+    router = get_router_logic(AB_MODES["FULL_SYSTEM"])
+    assert router(dict(FAILED_STATE)) == "retry"
+
+def test_exhausted_cost_budget_stops_loop():
+    router = get_router_logic(AB_MODES["FULL_SYSTEM"])
+    state = dict(FAILED_STATE, cost_budget_usd=0.0001, request_cost=0.0001)
+    assert router(state) == "end"
+
+def test_deadline_skips_escalation():
+    router = get_router_logic(AB_MODES["FALLBACK_ONLY"])
+    state = dict(FAILED_STATE, deadline=time.time() + 1.0)
+    assert router(state) == "end"
+
+def test_adaptive_policy_escalates_hopeless_retry(monkeypatch):
+    from src.routing_policy import EscalationPolicy
+    history = [
+        {"mode": "loop_only", "difficulty": "hard", "iterations": 2, "escalated": False, "success": False}
+    ] * 20 + [
+        {"mode": "loop_only", "difficulty": "medium", "iterations": 2, "escalated": False, "success": True}
+    ] * 20
+    policy = EscalationPolicy.fit(history)
+    monkeypatch.setattr("src.graph.get_policy", lambda: policy)
+
+    router = get_router_logic(AB_MODES["FULL_SYSTEM"])
+    assert router(dict(FAILED_STATE, difficulty="hard")) == "escalate"
+    assert router(dict(FAILED_STATE, difficulty="medium")) == "retry"
+
+def test_prerouter_sends_hopeless_task_to_fallback(monkeypatch, fake_llm):
+    from src.graph import build_graph
+    from src.routing_policy import EscalationPolicy
+    from src.prerouter import max_constraint
+    history = [
+        {"mode": "full_system", "difficulty": "hard", "iterations": 3, "escalated": True, "success": True}
+    ] * 20 + [
+        {"mode": "full_system", "difficulty": "medium", "iterations": 1, "escalated": False, "success": True}
+    ] * 20
+    policy = EscalationPolicy.fit(history)
+    monkeypatch.setattr("src.prerouter.get_policy", lambda: policy)
+
+    assert max_constraint("1 <= n <= 2 * 10^5 and values up to 10**9") == 1e9
+    assert max_constraint("1 ≤ n ≤ 200,000") == 200000
+    assert max_constraint("Input: nums = [100000]\nOutput: 99999999") == 0  # example values are no bounds
+
+    graph = build_graph(AB_MODES["FULL_SYSTEM"])
+    hard = graph.invoke({"task": "Count subarrays. 1 <= n <= 10^5", "difficulty": "hard", "iteration": 0})
+    assert hard["prerouted"] and hard["used_fallback"]
+    assert not any(kind == "CritiqueResult" for _, kind in fake_llm)
+
+    fake_llm.clear()
+    medium = graph.invoke({"task": "Add two numbers.", "difficulty": "medium", "iteration": 0})
+    assert not medium["prerouted"] and not medium.get("used_fallback")
+    assert any(kind == "CritiqueResult" for _, kind in fake_llm)
+
+def test_combined_mode_projects_one_critic_call(monkeypatch):
+    from src.budget import project_step_cost
+    from src.run_settings import RUN_SETTING_DEFAULTS
+    monkeypatch.setitem(RUN_SETTING_DEFAULTS, "experiment_mode", "PERSONA")
+    persona = project_step_cost(FAILED_STATE, "retry")
+    monkeypatch.setitem(RUN_SETTING_DEFAULTS, "experiment_mode", "COMBINED")
+    assert project_step_cost(FAILED_STATE, "retry") < persona
@@ -0,0 +1,65 @@
+# tests/test_sandbox.py
+import pytest
+from src.execution import run_lcb_tests, run_humaneval_tests, execute_lcb_code
+from src.sandbox import SandboxPool, SandboxBusy
+
+ADD = "def add(a, b):\n    return a + b\n"
+LCB_TESTS = [{"input": "1\n2", "output": "3"}, {"input": "2\n2", "output": "5"}, {"input": "0\n0", "output": "0"}]
+HUMANEVAL_TEST = (
+    "def check(candidate):\n"
+    "    assert candidate(1, 2) == 3\n"
+    "    x = 5\n"
+    "    assert candidate(x, 1) == 7, 'x + 1'\n"
+    "    for i in range(3):\n"
+    "        assert candidate(i, 0) == i\n"
+)
+
+def test_lcb_runner_reports_every_test():
+    passed, message, tests = run_lcb_tests(ADD, LCB_TESTS, stop_on_failure=False)
+    assert not passed and message.startswith("Test 2 Failed")
+    assert [t["status"] for t in tests] == ["passed", "failed", "passed"]
+    # The pass/fail wrapper used by the benchmarks is unchanged
+    assert execute_lcb_code(ADD, LCB_TESTS) == (False, message)
+    assert run_lcb_tests("def add(a, b) return", LCB_TESTS)[1].startswith("Syntax Error")
+
+def test_humaneval_runner_splits_check_into_asserts():
+    passed, message, tests = run_humaneval_tests(ADD, HUMANEVAL_TEST, "add")
+    assert not passed and message == "Test 2 Failed: x + 1"
+    assert [t["status"] for t in tests] == ["passed", "failed", "passed"]
+    spin = "def add(a, b):\n    while True:\n        pass\n"
+    _, _, tests = run_humaneval_tests(spin, HUMANEVAL_TEST, "add", test_timeout=0.1)
+    assert [t["status"] for t in tests] == ["timeout"]  # nothing else starts next to a stuck test
+    # An early return only compiles inside check(), which then runs as a single test
+    early = "def check(candidate):\n    if candidate(1, 1) == 2:\n        return\n    assert False\n"
+    passed, _, tests = run_humaneval_tests(ADD, early, "add")
+    assert passed and len(tests) == 1
+
+def test_pool_caches_results_and_bounds_pending():
+    pool = SandboxPool(workers=1, max_pending=1)
+    try:
+        first = pool.submit("lcb", ADD, LCB_TESTS).result(timeout=60)
+        assert not first["cached"] and len(first["tests"]) == 3
+        # Same code modulo comments and formatting: served from the cache
+        again = pool.submit("lcb", "# adds\ndef add(a,  b):\n    return a + b", LCB_TESTS).result(timeout=5)
+        assert again["cached"] and again["tests"] == first["tests"]
+
+        slow = pool.submit("lcb", "import time\ndef f(x):\n    time.sleep(0.5)\n    return x", [{"input": "1", "output": "1"}])
+        with pytest.raises(SandboxBusy):
+            pool.submit("lcb", ADD, [{"input": "4\n4", "output": "8"}])
+        assert slow.result(timeout=60)["passed"]
+    finally:
+        pool.shutdown()
+
+def test_pool_kills_a_stuck_worker_and_keeps_serving():
+    wedge = ADD + "while True:\n    pass\n"  # module level: runs during setup, outside any test timeout
+    pool = SandboxPool(workers=1, max_pending=2, execution_timeout=1.0)
+    try:
+        stuck = pool.submit("lcb", wedge, LCB_TESTS[:1]).result(timeout=60)
+        assert not stuck["passed"] and stuck["message"].startswith("Execution timed out")
+        assert pool.stats()["pending"] == 0
+        after = pool.submit("lcb", ADD, LCB_TESTS[:1]).result(timeout=60)
+        assert after["passed"] and not after["cached"]
+        # Aborted executions are not cached
+        assert pool.submit("lcb", wedge, LCB_TESTS[:1]).result(timeout=60)["message"] == stuck["message"]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,15 @@
+# tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def test_api_import_defers_heavy_dependencies():
+    script = ("import sys, json, api.main; "
+              "print(json.dumps([m for m in ('langgraph', 'langchain_openai', 'pandas', 'datasets') if m in sys.modules]))")
+    env = {**os.environ, "PYTHONPATH": ROOT, "CHECKPOINT_DB_PATH": "", "TRACE_PATH": ""}
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=ROOT, env=env)
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
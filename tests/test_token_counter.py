@@ -0,0 +1,32 @@
+# tests/test_token_counter.py
+from src.config import AB_MODES
+from src.cost_ledger import ledger_scope
+from src.graph import build_graph
+from src.utils import TokenCounter, count_tokens
+
+def test_batch_matches_single_counts_and_caches():
+    counter = TokenCounter(max_entries=8)
+    texts = ["def add(a, b):\n    return a + b\n", "", "Task: add two numbers\n", "def add(a, b):\n    return a + b\n"]
+    counts = counter.count_batch(texts)
+    assert counts == [count_tokens(t) for t in texts]
+    assert counts[1] == 0 and counts[0] == counts[3]
+
+    sys_prompt, task = "You are a strict reviewer.\n\n", "Task: add two numbers\n"
+    first = counter.count_segments([sys_prompt, task, "Code: v1\n"])
+    hits = counter.stats()["hits"]
+    second = counter.count_segments([sys_prompt, task, "Code: v2\n"])
+    # Only the changed segment is encoded again
+    assert counter.stats()["hits"] == hits + 2
+    assert first == second
+
+def test_cache_is_bounded():
+    counter = TokenCounter(max_entries=4)
+    counter.count_batch([f"line {i}\n" for i in range(10)])
+    assert counter.stats()["entries"] == 4
+
+def test_missing_usage_is_counted_locally(fake_llm):
+    with ledger_scope() as ledger:
+        build_graph(AB_MODES["LOOP_ONLY"]).invoke({"task": "Add two numbers.", "iteration": 0})
+    critic = ledger.summary("node")["critic_logic"]
+    assert critic["input_tokens"] > 0 and critic["output_tokens"] > 0
+    assert critic["input_tokens"] == int(critic["input_tokens"]) # Token counts, not len/4 estimates
@@ -0,0 +1,56 @@
+# tests/test_tracing.py
+from src import tracing
+from src.config import AB_MODES
+from src.graph import build_graph
+from src.tracing import InMemoryExporter, critical_path, start_span, trace_run
+
+def test_graph_run_produces_nested_trace(monkeypatch, fake_llm):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+
+    with trace_run("test_run", task_id="t1"):
+        build_graph(AB_MODES["LOOP_ONLY"]).invoke({"task": "Add two numbers.", "iteration": 0})
+
+    spans = {s["span_id"]: s for s in exporter.spans}
+    assert len({s["trace_id"] for s in spans.values()}) == 1
+    root = next(s for s in spans.values() if s["kind"] == "run")
+    nodes = [s for s in spans.values() if s["kind"] == "node"]
+    assert {s["name"] for s in nodes} >= {"generator", "critic_logic", "critic_security", "chairman"}
+    assert all(s["parent_id"] == root["span_id"] for s in nodes)
+
+    # LLM calls nest under their node, including the critics' calls made on hedging worker threads
+    llm_spans = [s for s in spans.values() if s["kind"] == "llm"]
+    assert len(llm_spans) == len(fake_llm)
+    assert {spans[s["parent_id"]]["name"] for s in llm_spans} >= {"generator", "critic_logic", "chairman"}
+    assert next(s for s in nodes if s["name"] == "chairman")["attributes"]["decision"] == "PASS"
+
+    path = critical_path(exporter.spans)
+    assert path[0]["kind"] == "run" and path[-1]["start"] >= path[1]["start"]
+
+def test_no_spans_outside_a_run(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    with start_span("orphan", kind="node") as span:
+        assert span is None
+    assert exporter.spans == []
+
+def test_jsonl_exporter_opens_lazily_and_flushes_finished_runs(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = tracing.JsonlExporter(str(path), max_bytes=10_000)
+    assert not path.parent.exists()  # nothing touches the disk before the first span
+
+    exporter.export({"trace_id": "t", "span_id": "b", "kind": "node"})
+    exporter.export({"trace_id": "t", "span_id": "a", "kind": "run"})
+    assert len(path.read_text().splitlines()) == 2  # readable as soon as the run has finished
+    assert [s["span_id"] for s in tracing.load_trace("t", str(path))] == ["b", "a"]
+    exporter.close()
+
+def test_run_closed_in_another_context(monkeypatch):
+    import contextvars
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    # What an async generator finalized by the event loop does: enter in one context, exit in another
+    run = trace_run("api.generate_stream")
+    contextvars.copy_context().run(run.__enter__)
+    run.__exit__(None, None, None)
+    assert [s["kind"] for s in exporter.spans] == ["run"] and tracing.current_span() is None
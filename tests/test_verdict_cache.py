@@ -0,0 +1,32 @@
+# tests/test_verdict_cache.py
+from src.nodes import critic_1
+from src.verdict_cache import VerdictCache, normalized_code_hash
+from src.schemas import CritiqueResult
+
+DRAFT = "```python\ndef solve(nums):\n    return sum(nums)\n```"
+REFORMATTED = 'Here is the fix:\n```python\ndef solve( nums ):\n    """Sum."""\n    # add them up\n    return sum(nums)\n```'
+CHANGED = "```python\ndef solve(nums):\n    return sum(nums) + 1\n```"
+
+def test_normalized_hash_ignores_formatting_comments_and_docstrings():
+    assert normalized_code_hash(DRAFT) == normalized_code_hash(REFORMATTED)
+    assert normalized_code_hash(DRAFT) != normalized_code_hash(CHANGED)
+
+def test_resubmitted_draft_hits_cache(fake_llm):
+    state = {"task": "Return the sum of nums.", "draft_code": DRAFT, "iteration": 1}
+    first = critic_1(state)
+    assert len(fake_llm) == 1
+
+    second = critic_1(dict(state, draft_code=REFORMATTED, iteration=2))
+    assert len(fake_llm) == 1
+    assert second["critiques"][0].critic_role == "Logic"
+    assert second["critique_savings_log"][0]["mode"] == "cached"
+    assert second["request_cost"] == 0.0
+
+    critic_1(dict(state, draft_code=CHANGED))
+    assert len(fake_llm) == 2
+
+def test_sqlite_backed_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "verdicts.sqlite")
+    verdict = CritiqueResult(feedback="Looks good", is_passing=True, safety_violation=False, critic_role="Logic")
+    VerdictCache(path=path).put("k", verdict)
+    assert VerdictCache(path=path).get("k") == verdict
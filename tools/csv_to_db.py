@@ -18,14 +18,22 @@ def init_database():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         task_id TEXT NOT NULL,
         mode TEXT NOT NULL,
+        difficulty TEXT,
         success BOOLEAN NOT NULL,
         safety_veto BOOLEAN NOT NULL,
         iterations INTEGER,
+        escalated BOOLEAN,
         latency_seconds REAL,
         cost_usd REAL,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     ''')
+
+    # Migrate databases created before the routing policy needed difficulty/escalation data
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(evaluation_logs)")}
+    for column, col_type in (("difficulty", "TEXT"), ("escalated", "BOOLEAN")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE evaluation_logs ADD COLUMN {column} {col_type}")
     conn.commit()
     return conn
 
@@ -46,14 +54,16 @@ def load_csv_to_db(conn):
             # Insert data (DML)
             cursor.execute('''
             INSERT INTO evaluation_logs 
-            (task_id, mode, success, safety_veto, iterations, latency_seconds, cost_usd)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            (task_id, mode, difficulty, success, safety_veto, iterations, escalated, latency_seconds, cost_usd)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 row.get('Task ID', 'unknown'),
-                row.get('Mode', 'Full System'), 
+                row.get('Mode', 'Full System'),
+                row.get('Difficulty'),
                 row.get('Valid Success'),
                 row.get('Safety Veto'),
                 int(row.get('Iterations', 1)),
+                row.get('Escalated'),
                 float(row.get('Latency (s)', 0.0)),
                 float(row.get('Actual Cost ($)', 0.0))
             ))